@@ -1,4 +1,7 @@
+import json
 import os
+import re
+import tempfile
 
 # 是否开启debug模式
 DEBUG = True
@@ -7,5 +10,90 @@ DEBUG = True
 username = os.environ.get("MYSQL_USERNAME", 'root')
 password = os.environ.get("MYSQL_PASSWORD", 'root')
 db_address = os.environ.get("MYSQL_ADDRESS", '127.0.0.1:3306')
+# 只读库地址（可选），账号密码与主库相同；为空表示所有读写都走主库
+replica_address = os.environ.get("MYSQL_REPLICA_ADDRESS", '')
 
+# 看板指标缓存秒数（同一查询在该时间内复用结果），0 表示关闭
+METRICS_CACHE_TTL = int(os.environ.get("METRICS_CACHE_TTL", "3"))
 
+# 时间范围经营数据是否读取日聚合表 store_daily_metrics（启用前先执行 flask rebuild-metrics 回填）
+METRICS_USE_ROLLUP = os.environ.get("METRICS_USE_ROLLUP", "0") == "1"
+
+# 商户 slug/UUID 解析缓存秒数
+MERCHANT_CACHE_TTL = int(os.environ.get("MERCHANT_CACHE_TTL", "300"))
+# 不存在的 slug/UUID 的负缓存秒数（避免未知商户每次请求都查库），0 表示不缓存
+MERCHANT_MISS_CACHE_TTL = int(os.environ.get("MERCHANT_MISS_CACHE_TTL", "30"))
+
+# 菜单快照进程内缓存秒数（多实例下菜单变更的最大可见延迟）
+MENU_SNAPSHOT_TTL = int(os.environ.get("MENU_SNAPSHOT_TTL", "30"))
+
+# 运行环境：production 时启动跳过开发期的建表/种子数据等工作，缩短冷启动
+APP_ENV = os.environ.get("APP_ENV", "development")
+PRODUCTION = APP_ENV == "production"
+
+# 启动时的 schema 迁移：1=总是执行，0=不执行（部署时执行 flask --app run migrate），
+# check=只读查询 schema_migrations，不执行 DDL，有未执行迁移时输出告警（生产默认；
+# 生产镜像的启动命令会先执行 flask --app run migrate 再启动 gunicorn，见 Dockerfile）
+AUTO_MIGRATE = os.environ.get("AUTO_MIGRATE", "check" if PRODUCTION else "1")
+
+# 启动时写入示例商户/门店（仅开发环境默认开启）
+SEED_DEMO_DATA = os.environ.get("SEED_DEMO_DATA", "0" if PRODUCTION else "1") == "1"
+
+# 冷启动目标：进程启动到第一个业务请求处理完成的毫秒数（不含健康检查），
+# 实际耗时与是否达标见启动日志及 GET /api/admin/startup
+STARTUP_TARGET_MS = int(os.environ.get("STARTUP_TARGET_MS", "3000"))
+
+# 进程内超时订单清理间隔秒数，0 表示关闭（可改用定时任务执行 flask --app run sweep-orders）
+ORDER_SWEEP_INTERVAL = int(os.environ.get("ORDER_SWEEP_INTERVAL", "60"))
+
+# 超时订单清理每批取消的最大订单数
+ORDER_SWEEP_BATCH_SIZE = int(os.environ.get("ORDER_SWEEP_BATCH_SIZE", "500"))
+
+# 数据库连接池（每个进程一个池；实例最大连接数约为 进程数 * (DB_POOL_SIZE + DB_MAX_OVERFLOW)）
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+# 池满时等待空闲连接的秒数
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "10"))
+# 连接最长复用秒数，需小于 MySQL wait_timeout 及网关空闲断开时间
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "280"))
+# 取连接时先 ping，丢弃缩容/空闲后已失效的连接
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", "5"))
+DB_READ_TIMEOUT = int(os.environ.get("DB_READ_TIMEOUT", "30"))
+# 启动时预先建立的连接数（不超过 DB_POOL_SIZE），0 表示不预热
+DB_POOL_WARMUP = int(os.environ.get("DB_POOL_WARMUP", "2"))
+# 各 worker 预热状态标记目录（/readyz 汇总同一容器内所有 worker），为空表示只看本进程
+WARMUP_STATE_DIR = os.environ.get("WARMUP_STATE_DIR", os.path.join(tempfile.gettempdir(), "saas-warmup"))
+
+# 单个请求体上限（字节），超出时在读取阶段直接返回 413；上传文件大小另由 UPLOAD_MAX_BYTES 限制
+MAX_CONTENT_LENGTH = int(os.environ.get("MAX_CONTENT_LENGTH", str(8 * 1024 * 1024)))
+
+# 容器规格：读取 container.config.json 中的 cpu（核）与 mem（GB），文件含 // 注释
+def _container_resources():
+    try:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "container.config.json"), encoding="utf-8") as f:
+            raw = re.sub(r"^\s*//.*$", "", f.read(), flags=re.M)
+        cfg = json.loads(raw)
+        return float(cfg.get("cpu") or 1), float(cfg.get("mem") or 2)
+    except Exception:
+        return 1.0, 2.0
+
+
+CONTAINER_CPU, CONTAINER_MEM = _container_resources()
+
+# 每进程 Web 线程数（gunicorn gthread threads），请求以 DB / 上游 IO 为主，线程数高于核数
+WEB_THREADS = int(os.environ.get("GUNICORN_THREADS") or max(4, int(CONTAINER_CPU * 4)))
+
+# 微信接口超时秒数：连接超时 / 登录（jscode2session）读超时 / 统一下单读超时
+WX_CONNECT_TIMEOUT = float(os.environ.get("WX_CONNECT_TIMEOUT", "2"))
+WX_LOGIN_TIMEOUT = float(os.environ.get("WX_LOGIN_TIMEOUT", "3"))
+WX_PAY_TIMEOUT = float(os.environ.get("WX_PAY_TIMEOUT", "5"))
+
+# 上游调用隔离舱：每进程同时在途（执行中 + 排队）的上游调用数 = UPSTREAM_WORKERS + UPSTREAM_QUEUE，
+# 默认共占 Web 线程数的一半，且总数不超过 WEB_THREADS - 1，保证菜单 / 订单等 DB 路由始终有空闲线程
+_upstream_cap = max(1, WEB_THREADS - 1)
+UPSTREAM_WORKERS = min(_upstream_cap, max(1, int(os.environ.get("UPSTREAM_WORKERS") or WEB_THREADS // 2)))
+UPSTREAM_QUEUE = min(_upstream_cap - UPSTREAM_WORKERS, max(0, int(os.environ.get("UPSTREAM_QUEUE") or 0)))
+# 请求线程等待上游结果的秒数（含重试），不超过单次请求的最长超时（连接 + 读）
+_upstream_max_timeout = WX_CONNECT_TIMEOUT + max(WX_LOGIN_TIMEOUT, WX_PAY_TIMEOUT)
+UPSTREAM_DEADLINE = min(_upstream_max_timeout, float(os.environ.get("UPSTREAM_DEADLINE") or _upstream_max_timeout))
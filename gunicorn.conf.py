@@ -0,0 +1,69 @@
+# 生产环境 WSGI 服务配置：python3 -m gunicorn -c gunicorn.conf.py run:app
+# - 预派生多进程（gthread：每进程多线程），进程数/线程数默认按 container.config.json 的 cpu / mem 计算，
+#   可用 GUNICORN_WORKERS / GUNICORN_THREADS 覆盖
+# - preload_app：主进程加载应用后 fork，worker 之间以写时复制方式共享代码与只读数据
+# - max_requests：处理一定请求数后平滑重启 worker，抑制内存增长
+# - 平滑重启：kill -HUP <master>；preload 时 HUP 不会加载新代码，发布新版本走容器滚动更新
+import os
+import time
+
+import config
+
+_cpu, _mem = config.CONTAINER_CPU, config.CONTAINER_MEM
+# 每个 worker 常驻内存按 ~256MB 估算，进程数不超过内存允许值
+_max_by_mem = max(1, int(_mem * 1024 // 256) - 1)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '80')}"
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS") or min(max(2, int(_cpu * 2) + 1), _max_by_mem))
+# 线程数见 config.WEB_THREADS（上游调用隔离舱按该值分配上限）
+threads = config.WEB_THREADS
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# 云托管采集 stdout 日志
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    """
+    主进程启动时清空上次运行遗留的 worker 预热标记与容器就绪标记
+    """
+    from saas.services.warmup import clear_warmup_markers
+    clear_warmup_markers(config.WARMUP_STATE_DIR)
+
+
+def child_exit(server, worker):
+    """
+    worker 退出后删除其预热标记，/readyz 不再等待该进程
+    """
+    from saas.services.warmup import clear_warmup_markers
+    clear_warmup_markers(config.WARMUP_STATE_DIR, worker.pid)
+
+
+def post_fork(server, worker):
+    """
+    fork 后在 worker 内重建进程级资源：
+    - 主进程（preload）建立的数据库连接不能跨进程共用，丢弃后由 worker 重新建连并预热
+    - 预热在此同步执行一次，完成前 worker 不接受连接（max_requests 回收后补充的 worker 同样如此）；
+      耗时受 DB_CONNECT_TIMEOUT 约束，需小于 GUNICORN_TIMEOUT
+    - 后台线程不会随 fork 复制，在每个 worker 内启动超时订单清理（每轮仅抢到 GET_LOCK 的进程执行）
+    """
+    from saas.infra.models import db
+    from saas.services.order_sweeper import start_order_sweeper
+    from saas.services.warmup import start_warmup
+    app = server.app.wsgi()
+    if worker.age > server.num_workers:
+        # max_requests 回收后补充的 worker：首请求耗时从 fork 时刻重新计时，不计入冷启动
+        app.extensions["startup"].t0 = time.perf_counter()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    # 预热（连接池、mapper、商户目录、热门菜单）；容器首次启动时所有 worker 完成后 /readyz 才返回 200，
+    # 此后回收补充的 worker 预热期间不影响就绪
+    start_warmup(app, blocking=True)
+    start_order_sweeper(app)
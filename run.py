@@ -6,6 +6,11 @@ from saas import create_app
 
 app = create_app()
 
-# 启动Flask Web服务
+# 启动Flask Web服务（开发调试用；生产由 gunicorn 加载 run:app，见 gunicorn.conf.py）
 if __name__ == '__main__':
+    # 进程内超时订单清理（仅 Web 服务进程启动，flask CLI 命令不启动）
+    from saas.services.order_sweeper import start_order_sweeper
+    from saas.services.warmup import start_warmup
+    start_order_sweeper(app)
+    start_warmup(app)
     app.run(host=sys.argv[1], port=sys.argv[2])
@@ -1,52 +1,110 @@
-from flask import Flask
+import time
+_IMPORT_T0 = time.perf_counter()  # 冷启动计时起点（先于 Flask / SQLAlchemy 等依赖导入）
+
+from flask import Flask, request
 from .infra.models import db
 from .infra.context import tenant_context_middleware
+from .infra.startup import StartupReport
 from flask_cors import CORS
 import config
 
 def create_app(test_config=None):
+    startup = StartupReport(_IMPORT_T0, config.STARTUP_TARGET_MS)
+    startup.phases.append(("imports", round((time.perf_counter() - _IMPORT_T0) * 1000, 1)))
     app = Flask(__name__)
-    CORS(app) # 开启全局跨域支持
+    CORS(app, expose_headers=["X-Next-Cursor"]) # 开启全局跨域支持；分页游标在响应头中，需对跨域前端可见
+    app.extensions["startup"] = startup
     
     # 默认配置，可被 test_config 覆盖
     app.config.from_mapping(
         SECRET_KEY='dev',
         SQLALCHEMY_DATABASE_URI='mysql+pymysql://{}:{}@{}/saas_db'.format(config.username, config.password, config.db_address),
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        METRICS_CACHE_TTL=config.METRICS_CACHE_TTL,
+        METRICS_USE_ROLLUP=config.METRICS_USE_ROLLUP,
+        MERCHANT_CACHE_TTL=config.MERCHANT_CACHE_TTL,
+        MERCHANT_MISS_CACHE_TTL=config.MERCHANT_MISS_CACHE_TTL,
+        MENU_SNAPSHOT_TTL=config.MENU_SNAPSHOT_TTL,
+        AUTO_MIGRATE=config.AUTO_MIGRATE,
+        STARTUP_TARGET_MS=config.STARTUP_TARGET_MS,
+        SEED_DEMO_DATA=config.SEED_DEMO_DATA,
+        ORDER_SWEEP_INTERVAL=config.ORDER_SWEEP_INTERVAL,
+        ORDER_SWEEP_BATCH_SIZE=config.ORDER_SWEEP_BATCH_SIZE,
+        DB_POOL_WARMUP=config.DB_POOL_WARMUP,
+        WARMUP_STATE_DIR=config.WARMUP_STATE_DIR,
+        MAX_CONTENT_LENGTH=config.MAX_CONTENT_LENGTH,
     )
 
     if test_config:
         app.config.update(test_config)
+
+    startup.target_ms = app.config.get("STARTUP_TARGET_MS")
+
+    # 连接池参数（test_config 可整体覆盖 SQLALCHEMY_ENGINE_OPTIONS）
+    from .infra.pool import engine_options
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config["SQLALCHEMY_DATABASE_URI"], config))
+
+    # 只读库（可选）：@read_only 标记的查询路由到该 bind
+    if config.replica_address and "SQLALCHEMY_BINDS" not in app.config:
+        from .infra.routing import REPLICA_BIND_KEY
+        replica_uri = 'mysql+pymysql://{}:{}@{}/saas_db'.format(config.username, config.password, config.replica_address)
+        app.config["SQLALCHEMY_BINDS"] = {REPLICA_BIND_KEY: {"url": replica_uri, **engine_options(replica_uri, config)}}
         
     db.init_app(app)
     
     # 注册租户上下文中间件
     app.before_request(tenant_context_middleware)
 
-    # 注册蓝图
-    from .api.consumer import consumer_bp
-    from .api.merchant import merchant_bp
-    from .api.admin import admin_bp
+    @app.after_request
+    def _record_first_request(response):
+        # 健康检查探针不计入首请求耗时
+        if request.blueprint != "health_bp":
+            startup.mark_first_request()
+        return response
 
-    app.register_blueprint(consumer_bp, url_prefix='/api')
-    app.register_blueprint(merchant_bp, url_prefix='/api')
-    app.register_blueprint(admin_bp, url_prefix='/api')
+    # 注册运维命令（flask --app run <command>）
+    from .cli import register_commands
+    register_commands(app)
+
+    # 注册蓝图（COS SDK / Pillow / requests 均在首次使用时才导入）
+    with startup.phase("blueprints"):
+        from .api.consumer import consumer_bp
+        from .api.merchant import merchant_bp
+        from .api.admin import admin_bp
+        from .api.health import health_bp
+
+        app.register_blueprint(consumer_bp, url_prefix='/api')
+        app.register_blueprint(merchant_bp, url_prefix='/api')
+        app.register_blueprint(admin_bp, url_prefix='/api')
+        # 健康检查不带 /api 前缀：/healthz（存活）、/readyz（就绪）
+        app.register_blueprint(health_bp)
 
-    
-    # 初始化数据库（开发环境方便起见）
     with app.app_context():
-        # 尝试创建表（如果不报错）
         try:
-            db.create_all()
-            
-            # 自动迁移
-            from .infra.migrations import run_auto_migrations
-            run_auto_migrations()
-            
-            from .infra.repository import _ensure_seed_db
-            _ensure_seed_db()
+            # 版本化迁移（AUTO_MIGRATE=check 时只读查询 schema_migrations，不执行任何 DDL，有待执行迁移时仅告警）
+            mode = app.config.get("AUTO_MIGRATE")
+            mode = "1" if mode is True else str(mode or "0")
+            if mode == "1":
+                with startup.phase("migrations"):
+                    from .infra.migrations import run_migrations
+                    run_migrations()
+            elif mode == "check":
+                with startup.phase("migrations"):
+                    from .infra.migrations import pending_migrations
+                    pending = pending_migrations()
+                if pending:
+                    print(f"Warning: {len(pending)} pending migration(s): {', '.join(pending)}; "
+                          "run flask --app run migrate")
+
+            # 示例数据（开发环境方便起见，生产默认跳过）
+            if app.config.get("SEED_DEMO_DATA"):
+                with startup.phase("seed"):
+                    from .infra.repository import _ensure_seed_db
+                    _ensure_seed_db()
         except Exception as e:
             print(f"Warning: DB init failed (maybe connection error): {e}")
 
+    # 连接池预热、商户目录与热门菜单加载在服务进程内后台执行（见 services/warmup.py，/readyz）
+    startup.mark_app_ready()
     return app
 
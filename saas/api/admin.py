@@ -1,17 +1,18 @@
 from flask import Blueprint, request, jsonify, abort, send_from_directory
 from functools import wraps
 import os
-from werkzeug.utils import secure_filename
-import uuid
+from werkzeug.security import safe_join
 from ..infra.repository import (
     list_coupons, create_coupon, update_coupon, delete_coupon,
     list_stores, create_store, update_store, delete_store, toggle_feature,
     list_merchants, create_merchant, get_store, update_merchant, delete_merchant,
     list_merchant_users, create_merchant_user, update_merchant_user, delete_merchant_user
 )
+from ..services.storage_service import upload_file_stream, local_storage_dir
 
 
 admin_bp = Blueprint("admin_bp", __name__)
+# 合并前 /admin/upload 的本地保存目录，现仅用于读取历史文件
 UPLOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "uploads"))
 ALLOWED_IMAGE_EXTS = {"png", "jpg", "jpeg", "gif", "webp"}
 
@@ -230,24 +231,79 @@ def del_merchant_user(merchant_id, user_id):
 
 # --- File Uploads ---
 
+@admin_bp.get("/admin/db/pool")
+@require_admin
+def get_db_pool_stats():
+    """
+    数据库连接池状态：已借出/溢出连接数、累计与最大取连接等待时间
+    """
+    from ..infra.models import db
+    from ..infra.pool import pool_stats
+    return jsonify(pool_stats(db.engine))
+
+
+@admin_bp.get("/admin/storage/presign-cache")
+@require_admin
+def get_presign_cache_stats():
+    """
+    预签名 URL 缓存命中统计
+    """
+    from ..services.storage_service import presign_cache_stats
+    return jsonify(presign_cache_stats())
+
+
+@admin_bp.get("/admin/upstreams")
+@require_admin
+def get_upstream_stats():
+    """
+    上游接口（微信）熔断状态与超时配置
+    """
+    from ..services.wechat_service import register_wechat_endpoints
+    return jsonify(register_wechat_endpoints().stats())
+
+
+@admin_bp.get("/admin/startup")
+@require_admin
+def get_startup_report():
+    """
+    本进程启动各阶段耗时、首个请求耗时（冷启动观测）及预热状态（含失败原因）
+    """
+    from flask import current_app
+    from ..services.warmup import warmup_state
+    return jsonify({**current_app.extensions["startup"].to_dict(), "warmup": warmup_state()})
+
+
 @admin_bp.post("/admin/upload")
 @require_admin
 def upload_file():
+    """
+    平台后台上传图片，与 C 端共用 upload_file_stream（流式写入本地目录或 COS）
+    """
     f = request.files.get("file")
     if not f or not f.filename:
         return jsonify({"error": "No file provided"}), 400
-    filename = secure_filename(f.filename)
-    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
-    if ext not in ALLOWED_IMAGE_EXTS:
-        return jsonify({"error": "Unsupported file type"}), 400
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    new_name = f"{uuid.uuid4().hex}.{ext}"
-    save_path = os.path.join(UPLOAD_DIR, new_name)
-    f.save(save_path)
-    base = request.url_root.rstrip("/")
-    url = f"{base}/api/admin/files/{new_name}"
-    return jsonify({"url": url})
+    try:
+        res = upload_file_stream("admin", f.filename, f.stream, f.content_type, allowed_exts=ALLOWED_IMAGE_EXTS)
+    except ValueError as e:
+        if str(e) == "unsupported_type":
+            return jsonify({"error": "Unsupported file type"}), 400
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": "upload_failed", "detail": str(e)}), 500
+    # url 为永久地址，后台保存到 banner / logo / 菜品图；preview_url 为上传后立即回显用的
+    # 临时签名地址（私有读 Bucket 约 1 小时后失效），不要保存
+    url = res["url"]
+    preview_url = res.get("signed_url") or url
+    if not url.startswith("http"):
+        # 本地存储：通过下方 /admin/files 提供访问
+        base = request.url_root.rstrip("/")
+        url = preview_url = f"{base}/api/admin/files/{res['key'][len('uploads/'):]}"
+    return jsonify({"url": url, "preview_url": preview_url, "key": res["key"]})
 
 @admin_bp.get("/admin/files/<path:filename>")
 def serve_uploaded_file(filename):
+    # 本地存储目录优先，兼容合并前保存在 UPLOAD_DIR 的历史文件
+    path = safe_join(os.path.join(local_storage_dir(), "uploads"), filename)
+    if path and os.path.isfile(path):
+        return send_from_directory(os.path.join(local_storage_dir(), "uploads"), filename)
     return send_from_directory(UPLOAD_DIR, filename)
@@ -1,7 +1,7 @@
-from flask import Blueprint, request, jsonify, current_app
-from ..services.storage_service import get_presigned_url
+from flask import Blueprint, Response, request, jsonify, current_app
+from ..services.storage_service import get_presigned_url, sign_many
 from ..infra.repository import (
-    get_menu_by_store,
+    get_menu_snapshot,
     create_order,
     create_bill_order,
     list_orders,
@@ -13,7 +13,8 @@ from ..infra.repository import (
     get_wallet,
     get_store,
     Store,
-    get_merchant_by_slug,
+    resolve_merchant,
+    resolve_tenant_id,
     list_stores_by_merchant,
     list_stores,
     create_recharge_order,
@@ -22,15 +23,16 @@ from ..infra.repository import (
     list_coupons,
     review_order,
     refund_order,
-    get_order_detail
+    get_order_detail,
+    VerificationCodeUnavailable
 )
-from ..infra.models import MemberAddress, db, Merchant, Order
+from ..infra.models import MemberAddress, db, Order
 from ..infra.context import set_temporary_tenant
-from ..services.wechat_service import jsapi_unified_order, build_jsapi_params, decrypt_notify
+from ..services.wechat_service import jsapi_unified_order, jscode2session, build_jsapi_params, decrypt_notify
+from ..services.http_client import UpstreamError, call_upstream
 from ..services.storage_service import get_presigned_url
 from ..infra.models import RechargeOrder
 import os, json, time, hmac, hashlib, base64
-from urllib import request as urlreq, parse as urlparse
 
 consumer_bp = Blueprint("consumer_bp", __name__)
 
@@ -75,13 +77,14 @@ def list_stores_public():
     """
     try:
         ss = list_stores()
+        # Object Key 整页一次批量转换为 Presigned URL
+        logos = sign_many((s.get("features") or {}).get("logo_url", "") for s in ss)
         # 展平必要字段，便于前端展示
         res = []
         for s in ss:
             feats = s.get("features") or {}
             logo = feats.get("logo_url", "")
-            # 假设是 Object Key，转换为 Presigned URL
-            logo = get_presigned_url(logo)
+            logo = logos.get(logo, "") if logo else ""
             res.append({
                 "id": s.get("id"),
                 "name": s.get("name"),
@@ -122,18 +125,11 @@ def auth_login():
     if not appid or not secret:
         return jsonify({"error": "missing_wechat_config"}), 400
         
-    url = (
-        "https://api.weixin.qq.com/sns/jscode2session?" +
-        urlparse.urlencode({
-            "appid": appid,
-            "secret": secret,
-            "js_code": code,
-            "grant_type": "authorization_code"
-        })
-    )
     try:
-        resp = urlreq.urlopen(url, timeout=5)
-        data = json.loads(resp.read().decode("utf-8"))
+        # 上游调用在独立线程池中执行，并发受限，微信抖动时不占满 Web 线程
+        data = call_upstream(jscode2session, appid, secret, code)
+    except UpstreamError as e:
+        return jsonify({"error": "wechat_unavailable", "detail": str(e)}), 503
     except Exception as e:
         return jsonify({"error": "wechat_api_error", "detail": str(e)}), 500
     if data.get("errcode"):
@@ -178,21 +174,10 @@ def list_merchant_stores_public(merchant_slug):
     """
     获取商户下的所有门店（公开）
     """
-    # 1. Resolve merchant slug to UUID
-    m_info = get_merchant_by_slug(merchant_slug)
+    # 1. Resolve merchant slug (or UUID) to UUID
+    m_info = resolve_merchant(merchant_slug)
     if not m_info:
-        # Fallback: check if slug is actually a UUID
-        from ..infra.models import Merchant
-        m = Merchant.query.get(merchant_slug)
-        if m:
-            m_info = {
-                "id": m.id, 
-                "name": m.name,
-                "banner_url": m.banner_url,
-                "theme_style": m.theme_style
-            }
-        else:
-            return jsonify({"error": "merchant_not_found"}), 404
+        return jsonify({"error": "merchant_not_found"}), 404
             
     merchant_id = m_info["id"]
     
@@ -209,27 +194,9 @@ def list_merchant_stores_public(merchant_slug):
 
 @consumer_bp.get('/merchants/<merchant_slug>/decoration')
 def get_merchant_decoration(merchant_slug):
-    m_info = get_merchant_by_slug(merchant_slug)
+    m_info = resolve_merchant(merchant_slug)
     if not m_info:
-        m = Merchant.query.get(merchant_slug)
-        if not m:
-            return jsonify({"error": "merchant_not_found"}), 404
-        banner_key = m.banner_url or ""
-        banner_url = banner_key
-        if banner_key:
-            try:
-                tmp = get_presigned_url(banner_key)
-                if tmp:
-                    banner_url = tmp
-            except Exception:
-                banner_url = banner_key
-        return jsonify({
-            "id": m.id,
-            "slug": m.slug,
-            "name": m.name,
-            "banner_url": banner_url,
-            "theme_style": m.theme_style or "light"
-        })
+        return jsonify({"error": "merchant_not_found"}), 404
     banner_key = m_info.get("banner_url") or ""
     banner_url = banner_key
     if banner_key:
@@ -288,14 +255,9 @@ def get_member_assets():
     if not merchant_input:
         return jsonify({"error": "merchant_id required"}), 400
     
-    m = Merchant.query.get(merchant_input)
-    if m:
-        tenant_id = m.id
-    else:
-        m_info = get_merchant_by_slug(merchant_input)
-        if not m_info:
-            return jsonify({"error": "merchant_not_found"}), 404
-        tenant_id = m_info["id"]
+    tenant_id = resolve_tenant_id(merchant_input)
+    if not tenant_id:
+        return jsonify({"error": "merchant_not_found"}), 404
     
     with set_temporary_tenant(tenant_id):
         w = get_wallet(user_id)
@@ -320,22 +282,17 @@ def get_store_info_public(store_id):
     if not store:
         return jsonify({"error": "not_found"}), 404
     
-    s_obj = Store.query.get(store_id)
-    m_banner = ""
-    m_theme = "light"
-    if s_obj:
-        m = Merchant.query.get(s_obj.tenant_id)
-        if m:
-            m_banner = m.banner_url or ""
-            # 如果是 COS Key，尝试生成预签名 URL
-            if m_banner and not m_banner.startswith("http") and not m_banner.startswith("/"):
-                try:
-                    signed = get_presigned_url(m_banner)
-                    if signed:
-                        m_banner = signed
-                except Exception:
-                    pass
-            m_theme = m.theme_style or "light"
+    # get_store 已通过商户解析缓存带出 banner / theme
+    m_banner = store.get("banner_url") or ""
+    m_theme = store.get("theme_style") or "light"
+    # 如果是 COS Key，尝试生成预签名 URL
+    if m_banner and not m_banner.startswith("http") and not m_banner.startswith("/"):
+        try:
+            signed = get_presigned_url(m_banner)
+            if signed:
+                m_banner = signed
+        except Exception:
+            pass
     feats = store.get("features") or {}
     logo = feats.get("logo_url", "")
     if isinstance(logo, str):
@@ -376,15 +333,20 @@ def get_store_info_public(store_id):
 def get_store_menu(store_id):
     """
     获取门店菜单
+    返回预序列化的菜单快照，支持 If-None-Match 协商缓存（命中进程缓存时不访问 DB）
     """
-    # 必须切换到租户上下文，否则 filter_by(tenant_id) 会过滤失败或报错
-    store = Store.query.get(store_id)
-    if not store:
+    snap = get_menu_snapshot(store_id)
+    if not snap:
         return jsonify({"error": "store_not_found"}), 404
-        
-    with set_temporary_tenant(store.tenant_id):
-        menu = get_menu_by_store(store_id)
-        return jsonify(menu)
+
+    if request.if_none_match.contains(snap["etag"]):
+        resp = Response(status=304)
+    else:
+        resp = Response(snap["body"], mimetype="application/json")
+    resp.set_etag(snap["etag"])
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Menu-Version"] = str(snap["version"])
+    return resp
 
 
 @consumer_bp.route('/orders', methods=['POST'])
@@ -421,6 +383,8 @@ def create_order_endpoint():
             # Also ensure scene, table_code, etc. are correct if logic needs them
             order = create_order(payload)
             return jsonify(order)
+        except VerificationCodeUnavailable:
+            return jsonify({"error": "verification_code_unavailable"}), 503
         except Exception as e:
             # Log error stack trace for debugging 500s or hidden errors
             import traceback
@@ -481,11 +445,16 @@ def pay_order_prepay(order_id):
     s = Store.query.get(store_id)
     if not s:
         return jsonify({"error": "store_not_found"}), 404
-    m = Merchant.query.get(s.tenant_id)
-    appid = request.headers.get("X-WX-AppID") or (m.slug if m else "")
+    m = resolve_merchant(s.tenant_id)
+    appid = request.headers.get("X-WX-AppID") or (m["slug"] if m else "")
     mchid = request.headers.get("X-WX-MchID") or ""
     notify_url = request.url_root.rstrip("/") + "/api/orders/pay/notify"
-    prepay = jsapi_unified_order(appid, mchid, openid, "Order Payment", order.id, order.price_payable_cents, notify_url, request.remote_addr)
+    try:
+        prepay = call_upstream(jsapi_unified_order, appid, mchid, openid, "Order Payment", order.id, order.price_payable_cents, notify_url, request.remote_addr)
+    except UpstreamError as e:
+        return jsonify({"error": "wechat_unavailable", "detail": str(e)}), 503
+    if prepay.get("error") == "wechat_unavailable":
+        return jsonify(prepay), 503
     if prepay.get("error"):
         return jsonify(prepay), 400
     params = build_jsapi_params(appid, prepay.get("prepay_id", ""))
@@ -633,14 +602,9 @@ def recharge_my_wallet():
     total_add = amount + bonus
     
     # 获取租户上下文（按商户）
-    m = Merchant.query.get(merchant_input)
-    if m:
-        tenant_id = m.id
-    else:
-        m_info = get_merchant_by_slug(merchant_input)
-        if not m_info:
-            return jsonify({"error": "merchant_not_found"}), 404
-        tenant_id = m_info["id"]
+    tenant_id = resolve_tenant_id(merchant_input)
+    if not tenant_id:
+        return jsonify({"error": "merchant_not_found"}), 404
         
     with set_temporary_tenant(tenant_id):
         # 注意：这里直接修改余额，实际项目应创建充值订单->支付->回调
@@ -663,20 +627,21 @@ def wallet_recharge_prepay():
     if amount >= 10000:
         bonus = 1000
     openid = payload.get("openid") or user_id
-    m = Merchant.query.get(merchant_input)
-    if m:
-        tenant_id = m.id
-    else:
-        m_info = get_merchant_by_slug(merchant_input)
-        if not m_info:
-            return jsonify({"error": "merchant_not_found"}), 404
-        tenant_id = m_info["id"]
+    tenant_id = resolve_tenant_id(merchant_input)
+    if not tenant_id:
+        return jsonify({"error": "merchant_not_found"}), 404
     with set_temporary_tenant(tenant_id):
         order = create_recharge_order(user_id, amount, bonus, "WX_JSAPI")
-        appid = request.headers.get("X-WX-AppID") or (Merchant.query.get(tenant_id).slug if Merchant.query.get(tenant_id) else "")
+        m_info = resolve_merchant(tenant_id)
+        appid = request.headers.get("X-WX-AppID") or (m_info["slug"] if m_info else "")
         mchid = request.headers.get("X-WX-MchID") or ""
         notify_url = (request.url_root.rstrip("/") + "/api/wallet/recharge/notify")
-        prepay = jsapi_unified_order(appid, mchid, openid, "Wallet Recharge", order["id"], amount, notify_url)
+        try:
+            prepay = call_upstream(jsapi_unified_order, appid, mchid, openid, "Wallet Recharge", order["id"], amount, notify_url)
+        except UpstreamError as e:
+            return jsonify({"error": "wechat_unavailable", "detail": str(e)}), 503
+        if prepay.get("error"):
+            return jsonify(prepay), 503 if prepay["error"] == "wechat_unavailable" else 400
         params = build_jsapi_params(appid, prepay.get("prepay_id", ""))
         return jsonify({
             "order_id": order["id"],
@@ -705,14 +670,9 @@ def wallet_recharge_orders():
     if not merchant_input:
         return jsonify({"error": "merchant_id required"}), 400
     user_id = request.headers.get("X-User-ID", "guest")
-    m = Merchant.query.get(merchant_input)
-    if m:
-        tenant_id = m.id
-    else:
-        m_info = get_merchant_by_slug(merchant_input)
-        if not m_info:
-            return jsonify({"error": "merchant_not_found"}), 404
-        tenant_id = m_info["id"]
+    tenant_id = resolve_tenant_id(merchant_input)
+    if not tenant_id:
+        return jsonify({"error": "merchant_not_found"}), 404
     with set_temporary_tenant(tenant_id):
         data = list_recharge_orders(user_id)
         return jsonify(data)
@@ -737,16 +697,24 @@ def wallet_recharge_notify():
 @consumer_bp.get("/orders")
 def get_orders():
     """
-    查询我的订单
-    Query: store_id
+    查询我的订单（游标分页）
+    Query: store_id, status, cursor, limit (默认 50，最大 200；limit 与 cursor 均未传时返回最近 200 条)
     Header: X-User-ID
+    Response Header: X-Next-Cursor 下一页游标，为空表示没有更多
     """
     store_id = request.args.get("store_id")
     status = request.args.get("status")
     user_id = request.headers.get("X-User-ID", "guest")
     from ..infra.repository import list_orders_by_user
-    data = list_orders_by_user(user_id, status, store_id)
-    return jsonify(data)
+    try:
+        page = list_orders_by_user(user_id, status, store_id,
+                                   cursor=request.args.get("cursor"),
+                                   limit=request.args.get("limit"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    resp = jsonify(page["items"])
+    resp.headers["X-Next-Cursor"] = page["next_cursor"] or ""
+    return resp
 
 
 @consumer_bp.post("/members/bind_phone")
@@ -762,14 +730,9 @@ def post_bind_phone():
         return jsonify({"error": "phone required"}), 400
     payload["user_id"] = phone
     
-    m = Merchant.query.get(merchant_input)
-    if m:
-        tenant_id = m.id
-    else:
-        m_info = get_merchant_by_slug(merchant_input)
-        if not m_info:
-            return jsonify({"error": "merchant_not_found"}), 404
-        tenant_id = m_info["id"]
+    tenant_id = resolve_tenant_id(merchant_input)
+    if not tenant_id:
+        return jsonify({"error": "merchant_not_found"}), 404
         
     with set_temporary_tenant(tenant_id):
         result = bind_phone(payload)
@@ -782,14 +745,9 @@ def post_member_profile():
     if not merchant_input:
         return jsonify({"error": "merchant_id required"}), 400
     payload["user_id"] = request.headers.get("X-User-ID", "guest")
-    m = Merchant.query.get(merchant_input)
-    if m:
-        tenant_id = m.id
-    else:
-        m_info = get_merchant_by_slug(merchant_input)
-        if not m_info:
-            return jsonify({"error": "merchant_not_found"}), 404
-        tenant_id = m_info["id"]
+    tenant_id = resolve_tenant_id(merchant_input)
+    if not tenant_id:
+        return jsonify({"error": "merchant_not_found"}), 404
     with set_temporary_tenant(tenant_id):
         result = update_member_profile(payload)
         return jsonify(result)
@@ -805,22 +763,11 @@ def get_member_profile():
     if not merchant_input:
         return jsonify({"error": "merchant_id required"}), 400
     user_id = request.headers.get("X-User-ID", "guest")
-    m = Merchant.query.get(merchant_input)
-    if m:
-        tenant_id = m.id
-    else:
-        m_info = get_merchant_by_slug(merchant_input)
-        if not m_info:
-            return jsonify({"error": "merchant_not_found"}), 404
-        tenant_id = m_info["id"]
+    tenant_id = resolve_tenant_id(merchant_input)
+    if not tenant_id:
+        return jsonify({"error": "merchant_not_found"}), 404
     from ..infra.models import Member
-    from ..infra.repository import _ensure_member_profile_columns
     with set_temporary_tenant(tenant_id):
-        # 保障缺失列（老库）在运行时补齐
-        try:
-            _ensure_member_profile_columns()
-        except Exception:
-            pass
         mem = Member.query.filter_by(user_id=user_id, tenant_id=tenant_id).first()
         # 统一返回前端所需字段，暂未存储的字段使用合理默认值
         return jsonify({
@@ -945,14 +892,12 @@ def upload_file():
         return jsonify({"error": "file required"}), 400
     filename = getattr(f, "filename", "upload.bin") or "upload.bin"
     content_type = getattr(f, "content_type", "application/octet-stream")
-    data = f.read()
-    if not data:
-        return jsonify({"error": "empty_file"}), 400
-    if len(data) > 5 * 1024 * 1024:
-        return jsonify({"error": "file_too_large"}), 400
     try:
         from ..services.storage_service import upload_file_stream
-        res = upload_file_stream(user_id, filename, data, content_type)
+        # 流式上传：边读边校验 5MB 上限（UPLOAD_MAX_BYTES），不整体读入内存
+        res = upload_file_stream(user_id, filename, f.stream, content_type)
         return jsonify(res)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": "upload_failed", "detail": str(e)}), 500
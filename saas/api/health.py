@@ -0,0 +1,35 @@
+from flask import Blueprint, jsonify, current_app
+from ..services.warmup import is_ready, start_warmup, workers_state, container_ready, mark_container_ready
+
+health_bp = Blueprint("health_bp", __name__)
+
+
+@health_bp.get("/healthz")
+def healthz():
+    """
+    存活探针：进程能处理请求即返回 200，不访问数据库
+    """
+    return jsonify({"status": "ok"})
+
+
+@health_bp.get("/readyz")
+def readyz():
+    """
+    就绪探针：本容器所有 worker 预热（mapper、连接池、商户目录、热门菜单）完成后返回 200，否则 503
+    首次就绪后只要求至少一个 worker 就绪（回收补充的 worker 预热期间不影响整个容器）
+    未鉴权接口，只返回各状态的 worker 数；失败原因见 GET /api/admin/startup
+    """
+    app = current_app._get_current_object()
+    if not is_ready():
+        # 未经 gunicorn post_fork / run.py 启动的部署方式，在首次探测时触发预热
+        start_warmup(app)
+    workers = workers_state(app)
+    if container_ready(app):
+        ready = workers["ready"] > 0
+    else:
+        ready = is_ready() and not workers["warming"]
+        if ready:
+            mark_container_ready(app)
+    if not ready:
+        return jsonify({"status": "warming_up", "workers": workers}), 503
+    return jsonify({"status": "ready", "workers": workers})
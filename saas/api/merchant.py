@@ -7,7 +7,7 @@ from ..infra.repository import (
     list_console_orders, accept_order, complete_order, metrics_today, metrics_range,
     list_store_items, create_store_item, update_store_item, toggle_store_item, sort_store_items,
     list_stores_by_merchant, update_store, get_store,
-    list_store_categories, create_store_category, get_merchant_by_slug, sort_store_categories,
+    list_store_categories, create_store_category, resolve_tenant_id, sort_store_categories,
     authenticate_merchant_user, update_merchant, verify_order
 )
 from ..services.storage_service import upload_file_stream, get_presigned_url
@@ -50,14 +50,8 @@ def list_my_stores():
     """
     mid_input = request.args.get("merchant_id", "m1")
     
-    # 尝试将输入视为 Slug 解析
-    m = get_merchant_by_slug(mid_input)
-    if m:
-        # 如果是有效的 Slug，使用其 UUID 查询
-        mid = m["id"]
-    else:
-        # 否则假设它是 UUID (或者查不到)
-        mid = mid_input
+    # 将 Slug 或 UUID 解析为 UUID（走商户解析缓存）；查不到时按原值查询
+    mid = resolve_tenant_id(mid_input) or mid_input
         
     return jsonify(list_stores_by_merchant(mid))
 
@@ -65,11 +59,26 @@ def list_my_stores():
 @merchant_bp.route('/store_console/orders', methods=['GET'])
 def list_orders_endpoint():
     """
-    商家端订单列表
-    Query: status (CREATED | PAID | MAKING | DONE)
+    商家端订单列表（游标分页）
+    Query: status (CREATED | PAID | MAKING | DONE), store_id,
+           start/end (YYYY-MM-DD 或时间戳), cursor, limit (默认 50，最大 200；limit 与 cursor 均未传时返回最近 200 条)
+    Response Header: X-Next-Cursor 下一页游标，为空表示没有更多
     """
-    status = request.args.get("status")
-    return jsonify(list_console_orders(status))
+    args = request.args
+    try:
+        page = list_console_orders(
+            args.get("status"),
+            store_id=args.get("store_id"),
+            start=args.get("start"),
+            end=args.get("end"),
+            cursor=args.get("cursor"),
+            limit=args.get("limit"),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    resp = jsonify(page["items"])
+    resp.headers["X-Next-Cursor"] = page["next_cursor"] or ""
+    return resp
 
 
 @merchant_bp.route('/store_console/orders/<order_id>/accept', methods=['POST'])
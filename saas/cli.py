@@ -0,0 +1,90 @@
+import click
+
+
+def register_commands(app):
+    """
+    注册运维命令，使用方式：flask --app run <command>
+    """
+
+    @app.cli.command("migrate")
+    @click.option("--status", is_flag=True, help="只列出未执行的迁移")
+    def migrate_command(status):
+        """执行未执行的 schema 迁移（带数据库锁，可重复执行）"""
+        from .infra.migrations import run_migrations, pending_migrations
+        if status:
+            pending = pending_migrations()
+            click.echo("\n".join(pending) if pending else "Schema is up to date")
+            return
+        applied = run_migrations()
+        click.echo(f"Applied {len(applied)} migration(s): {', '.join(applied)}" if applied else "Schema is up to date")
+
+    @app.cli.command("rebuild-metrics")
+    @click.option("--tenant-id", default=None, help="仅重建指定租户（商户 UUID），默认全部")
+    def rebuild_metrics_command(tenant_id):
+        """根据订单与支付记录重建门店日聚合 store_daily_metrics"""
+        from .infra.repository import rebuild_store_daily_metrics
+        rows = rebuild_store_daily_metrics(tenant_id)
+        click.echo(f"Rebuilt store_daily_metrics: {rows} rows")
+
+    @app.cli.command("rebuild-ratings")
+    def rebuild_ratings_command():
+        """根据订单评价重建门店评分聚合 store_ratings"""
+        from .infra.repository import rebuild_store_ratings
+        stores = rebuild_store_ratings()
+        click.echo(f"Rebuilt store_ratings: {stores} stores")
+
+    @app.cli.command("mint-verification-codes")
+    @click.argument("tenant_id")
+    @click.option("--count", default=1000, show_default=True, help="生成数量")
+    def mint_verification_codes_command(tenant_id, count):
+        """为指定租户预生成核销码放入码池"""
+        from .infra.repository import mint_verification_codes
+        added = mint_verification_codes(tenant_id, count)
+        click.echo(f"Minted {added} verification codes for {tenant_id}")
+
+    @app.cli.command("sweep-orders")
+    @click.option("--batch-size", default=None, type=int, help="每批取消的最大订单数，默认 ORDER_SWEEP_BATCH_SIZE")
+    @click.option("--max-batches", default=None, type=int, help="最多执行的批数，默认直到清理完毕")
+    def sweep_orders_command(batch_size, max_batches):
+        """批量取消超时未支付的订单"""
+        from .infra.repository import sweep_expired_orders
+        batch_size = batch_size or app.config.get("ORDER_SWEEP_BATCH_SIZE") or 500
+        cancelled = sweep_expired_orders(batch_size=batch_size, max_batches=max_batches)
+        click.echo(f"Cancelled {cancelled} expired orders")
+
+    @app.cli.command("check-wallets")
+    @click.option("--user-id", default=None, help="仅检查指定用户")
+    def check_wallets_command(user_id):
+        """按钱包流水重算余额，列出与 wallets.balance_cents 不一致的钱包"""
+        from .infra.repository import check_wallet_ledger
+        mismatches = check_wallet_ledger(user_id)
+        for m in mismatches:
+            click.echo(f"wallet={m['wallet_id']} user={m['user_id']} balance={m['balance_cents']} ledger={m['ledger_cents']}")
+        click.echo(f"{len(mismatches)} inconsistent wallet(s)")
+        if mismatches:
+            raise SystemExit(1)
+
+    @app.cli.command("generate-image-variants")
+    @click.option("--store-id", default=None, help="仅处理指定门店，默认全部")
+    def generate_image_variants_command(store_id):
+        """为已有菜品图片补生成缩略图 / WebP，并重建菜单快照"""
+        from .infra.media import upload_key_from_url, is_variant_source
+        from .infra.repository import list_item_image_urls, rebuild_menu_snapshot, mark_image_variants_ready
+        from .services.image_service import generate_image_variants
+        rows = list_item_image_urls(store_id)
+        done, failed = set(), 0
+        for _, url in rows:
+            key = upload_key_from_url(url)
+            if not key or not is_variant_source(key) or key in done:
+                continue
+            try:
+                generate_image_variants(key)
+                mark_image_variants_ready(key, refresh=False)
+                done.add(key)
+            except Exception as e:
+                failed += 1
+                click.echo(f"Failed {key}: {e}")
+        stores = {sid for sid, _ in rows}
+        for sid in stores:
+            rebuild_menu_snapshot(sid)
+        click.echo(f"Generated variants for {len(done)} images ({failed} failed), rebuilt {len(stores)} menu snapshots")
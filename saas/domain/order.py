@@ -1,6 +1,6 @@
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import uuid
 import time
 
@@ -92,10 +92,11 @@ class Order:
         }
 
 
-def new_order(payload: Dict[str, Any]) -> Order:
+def new_order(payload: Dict[str, Any], price_map: Optional[Dict[str, Dict[str, Any]]] = None) -> Order:
     """
     创建新订单（工厂方法）
     :param payload: 下单请求参数
+    :param price_map: Service 层预先解析的 {item_id: {"name", "price_cents"}}，提供时以其为准
     :return: 初始化状态的订单对象
     """
     store_id = str(payload.get("store_id", "1"))
@@ -125,13 +126,17 @@ def new_order(payload: Dict[str, Any]) -> Order:
         items = []
     else:
         for it in items_payload:
-            price = int(it.get("price_cents", 0))
+            item_id = str(it.get("item_id", ""))
+            info = price_map.get(item_id) if price_map is not None else it
+            if not info:
+                continue
+            price = int(info.get("price_cents", 0))
             qty = int(it.get("quantity", 1))
             total += price * qty
             items.append(
                 OrderItemSnapshot(
-                    item_id=str(it.get("item_id", "")),
-                    name=str(it.get("name", "")),
+                    item_id=item_id,
+                    name=str(info.get("name", "")),
                     price_cents=price,
                     quantity=qty,
                     specs=it.get("specs", []) or [],
@@ -150,7 +155,7 @@ def new_order(payload: Dict[str, Any]) -> Order:
     rand_suffix = random.randint(100000, 999999)
     order_id = f"{ts}{rand_suffix}"
     
-    # 2. seq_no: 根据场景生成前缀，且每日唯一随机
+    # 2. seq_no: 根据场景生成前缀，门店内每日顺序递增且唯一
     prefix = ""
     if scene == "TABLE":
         prefix = "A"
@@ -163,49 +168,24 @@ def new_order(payload: Dict[str, Any]) -> Order:
     seq_no = ""
     if prefix:
         try:
-            from ..infra.repository import is_seq_no_exists_today
-            # 尝试生成唯一随机码，最多重试 5 次
-            for _ in range(5):
-                rand_suffix = f"{random.randint(0, 9999):04d}"
-                candidate = f"{prefix}{rand_suffix}"
-                if not is_seq_no_exists_today(store_id, candidate):
-                    seq_no = candidate
-                    break
-            
-            # 如果多次重试仍失败（极低概率），兜底使用最后生成的随机码
-            if not seq_no:
-                 seq_no = f"{prefix}{random.randint(0, 9999):04d}"
-                 
+            from ..infra.repository import allocate_seq_no
         except ImportError:
             # 单元测试或无 DB 环境下的 fallback
             seq_no = f"{prefix}{random.randint(0, 9999):04d}"
-        except Exception as e:
-            print(f"Error generating seq_no: {e}")
-            seq_no = f"{prefix}{random.randint(0, 9999):04d}"
+        else:
+            # 分配失败直接抛出，避免生成重复取餐号
+            seq_no = allocate_seq_no(store_id, prefix)
     
-    # 3. verification_code: 如果是 COUPON 订单，生成12位唯一核销码
+    # 3. verification_code: 如果是 COUPON 订单，从租户码池领取12位唯一核销码
     verification_code = ""
     if scene == "COUPON":
         try:
-            from ..infra.repository import is_verification_code_exists
-            import string
-            # 字母+数字，去除易混淆字符 (I, O, 0, 1)
-            chars = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
-            for _ in range(5):
-                # 生成12位
-                code = "".join(random.choices(chars, k=12))
-                if not is_verification_code_exists(code):
-                    verification_code = code
-                    break
-            if not verification_code:
-                verification_code = "".join(random.choices(chars, k=12))
+            from ..infra.repository import claim_verification_code
         except ImportError:
             chars = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
             verification_code = "".join(random.choices(chars, k=12))
-        except Exception as e:
-            print(f"Error generating verification_code: {e}")
-            chars = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
-            verification_code = "".join(random.choices(chars, k=12))
+        else:
+            verification_code = claim_verification_code(order_id)
 
     order = Order(
         id=order_id,
@@ -250,3 +230,11 @@ def can_transition(current: OrderStatus, target: OrderStatus) -> bool:
     if current == OrderStatus.DONE and target == OrderStatus.REVIEWED:
         return True
     return False
+
+
+def allowed_predecessors(target: OrderStatus) -> List[OrderStatus]:
+    """
+    允许流转到 target 的前置状态集合（由 can_transition 推导）
+    用于条件更新：UPDATE ... WHERE status IN (前置状态)
+    """
+    return [s for s in OrderStatus if can_transition(s, target)]
@@ -43,10 +43,8 @@ def tenant_context_middleware():
         # 尝试解析 Slug -> UUID
         # 如果长度不为32（UUID hex），则尝试作为 Slug 查询商户
         if len(tenant_id) != 32:
-            from .models import Merchant
-            # 注意：这里可能会在请求早期触发 DB 查询
-            m = Merchant.query.filter_by(slug=tenant_id).first()
-            if m:
-                tenant_id = m.id
+            from .repository import resolve_tenant_id
+            # 走商户解析缓存，命中时不触发 DB 查询
+            tenant_id = resolve_tenant_id(tenant_id) or tenant_id
                 
         g.tenant_id = tenant_id
@@ -0,0 +1,96 @@
+import os
+from typing import Callable, Dict, List, Optional
+
+# 上传图片的派生文件（缩略图 / WebP）与原图放在同一目录：<原图去扩展名>@<后缀>
+# 例如 uploads/u1/1700000000-ab12-photo.jpg -> uploads/u1/1700000000-ab12-photo@thumb.jpg
+# 变体名 -> (最长边像素, 文件后缀, Pillow 格式)
+IMAGE_VARIANTS = {
+    "thumb": (360, "thumb.jpg", "JPEG"),
+    "thumb_webp": (360, "thumb.webp", "WEBP"),
+    "large_webp": (1080, "large.webp", "WEBP"),
+}
+# 生成派生图的原图格式（gif 可能是动图，不处理）
+VARIANT_SOURCE_EXTS = {"jpg", "jpeg", "png", "webp"}
+
+
+def _split_ext(path: str):
+    head, _, name = path.rpartition("/")
+    if "." not in name:
+        return None, None
+    root, ext = name.rsplit(".", 1)
+    return (f"{head}/{root}" if head else root), ext.lower()
+
+
+def is_variant_source(key: str) -> bool:
+    root, ext = _split_ext(key or "")
+    return ext in VARIANT_SOURCE_EXTS and "@" not in root.rsplit("/", 1)[-1]
+
+
+def variant_key(key: str, variant: str) -> str:
+    root, _ = _split_ext(key)
+    return f"{root}@{IMAGE_VARIANTS[variant][1]}"
+
+
+def upload_key_from_url(url: str) -> Optional[str]:
+    """
+    从 image_url（COS 地址 / 本地静态地址 / 平台后台文件地址 / 对象键）还原上传对象键
+    非本系统上传的图片返回 None
+    """
+    if not url:
+        return None
+    path = url.split("?", 1)[0]
+    if path.startswith("uploads/"):
+        return path
+    idx = path.find("/uploads/")
+    if idx >= 0:
+        return path[idx + 1:]
+    rest = ""
+    static_prefix = (os.getenv("STORAGE_LOCAL_STATIC_PREFIX") or "/static") + "/"
+    if path.startswith(static_prefix):
+        rest = path[len(static_prefix):]
+    elif "/api/admin/files/" in path:
+        rest = path.split("/api/admin/files/", 1)[1]
+    # 合并上传前平台后台的文件没有目录层级，也没有派生图
+    if "/" in rest:
+        return "uploads/" + rest
+    return None
+
+
+# Item 对外字段 -> 派生图
+VARIANT_FIELDS = {
+    "thumbnail_url": "thumb",
+    "thumbnail_webp_url": "thumb_webp",
+    "image_webp_url": "large_webp",
+}
+
+
+def variant_urls(url: str, sign: Optional[Callable[[List[str]], Dict[str, str]]] = None) -> Dict[str, str]:
+    """
+    图片地址对应的派生图地址 {字段: url}，调用方须确认派生图已生成
+    原图是签名地址（私有读）时派生图按对象键单独签名（sign 返回 {key: url}），无法签名的回退为原图
+    """
+    key = upload_key_from_url(url)
+    if not key or not is_variant_source(key):
+        return {f: url for f in VARIANT_FIELDS}
+    path, _, query = url.partition("?")
+    if query:
+        keys = {f: variant_key(key, v) for f, v in VARIANT_FIELDS.items()}
+        signed = sign(list(keys.values())) if sign else {}
+        return {f: signed.get(k) or url for f, k in keys.items()}
+    root, _ = _split_ext(path)
+    return {f: f"{root}@{IMAGE_VARIANTS[v][1]}" for f, v in VARIANT_FIELDS.items()}
+
+
+def sign_variant_keys(items: List[Dict[str, str]], sign: Callable[[List[str]], Dict[str, str]]) -> bool:
+    """
+    菜单快照中签名原图的派生图只保存对象键（签名会过期），返回响应前在此批量签名，无法签名的回退为原图
+    返回是否有字段被替换
+    """
+    pending = [(d, f) for d in items if "?" in (d.get("image_url") or "")
+               for f in VARIANT_FIELDS if (d.get(f) or "").startswith("uploads/")]
+    if not pending:
+        return False
+    signed = sign(list({d[f] for d, f in pending}))
+    for d, f in pending:
+        d[f] = signed.get(d[f]) or d["image_url"]
+    return True
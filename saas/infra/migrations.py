@@ -1,24 +1,200 @@
+import time
+from typing import Callable, List, Tuple
 from sqlalchemy import text, inspect
-from .models import db
+from .models import db, SchemaMigration, OrderSeqCounter, VerificationCode, WalletLedger, MediaVariant
 
-def run_auto_migrations():
+# 版本化 schema 迁移
+# - 每个迁移只执行一次，执行记录写入 schema_migrations
+# - 部署/启动时执行（flask --app run migrate 或 create_app 中 AUTO_MIGRATE），请求路径假定 schema 已是最新
+# - MySQL 下通过 GET_LOCK 互斥，多实例同时启动时只有一个进程执行迁移
+# 新增迁移：在 MIGRATIONS 末尾追加，版本号递增，已发布的迁移不要修改
+
+MIGRATION_LOCK_NAME = "saas_schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 60
+
+
+def _columns(conn, table: str) -> set:
+    insp = inspect(conn)
+    if not insp.has_table(table):
+        return set()
+    return {c['name'] for c in insp.get_columns(table)}
+
+
+def _indexes(conn, table: str) -> set:
+    insp = inspect(conn)
+    if not insp.has_table(table):
+        return set()
+    return {ix['name'] for ix in insp.get_indexes(table)}
+
+
+def _add_columns(conn, table: str, columns: List[Tuple[str, str]]) -> None:
+    existing = _columns(conn, table)
+    for name, ddl in columns:
+        if name not in existing:
+            print(f"Migrating: Adding {name} to {table}...")
+            conn.execute(text(ddl))
+
+
+def _create_indexes(conn, table: str, indexes: List[Tuple[str, str]]) -> None:
+    existing = _indexes(conn, table)
+    for name, ddl in indexes:
+        if name not in existing:
+            print(f"Migrating: Creating index {name} on {table}...")
+            conn.execute(text(ddl))
+
+
+def _0001_create_tables(conn) -> None:
+    # 建立所有缺失的表（已存在的表不会被修改）
+    db.metadata.create_all(bind=conn, checkfirst=True)
+
+
+def _0002_orders_columns(conn) -> None:
+    _add_columns(conn, "orders", [
+        ("seq_no", "ALTER TABLE orders ADD COLUMN seq_no VARCHAR(16) DEFAULT ''"),
+        ("completed_at", "ALTER TABLE orders ADD COLUMN completed_at BIGINT"),
+        ("verification_code", "ALTER TABLE orders ADD COLUMN verification_code VARCHAR(32) DEFAULT ''"),
+    ])
+    # 历史上 fix_db.py / 运行时补丁分别使用过 ix_ / idx_ 两种命名
+    existing = _indexes(conn, "orders")
+    if not existing & {"ix_orders_verification_code", "idx_orders_verification_code"}:
+        conn.execute(text("CREATE INDEX ix_orders_verification_code ON orders (verification_code)"))
+
+
+def _0003_coupons_store_id(conn) -> None:
+    _add_columns(conn, "coupons", [
+        ("store_id", "ALTER TABLE coupons ADD COLUMN store_id VARCHAR(32)"),
+    ])
+
+
+def _0004_members_profile_columns(conn) -> None:
+    _add_columns(conn, "members", [
+        ("nickname", "ALTER TABLE members ADD COLUMN nickname VARCHAR(64) DEFAULT ''"),
+        ("realname", "ALTER TABLE members ADD COLUMN realname VARCHAR(64) DEFAULT ''"),
+        ("gender", "ALTER TABLE members ADD COLUMN gender VARCHAR(16) DEFAULT 'male'"),
+        ("birthday", "ALTER TABLE members ADD COLUMN birthday VARCHAR(32) DEFAULT ''"),
+        ("avatar_url", "ALTER TABLE members ADD COLUMN avatar_url VARCHAR(512) DEFAULT ''"),
+    ])
+
+
+def _0005_orders_feed_indexes(conn) -> None:
+    _create_indexes(conn, "orders", [
+        ("ix_orders_tenant_store_status_created", "CREATE INDEX ix_orders_tenant_store_status_created ON orders (tenant_id, store_id, status, created_at)"),
+        ("ix_orders_tenant_created", "CREATE INDEX ix_orders_tenant_created ON orders (tenant_id, created_at, id)"),
+        ("ix_orders_user_created", "CREATE INDEX ix_orders_user_created ON orders (user_id, created_at, id)"),
+    ])
+
+
+def _0006_order_seq_counters(conn) -> None:
+    OrderSeqCounter.__table__.create(bind=conn, checkfirst=True)
+
+
+def _0007_verification_codes(conn) -> None:
+    VerificationCode.__table__.create(bind=conn, checkfirst=True)
+    # 存量 COUPON 订单的核销码迁入码池（租户内重复的历史码只保留一条）
+    ignore = "INSERT IGNORE" if conn.dialect.name == "mysql" else "INSERT OR IGNORE"
+    conn.execute(text(
+        f"{ignore} INTO verification_codes (tenant_id, code, order_id, created_at, assigned_at) "
+        "SELECT tenant_id, verification_code, id, created_at, created_at FROM orders "
+        "WHERE verification_code IS NOT NULL AND verification_code <> ''"
+    ))
+
+
+def _0008_orders_status_created_index(conn) -> None:
+    _create_indexes(conn, "orders", [
+        ("ix_orders_status_created", "CREATE INDEX ix_orders_status_created ON orders (status, created_at)"),
+    ])
+
+
+def _0009_wallet_ledger(conn) -> None:
+    WalletLedger.__table__.create(bind=conn, checkfirst=True)
+    # 存量余额记为期初流水，使 SUM(delta_cents) 与 balance_cents 对齐
+    conn.execute(text(
+        "INSERT INTO wallet_ledger (tenant_id, wallet_id, user_id, kind, delta_cents, balance_cents, ref_id, created_at) "
+        "SELECT tenant_id, id, user_id, 'OPENING', balance_cents, balance_cents, '', :now FROM wallets "
+        "WHERE balance_cents IS NOT NULL AND balance_cents <> 0"
+    ), {"now": int(time.time())})
+
+
+def _0010_orders_prev_status(conn) -> None:
+    _add_columns(conn, "orders", [
+        ("prev_status", "ALTER TABLE orders ADD COLUMN prev_status VARCHAR(16) DEFAULT ''"),
+    ])
+
+
+def _0011_media_variants(conn) -> None:
+    # 已有图片的派生图需重新执行 flask --app run generate-image-variants 登记后才会对外提供
+    MediaVariant.__table__.create(bind=conn, checkfirst=True)
+
+
+def _0012_menu_snapshots_unsigned(conn) -> None:
+    # 旧快照内含会过期的预签名派生图地址：清空 etag 标记为待重建，首次读取时重新构建（版本号递增）
+    conn.execute(text("UPDATE menu_snapshots SET etag = ''"))
+
+
+MIGRATIONS: List[Tuple[str, Callable]] = [
+    ("0001_create_tables", _0001_create_tables),
+    ("0002_orders_columns", _0002_orders_columns),
+    ("0003_coupons_store_id", _0003_coupons_store_id),
+    ("0004_members_profile_columns", _0004_members_profile_columns),
+    ("0005_orders_feed_indexes", _0005_orders_feed_indexes),
+    ("0006_order_seq_counters", _0006_order_seq_counters),
+    ("0007_verification_codes", _0007_verification_codes),
+    ("0008_orders_status_created_index", _0008_orders_status_created_index),
+    ("0009_wallet_ledger", _0009_wallet_ledger),
+    ("0010_orders_prev_status", _0010_orders_prev_status),
+    ("0011_media_variants", _0011_media_variants),
+    ("0012_menu_snapshots_unsigned", _0012_menu_snapshots_unsigned),
+]
+
+
+def _acquire_lock(conn) -> bool:
+    if conn.dialect.name != "mysql":
+        return True
+    got = conn.execute(text("SELECT GET_LOCK(:name, :timeout)"),
+                       {"name": MIGRATION_LOCK_NAME, "timeout": MIGRATION_LOCK_TIMEOUT}).scalar()
+    return got == 1
+
+
+def _release_lock(conn) -> None:
+    if conn.dialect.name != "mysql":
+        return
+    conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK_NAME})
+
+
+def pending_migrations() -> List[str]:
+    """
+    返回尚未执行的迁移版本号（只读：schema_migrations 不存在时视为全部未执行，不建表）
+    """
+    with db.engine.connect() as conn:
+        if not inspect(conn).has_table(SchemaMigration.__tablename__):
+            return [v for v, _ in MIGRATIONS]
+        applied = {r[0] for r in conn.execute(text("SELECT version FROM schema_migrations"))}
+    return [v for v, _ in MIGRATIONS if v not in applied]
+
+
+def run_migrations() -> List[str]:
     """
-    简易的自动迁移脚本，用于开发环境自动修补 schema
+    执行所有未执行的迁移，返回本次执行的版本号
     """
-    try:
-        # Use inspector to check columns
-        inspector = inspect(db.engine)
-        
-        # Check orders table
-        if inspector.has_table('orders'):
-            columns = [c['name'] for c in inspector.get_columns('orders')]
-            
-            if 'verification_code' not in columns:
-                print("Migrating: Adding verification_code to orders table...")
-                with db.engine.connect() as conn:
-                    conn.execute(text("ALTER TABLE orders ADD COLUMN verification_code VARCHAR(32) DEFAULT ''"))
-                    conn.execute(text("CREATE INDEX ix_orders_verification_code ON orders (verification_code)"))
-                    conn.commit()
-                print("Migration done: verification_code added.")
-    except Exception as e:
-        print(f"Auto migration failed: {e}")
+    done = []
+    with db.engine.connect() as conn:
+        if not _acquire_lock(conn):
+            raise RuntimeError("Could not acquire schema migration lock")
+        try:
+            SchemaMigration.__table__.create(bind=conn, checkfirst=True)
+            conn.commit()
+            applied = {r[0] for r in conn.execute(text("SELECT version FROM schema_migrations"))}
+            for version, migrate in MIGRATIONS:
+                if version in applied:
+                    continue
+                print(f"Applying migration {version}...")
+                migrate(conn)
+                conn.execute(
+                    SchemaMigration.__table__.insert().values(version=version, applied_at=int(time.time()))
+                )
+                conn.commit()
+                done.append(version)
+        finally:
+            _release_lock(conn)
+            conn.commit()
+    return done
@@ -1,11 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, String, Integer, Text, JSON, BigInteger, Boolean, UniqueConstraint
+from sqlalchemy import Column, String, Integer, Text, JSON, BigInteger, Boolean, UniqueConstraint, Index
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.dialects.mysql import LONGTEXT
+from .routing import RoutingSession
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
 
 # 租户隔离 Mixin
 class TenantMixin:
@@ -67,6 +69,10 @@ class Item(db.Model, TenantMixin):
             "category_id": self.category_id,
             "name": self.name,
             "image_url": self.image_url,
+            # 缩略图 / WebP 默认回退为原图；派生图生成后由 repository 替换（见 _item_dicts）
+            "thumbnail_url": self.image_url,
+            "thumbnail_webp_url": self.image_url,
+            "image_webp_url": self.image_url,
             "base_price_cents": self.base_price_cents,
             "status": self.status,
             "sort": self.sort
@@ -84,6 +90,8 @@ class Order(db.Model, TenantMixin):
     seq_no = Column(String(16), default="") # A001, B002
     
     status = Column(String(16), default="CREATED", index=True)
+    # 最近一次流转前的状态（update_order_status 在同一条 UPDATE 中写入，用于按原状态更新日聚合）
+    prev_status = Column(String(16), default="")
     price_total_cents = Column(Integer, default=0)
     price_payable_cents = Column(Integer, default=0)
     coupon_applied = Column(JSON, default=dict)
@@ -100,6 +108,16 @@ class Order(db.Model, TenantMixin):
     verification_code = Column(String(32), default="", index=True)
     
     # 关联 OrderItem，暂不使用 relationship，手动查询
+
+    __table_args__ = (
+        # 商家端订单流：按门店/状态过滤 + created_at 倒序游标分页
+        Index('ix_orders_tenant_store_status_created', 'tenant_id', 'store_id', 'status', 'created_at'),
+        Index('ix_orders_tenant_created', 'tenant_id', 'created_at', 'id'),
+        # C 端订单历史
+        Index('ix_orders_user_created', 'user_id', 'created_at', 'id'),
+        # 超时未支付订单清理
+        Index('ix_orders_status_created', 'status', 'created_at'),
+    )
     
     def to_dict(self):
         # 注意：items 需要额外填充
@@ -240,3 +258,93 @@ class OrderReview(db.Model, TenantMixin):
             "created_at": self.created_at,
             "updated_at": self.updated_at
         }
+
+class StoreDailyMetric(db.Model, TenantMixin):
+    __tablename__ = 'store_daily_metrics'
+    # 门店日维度经营数据预聚合，订单按下单日、支付按支付日归档
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    store_id = Column(String(32), nullable=False, index=True)
+    day_start = Column(BigInteger, nullable=False) # 当日 0 点时间戳（服务器时区）
+    orders_total = Column(Integer, default=0)
+    created_count = Column(Integer, default=0)
+    paid_count = Column(Integer, default=0)
+    making_count = Column(Integer, default=0)
+    done_count = Column(Integer, default=0)
+    wait_use_count = Column(Integer, default=0)
+    reviewed_count = Column(Integer, default=0)
+    cancelled_count = Column(Integer, default=0)
+    refunded_count = Column(Integer, default=0)
+    revenue_cents = Column(BigInteger, default=0)
+    payments_wx = Column(Integer, default=0)
+    payments_wallet = Column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint('tenant_id', 'store_id', 'day_start', name='uix_store_daily_metrics_day'),
+    )
+
+class MenuSnapshot(db.Model, TenantMixin):
+    __tablename__ = 'menu_snapshots'
+    # 门店菜单预序列化快照，菜品/分类变更时重建
+    store_id = Column(String(32), primary_key=True)
+    version = Column(Integer, default=0)
+    etag = Column(String(64), nullable=False) # body 的 sha1
+    body = Column(Text().with_variant(LONGTEXT(), "mysql"), nullable=False) # JSON 文本
+    updated_at = Column(BigInteger, nullable=True)
+
+class StoreRating(db.Model, TenantMixin):
+    __tablename__ = 'store_ratings'
+    # 门店评分聚合（仅统计 rating > 0 的评价），随 upsert_order_review 同事务维护
+    store_id = Column(String(32), primary_key=True)
+    rating_sum = Column(BigInteger, default=0)
+    rating_count = Column(Integer, default=0)
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    # 已执行的 schema 迁移版本，见 infra/migrations.py
+    version = Column(String(64), primary_key=True)
+    applied_at = Column(BigInteger, nullable=False)
+
+class OrderSeqCounter(db.Model):
+    __tablename__ = 'order_seq_counters'
+    # 门店每日取餐号计数器（按场景前缀 A/D/P 分别计数）
+    store_id = Column(String(32), primary_key=True)
+    day_start = Column(BigInteger, primary_key=True)
+    prefix = Column(String(4), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+class VerificationCode(db.Model, TenantMixin):
+    __tablename__ = 'verification_codes'
+    # 核销码池：预生成、按租户唯一；order_id 为空表示尚未发放
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    code = Column(String(16), nullable=False)
+    order_id = Column(String(64), nullable=True, index=True)
+    created_at = Column(BigInteger, nullable=False)
+    assigned_at = Column(BigInteger, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint('tenant_id', 'code', name='uix_verification_codes_tenant_code'),
+        Index('ix_verification_codes_free', 'tenant_id', 'order_id'),
+    )
+
+class WalletLedger(db.Model, TenantMixin):
+    __tablename__ = 'wallet_ledger'
+    # 钱包流水（只追加，不修改不删除），与余额变更在同一事务写入
+    # 每个钱包的 SUM(delta_cents) 应等于 wallets.balance_cents；tenant_id 为发生业务的商户（无上下文时为 platform）
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    wallet_id = Column(Integer, nullable=False)
+    user_id = Column(String(64), nullable=False, index=True)
+    kind = Column(String(16), nullable=False)  # OPENING/RECHARGE/PAY/REFUND
+    delta_cents = Column(Integer, nullable=False)
+    balance_cents = Column(Integer, nullable=False)  # 变动后余额
+    ref_id = Column(String(64), default="")  # 关联订单/充值单
+    created_at = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        Index('ix_wallet_ledger_wallet', 'wallet_id', 'id'),
+    )
+
+class MediaVariant(db.Model):
+    __tablename__ = 'media_variants'
+    # 已生成全部派生图（缩略图 / WebP）的上传对象键，未登记的图片对外回退为原图
+    key = Column(String(512), primary_key=True)
+    created_at = Column(BigInteger, nullable=False)
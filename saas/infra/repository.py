@@ -1,11 +1,19 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import time
-from sqlalchemy import func
+import base64
+import hashlib
+import json
+from sqlalchemy import func, or_, and_, update
+from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash, check_password_hash
-from .models import db, Merchant, Store, Category, Item, Order, OrderItem, Payment, Member, Wallet, Coupon, MerchantUser, RechargeOrder, OrderReview
-from ..domain.order import Order as DomainOrder, OrderStatus, can_transition, OrderItemSnapshot
+from .models import db, Merchant, Store, Category, Item, Order, OrderItem, Payment, Member, Wallet, Coupon, MerchantUser, RechargeOrder, OrderReview, StoreDailyMetric, MenuSnapshot, StoreRating, OrderSeqCounter, VerificationCode, WalletLedger, MediaVariant
+from ..domain.order import Order as DomainOrder, OrderStatus, allowed_predecessors, OrderItemSnapshot
 from .context import get_current_tenant_id, set_temporary_tenant
+from .routing import read_only, primary
+from .cache import TTLCache
+from .media import upload_key_from_url, is_variant_source, variant_urls, sign_variant_keys
 from sqlalchemy import func, text
+from flask import current_app, g, has_request_context
 
 # 兼容旧接口的 Repository 层
 
@@ -28,6 +36,27 @@ def _apply_tenant_filter(query):
     # 强制 1=0，查不到任何数据
     return query.filter(text("1=0"))
 
+def _increment_row(model, keys: Dict[str, Any], deltas: Dict[str, int]) -> None:
+    """
+    计数类聚合表的原子累加（不提交，由调用方 commit）
+    先 UPDATE col = col + delta，不存在时 INSERT；并发插入冲突时回退为 UPDATE
+    """
+    deltas = {k: int(v) for k, v in deltas.items() if v}
+    if not deltas:
+        return
+    values = {getattr(model, k): getattr(model, k) + v for k, v in deltas.items()}
+
+    def update() -> int:
+        return model.query.filter_by(**keys).update(values, synchronize_session=False)
+
+    if update():
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(model(**keys, **deltas))
+    except IntegrityError:
+        update()
+
 import uuid
 
 def _ensure_seed_db():
@@ -67,6 +96,7 @@ def _ensure_seed_db():
 
 # --- Merchant ---
 
+@read_only
 def list_merchants() -> List[Dict[str, Any]]:
     # Admin 接口，通常不需要租户隔离，或者只能看自己的
     # 这里假设是超级管理员
@@ -96,6 +126,8 @@ def create_merchant(payload: Dict[str, Any]) -> Dict[str, Any]:
     )
     db.session.add(m)
     db.session.commit()
+    # 清除该 slug 此前的负缓存
+    invalidate_merchant(m.id, m.slug)
     return {"id": m.id, "slug": m.slug, "name": m.name, "plan": m.plan}
 
 def update_merchant(merchant_id: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -118,6 +150,7 @@ def update_merchant(merchant_id: str, payload: Dict[str, Any]) -> Optional[Dict[
         m.theme_style = str(payload["theme_style"])
         
     db.session.commit()
+    invalidate_merchant(m.id, m.slug)
     return {
         "id": m.id, 
         "slug": m.slug, 
@@ -137,23 +170,106 @@ def delete_merchant(merchant_id: str) -> bool:
         return False
         
     # 需要级联删除相关数据? 暂时只删除 Merchant 本身，实际业务可能需要软删除或级联
+    mid, mslug = m.id, m.slug
     db.session.delete(m)
     db.session.commit()
+    invalidate_merchant(mid, mslug)
     return True
 
-def get_merchant_by_slug(slug: str) -> Optional[Dict[str, Any]]:
-    m = Merchant.query.filter_by(slug=slug).first()
-    if not m:
-        return None
+# 商户解析缓存：slug / UUID -> 商户基础信息，进程内共享
+# 多实例部署时其他进程依赖 TTL 过期，因此 TTL 不宜过长
+_merchant_cache = TTLCache(maxsize=2048, ttl=300)
+# 负缓存占位：key 对应的商户不存在
+_MERCHANT_NOT_FOUND = object()
+
+def _merchant_cache_ttl() -> float:
+    try:
+        return float(current_app.config.get("MERCHANT_CACHE_TTL", 300))
+    except RuntimeError:
+        return 0
+
+def _merchant_miss_ttl() -> float:
+    try:
+        return float(current_app.config.get("MERCHANT_MISS_CACHE_TTL", 30))
+    except RuntimeError:
+        return 0
+
+def _merchant_info(m: Merchant) -> Dict[str, Any]:
     return {
-        "id": m.id, 
-        "slug": m.slug, 
-        "name": m.name, 
+        "id": m.id,
+        "slug": m.slug,
+        "name": m.name,
         "plan": m.plan,
-        "banner_url": m.banner_url,
-        "theme_style": m.theme_style
+        "banner_url": m.banner_url or "",
+        "theme_style": m.theme_style or "light"
     }
 
+def resolve_merchant(key: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    按 UUID 或 slug 解析商户（带缓存）
+    同一请求内结果记在 g 上，跨请求走进程级 TTL/LRU 缓存；查不到的 key 短期负缓存
+    """
+    if not key:
+        return None
+    key = str(key)
+    memo = g.setdefault("_merchant_memo", {}) if has_request_context() else {}
+    if key in memo:
+        return memo[key]
+
+    info = _merchant_cache.get(key)
+    if info is None:
+        # 32 位为 UUID，优先按主键查；否则优先按 slug 查
+        if len(key) == 32:
+            m = Merchant.query.get(key) or Merchant.query.filter_by(slug=key).first()
+        else:
+            m = Merchant.query.filter_by(slug=key).first() or Merchant.query.get(key)
+        if m:
+            info = _merchant_info(m)
+            ttl = _merchant_cache_ttl()
+            _merchant_cache.set(m.id, info, ttl)
+            _merchant_cache.set(m.slug, info, ttl)
+        else:
+            _merchant_cache.set(key, _MERCHANT_NOT_FOUND, _merchant_miss_ttl())
+
+    res = dict(info) if info and info is not _MERCHANT_NOT_FOUND else None
+    memo[key] = res
+    return res
+
+def resolve_tenant_id(key: Optional[str]) -> Optional[str]:
+    """
+    将商户输入（UUID 或 slug）解析为 tenant_id，找不到返回 None
+    """
+    info = resolve_merchant(key)
+    return info["id"] if info else None
+
+def invalidate_merchant(*keys: Optional[str]) -> None:
+    """
+    商户信息变更（含新建）后清除缓存与负缓存（id 与 slug 都需清除）
+    """
+    for k in keys:
+        if k:
+            _merchant_cache.delete(k)
+    if has_request_context():
+        g.pop("_merchant_memo", None)
+
+def warm_merchant_directory(limit: int = 2000) -> int:
+    """
+    预加载商户解析缓存（启动预热用），返回加载的商户数
+    """
+    ttl = _merchant_cache_ttl()
+    merchants = Merchant.query.limit(limit).all()
+    for m in merchants:
+        info = _merchant_info(m)
+        _merchant_cache.set(m.id, info, ttl)
+        _merchant_cache.set(m.slug, info, ttl)
+    return len(merchants)
+
+def get_merchant_by_slug(slug: str) -> Optional[Dict[str, Any]]:
+    info = resolve_merchant(slug)
+    if not info or info["slug"] != slug:
+        return None
+    return info
+
 # --- Merchant Users ---
 
 def list_merchant_users(merchant_id: str) -> List[Dict[str, Any]]:
@@ -231,8 +347,8 @@ def authenticate_merchant_user(username: str, password: str) -> Optional[Dict[st
     
     if check_password_hash(u.password_hash, password):
         # Resolve merchant slug
-        m = Merchant.query.get(u.tenant_id)
-        merchant_slug = m.slug if m else ""
+        m = resolve_merchant(u.tenant_id)
+        merchant_slug = m["slug"] if m else ""
         
         return {
             "id": u.id,
@@ -246,22 +362,28 @@ def authenticate_merchant_user(username: str, password: str) -> Optional[Dict[st
 
 # --- Store ---
 
+def _stores_with_rating(q) -> List[Tuple[Store, Optional[float]]]:
+    """
+    门店与评分聚合一次查询取回，返回 [(Store, avg_rating | None)]
+    """
+    rows = q.add_columns(StoreRating.rating_sum, StoreRating.rating_count)\
+        .outerjoin(StoreRating, StoreRating.store_id == Store.id).all()
+    res = []
+    for s, rating_sum, rating_count in rows:
+        avg_rating = (float(rating_sum or 0) / rating_count) if rating_count else None
+        res.append((s, avg_rating))
+    return res
+
+@read_only
 def list_stores(merchant_id: Optional[str] = None) -> List[Dict[str, Any]]:
     # Admin 接口
-    q = Store.query
+    q = db.session.query(Store)
     if merchant_id:
-        q = q.filter_by(tenant_id=merchant_id)
-    ss = q.all()
+        q = q.filter(Store.tenant_id == merchant_id)
     # merchant_id property 映射到 tenant_id
     res = []
-    for s in ss:
+    for s, avg_rating in _stores_with_rating(q):
         feats = dict(s.features or {})
-        try:
-            avg_rating = db.session.query(func.avg(OrderReview.rating))\
-                .join(Order, OrderReview.order_id == Order.id)\
-                .filter(Order.store_id == s.id, OrderReview.rating > 0).scalar()
-        except Exception:
-            avg_rating = None
         res.append({
             "id": s.id,
             "slug": s.slug,
@@ -274,27 +396,22 @@ def list_stores(merchant_id: Optional[str] = None) -> List[Dict[str, Any]]:
                 "logo_url": feats.get("logo_url", ""),
                 "cuisines": feats.get("cuisines", []),
                 "business_hours": feats.get("business_hours", ""),
-                "rating": avg_rating if avg_rating is not None else None,
+                "rating": avg_rating,
                 "wallet": feats.get("wallet", False),
                 "campaign": feats.get("campaign", False),
                 "member": feats.get("member", True)
             },
-            "rating": float(avg_rating) if avg_rating is not None else None
+            "rating": avg_rating
         })
     return res
 
+@read_only
 def list_stores_by_merchant(merchant_id: str) -> List[Dict[str, Any]]:
     # 显式查询指定商户
-    ss = Store.query.filter_by(tenant_id=merchant_id).all()
+    q = db.session.query(Store).filter(Store.tenant_id == merchant_id)
     res = []
-    for s in ss:
+    for s, avg_rating in _stores_with_rating(q):
         feats = dict(s.features or {})
-        try:
-            avg_rating = db.session.query(func.avg(OrderReview.rating))\
-                .join(Order, OrderReview.order_id == Order.id)\
-                .filter(Order.store_id == s.id, OrderReview.rating > 0).scalar()
-        except Exception:
-            avg_rating = None
         res.append({
             "id": s.id,
             "slug": s.slug,
@@ -304,10 +421,38 @@ def list_stores_by_merchant(merchant_id: str) -> List[Dict[str, Any]]:
             "logo_url": feats.get("logo_url", ""),
             "cuisines": feats.get("cuisines", []),
             "business_hours": feats.get("business_hours", ""),
-            "rating": float(avg_rating) if avg_rating is not None else None
+            "rating": avg_rating
         })
     return res
 
+def _bump_store_rating(tenant_id: str, store_id: str, old_rating: int, new_rating: int) -> None:
+    """
+    评价新增/修改时同步门店评分聚合（不提交，由调用方 commit）
+    """
+    old_rating = int(old_rating or 0)
+    new_rating = int(new_rating or 0)
+    deltas = {
+        "rating_sum": (new_rating if new_rating > 0 else 0) - (old_rating if old_rating > 0 else 0),
+        "rating_count": (1 if new_rating > 0 else 0) - (1 if old_rating > 0 else 0),
+    }
+    _increment_row(StoreRating, {"tenant_id": tenant_id, "store_id": store_id}, deltas)
+
+def rebuild_store_ratings() -> int:
+    """
+    根据 order_reviews 全量重建门店评分聚合，返回门店数
+    """
+    rows = db.session.query(
+        Order.tenant_id, Order.store_id,
+        func.sum(OrderReview.rating), func.count(OrderReview.id)
+    ).join(Order, OrderReview.order_id == Order.id)\
+        .filter(OrderReview.rating > 0)\
+        .group_by(Order.tenant_id, Order.store_id).all()
+    StoreRating.query.delete(synchronize_session=False)
+    for tid, store_id, rating_sum, rating_count in rows:
+        db.session.add(StoreRating(tenant_id=tid, store_id=store_id, rating_sum=int(rating_sum or 0), rating_count=int(rating_count or 0)))
+    db.session.commit()
+    return len(rows)
+
 def create_store(payload: Dict[str, Any]) -> Dict[str, Any]:
     merchant_id = str(payload.get("merchant_id", "m1"))
     
@@ -382,7 +527,9 @@ def delete_store(store_id: str) -> bool:
     if not s:
         return False
     db.session.delete(s)
+    MenuSnapshot.query.filter_by(store_id=store_id).delete(synchronize_session=False)
     db.session.commit()
+    _menu_cache.delete(store_id)
     return True
 
 def toggle_feature(store_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -408,9 +555,9 @@ def get_store(store_id: str) -> Optional[Dict[str, Any]]:
     
     # 2025-01: Config moved to Merchant level
     # Fetch Merchant to get banner and theme
-    m = Merchant.query.get(s.tenant_id)
-    banner_url = m.banner_url if m else ""
-    theme_style = m.theme_style if m else "light"
+    m = resolve_merchant(s.tenant_id)
+    banner_url = m["banner_url"] if m else ""
+    theme_style = m["theme_style"] if m else "light"
         
     return {
         "id": s.id,
@@ -425,7 +572,11 @@ def get_store(store_id: str) -> Optional[Dict[str, Any]]:
 
 # --- Menu ---
 
-def get_menu_by_store(store_id: str) -> Dict[str, Any]:
+@read_only
+def get_menu_by_store(store_id: str, sign: bool = True) -> Dict[str, Any]:
+    """
+    门店菜单；sign=False 时签名原图的派生图只给出对象键（菜单快照使用，响应时再签名）
+    """
     # 自动推导租户上下文
     store = Store.query.get(store_id)
     if not store:
@@ -444,9 +595,193 @@ def get_menu_by_store(store_id: str) -> Dict[str, Any]:
         
         return {
             "categories": [{"id": c.id, "name": c.name, "sort": c.sort} for c in cats],
-            "items": [i.to_dict() for i in items]
+            "items": _item_dicts(items, sign)
         }
 
+# 菜单快照：预序列化 JSON + 版本号 + 内容哈希，C 端菜单直接返回字节并支持 ETag/304
+# 进程内缓存 TTL 较短，多实例下其他进程最多延迟一个 TTL 看到新菜单
+# 快照内不含预签名 URL（会过期，且每次签名结果不同会使 ETag 失效）；需要签名的派生图只存对象键，
+# 响应前由 get_menu_snapshot 签名（见 _signed_snapshot）
+_menu_cache = TTLCache(maxsize=1024, ttl=30)
+
+def _menu_cache_ttl() -> float:
+    try:
+        return float(current_app.config.get("MENU_SNAPSHOT_TTL", 30))
+    except RuntimeError:
+        return 0
+
+def _snapshot_dict(row: MenuSnapshot) -> Dict[str, Any]:
+    return {
+        "store_id": row.store_id,
+        "tenant_id": row.tenant_id,
+        "version": row.version,
+        "etag": row.etag,
+        "body": row.body.encode("utf-8"),
+    }
+
+@primary
+def rebuild_menu_snapshot(store_id: str) -> Optional[Dict[str, Any]]:
+    """
+    重新序列化门店菜单并落库；内容未变化时不递增版本号
+    菜单一律从主库读取：只读库延迟时构建出的旧菜单会以更高版本号覆盖商家刚写入的快照
+    返回 {"store_id", "tenant_id", "version", "etag", "body": bytes}，门店不存在返回 None
+    """
+    store = Store.query.get(store_id)
+    if not store:
+        _menu_cache.delete(store_id)
+        return None
+    menu = get_menu_by_store(store_id, sign=False)
+    body = json.dumps(menu, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    etag = hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+    row = MenuSnapshot.query.get(store_id)
+    if not row:
+        try:
+            with db.session.begin_nested():
+                row = MenuSnapshot(store_id=store_id, tenant_id=store.tenant_id, version=1, etag=etag, body=body, updated_at=int(time.time()))
+                db.session.add(row)
+        except IntegrityError:
+            # 多个进程同时首次构建（如启动预热同一批热门门店）：以已插入的行为准，内容不同再更新
+            # 加锁读取最新已提交版本（MySQL 可重复读下普通 SELECT 看不到对方刚插入的行）
+            row = MenuSnapshot.query.filter_by(store_id=store_id).populate_existing().with_for_update().one()
+    if row.etag != etag:
+        row.version = (row.version or 0) + 1
+        row.etag = etag
+        row.body = body
+        row.updated_at = int(time.time())
+    db.session.commit()
+
+    snap = _snapshot_dict(row)
+    _menu_cache.set(store_id, snap, _menu_cache_ttl())
+    return snap
+
+def refresh_menu_snapshot(store_id: Optional[str]) -> None:
+    """
+    菜品/分类变更后调用；快照失败不影响商家端写操作，下次读取时会重建
+    """
+    if not store_id:
+        return
+    _menu_cache.delete(store_id)
+    try:
+        rebuild_menu_snapshot(store_id)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Menu snapshot rebuild failed for store {store_id}: {e}")
+
+def _signed_snapshot(snap: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    为快照中只存对象键的派生图签名，返回可直接响应的快照（ETag 按签名后的内容计算）
+    签名结果挂在进程缓存的快照上复用，复用时间小于预签名缓存的提前刷新时间，保证返回的 URL 未过期
+    """
+    if b'"uploads/' not in snap["body"]:
+        return snap
+    now = time.monotonic()
+    cached = snap.get("signed")
+    if cached and cached[0] > now:
+        return cached[1]
+    from ..services.storage_service import sign_many, PRESIGN_REFRESH
+    menu = json.loads(snap["body"].decode("utf-8"))
+    if not sign_variant_keys(menu.get("items", []), sign_many):
+        signed = snap
+    else:
+        body = json.dumps(menu, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+        signed = dict(snap, body=body, etag=hashlib.sha1(body).hexdigest())
+    snap["signed"] = (now + min(_menu_cache_ttl(), PRESIGN_REFRESH / 2), signed)
+    return signed
+
+def get_menu_snapshot(store_id: str) -> Optional[Dict[str, Any]]:
+    """
+    读取门店菜单快照：进程缓存 -> menu_snapshots 表 -> 现场构建
+    etag 为空的行（迁移标记为待重建）现场重建
+    """
+    snap = _menu_cache.get(store_id)
+    if snap is None:
+        row = MenuSnapshot.query.get(store_id)
+        if row and row.etag:
+            snap = _snapshot_dict(row)
+            _menu_cache.set(store_id, snap, _menu_cache_ttl())
+        else:
+            snap = rebuild_menu_snapshot(store_id)
+            if snap is None:
+                return None
+    return _signed_snapshot(snap)
+
+def hot_store_ids(limit: int = 20, days: int = 7) -> List[str]:
+    """
+    近 days 天订单量最高的门店（读日聚合表），用于启动时预热菜单快照
+    """
+    since = _day_start(int(time.time()) - days * 86400)
+    rows = db.session.query(StoreDailyMetric.store_id, func.sum(StoreDailyMetric.orders_total).label("n")) \
+        .filter(StoreDailyMetric.day_start >= since) \
+        .group_by(StoreDailyMetric.store_id) \
+        .order_by(func.sum(StoreDailyMetric.orders_total).desc()) \
+        .limit(limit).all()
+    return [r.store_id for r in rows]
+
+def get_cached_menu_items(store_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    仅从进程内菜单快照取菜品 {item_id: item_dict}，快照不在缓存（或已过期）时返回 None，不访问 DB
+    """
+    snap = _menu_cache.get(store_id)
+    if snap is None:
+        return None
+    items = snap.get("items_by_id")
+    if items is None:
+        menu = json.loads(snap["body"].decode("utf-8"))
+        items = {i["id"]: i for i in menu.get("items", [])}
+        snap["items_by_id"] = items
+    return items
+
+def mark_image_variants_ready(key: str, refresh: bool = True) -> None:
+    """
+    登记上传对象的派生图已全部生成；refresh=True 时重建引用该图片的门店菜单快照
+    （派生图可能在菜品保存之后才生成完）
+    """
+    try:
+        with db.session.begin_nested():
+            db.session.add(MediaVariant(key=key, created_at=int(time.time())))
+    except IntegrityError:
+        pass
+    db.session.commit()
+    if refresh:
+        # 本地静态地址不含 uploads/ 前缀，按其后的路径（含时间戳与随机 id，全局唯一）匹配
+        rows = db.session.query(Item.store_id) \
+            .filter(Item.image_url.contains(key.split("uploads/", 1)[-1])).distinct().all()
+        for (store_id,) in rows:
+            refresh_menu_snapshot(store_id)
+
+def _item_dicts(items: List[Item], sign: bool = True) -> List[Dict[str, Any]]:
+    """
+    菜品对外字典：派生图已生成的图片提供缩略图 / WebP 地址，否则回退为原图（一次 IN 查询）
+    sign=False 时签名原图的派生图只给出对象键，由调用方在响应前签名（见 sign_variant_keys）
+    """
+    keys = {i.id: upload_key_from_url(i.image_url) for i in items}
+    wanted = list({k for k in keys.values() if k and is_variant_source(k)})
+    ready = set()
+    if wanted:
+        ready = {r[0] for r in db.session.query(MediaVariant.key).filter(MediaVariant.key.in_(wanted)).all()}
+    signer = None
+    if ready:
+        from ..services.storage_service import sign_many
+        signer = sign_many if sign else (lambda ks: {k: k for k in ks})
+    res = []
+    for i in items:
+        d = i.to_dict()
+        if keys[i.id] in ready:
+            d.update(variant_urls(i.image_url, signer))
+        res.append(d)
+    return res
+
+def list_item_image_urls(store_id: Optional[str] = None) -> List[Tuple[str, str]]:
+    """
+    全部菜品图片 [(store_id, image_url)]（跨租户，运维命令使用）
+    """
+    q = db.session.query(Item.store_id, Item.image_url).filter(Item.image_url.isnot(None), Item.image_url != "")
+    if store_id:
+        q = q.filter(Item.store_id == store_id)
+    return [(sid, url) for sid, url in q.distinct().all()]
+
+@read_only
 def list_store_categories(store_id: str) -> List[Dict[str, Any]]:
     q = Category.query.filter_by(store_id=store_id)
     q = _apply_tenant_filter(q)
@@ -480,6 +815,7 @@ def create_store_category(payload: Dict[str, Any]) -> Dict[str, Any]:
     )
     db.session.add(cat)
     db.session.commit()
+    refresh_menu_snapshot(store_id)
     return {"id": cat.id, "name": cat.name, "sort": cat.sort}
 
 def sort_store_categories(store_id: str, ordered_ids: List[str]) -> List[Dict[str, Any]]:
@@ -490,19 +826,15 @@ def sort_store_categories(store_id: str, ordered_ids: List[str]) -> List[Dict[st
             q = q.filter_by(tenant_id=tid)
         q.update({"sort": idx})
     db.session.commit()
+    refresh_menu_snapshot(store_id)
     return list_store_categories(store_id)
 
+@read_only
 def list_store_items(store_id: str) -> List[Dict[str, Any]]:
     q = Item.query.filter_by(store_id=store_id)
     q = _apply_tenant_filter(q)
     items = q.order_by(Item.sort).all()
-    # 填充 category_id
-    res = []
-    for i in items:
-        d = i.to_dict()
-        d["category_id"] = i.category_id
-        res.append(d)
-    return res
+    return _item_dicts(items)
 
 def create_store_item(payload: Dict[str, Any]) -> Dict[str, Any]:
     tid = get_current_tenant_id()
@@ -530,7 +862,8 @@ def create_store_item(payload: Dict[str, Any]) -> Dict[str, Any]:
     )
     db.session.add(item)
     db.session.commit()
-    return item.to_dict()
+    refresh_menu_snapshot(store_id)
+    return _item_dicts([item])[0]
 
 def update_store_item(item_id: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     q = Item.query.filter_by(id=item_id)
@@ -550,7 +883,8 @@ def update_store_item(item_id: str, payload: Dict[str, Any]) -> Optional[Dict[st
     if "status" in payload:
         item.status = str(payload["status"])
     db.session.commit()
-    return item.to_dict()
+    refresh_menu_snapshot(item.store_id)
+    return _item_dicts([item])[0]
 
 def toggle_store_item(item_id: str, status: str) -> Optional[Dict[str, Any]]:
     q = Item.query.filter_by(id=item_id)
@@ -561,7 +895,8 @@ def toggle_store_item(item_id: str, status: str) -> Optional[Dict[str, Any]]:
         return None
     item.status = str(status)
     db.session.commit()
-    return item.to_dict()
+    refresh_menu_snapshot(item.store_id)
+    return _item_dicts([item])[0]
 
 def sort_store_items(store_id: str, ordered_ids: List[str]) -> List[Dict[str, Any]]:
     tid = get_current_tenant_id()
@@ -572,10 +907,58 @@ def sort_store_items(store_id: str, ordered_ids: List[str]) -> List[Dict[str, An
             q = q.filter_by(tenant_id=tid)
         q.update({"sort": idx})
     db.session.commit()
+    refresh_menu_snapshot(store_id)
     return list_store_items(store_id)
 
 # --- Order ---
 
+def load_item_price_map(store_id: str, item_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    批量解析下单菜品的价格/名称（当前租户内一次 IN 查询）
+    菜单快照在进程缓存中且覆盖全部菜品时直接使用快照
+    返回 {item_id: {"name", "price_cents", "store_id", "status"}}
+    """
+    ids = list({i for i in item_ids if i})
+    if not ids:
+        return {}
+    cached = get_cached_menu_items(store_id)
+    if cached is not None and all(i in cached for i in ids):
+        return {i: {
+            "name": cached[i]["name"],
+            "price_cents": int(cached[i]["base_price_cents"] or 0),
+            "store_id": cached[i]["store_id"],
+            "status": cached[i]["status"],
+        } for i in ids}
+    q = Item.query.filter(Item.id.in_(ids))
+    q = _apply_tenant_filter(q)
+    return {i.id: {
+        "name": i.name,
+        "price_cents": int(i.base_price_cents or 0),
+        "store_id": i.store_id,
+        "status": i.status,
+    } for i in q.all()}
+
+def load_coupon_price_map(coupon_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    批量解析下单优惠券的价格/名称（当前租户内一次 IN 查询）
+    店铺为空的券视为全商户通用
+    """
+    ids = list({i for i in coupon_ids if i})
+    if not ids:
+        return {}
+    q = Coupon.query.filter(Coupon.id.in_(ids))
+    q = _apply_tenant_filter(q)
+    res = {}
+    for c in q.all():
+        rule = c.rule or {}
+        res[c.id] = {
+            "name": rule.get("title", "特价券"),
+            "price_cents": int(rule.get("price_cents", 0) or 0),
+            "store_id": c.store_id or None,
+            "status": c.status,
+        }
+    return res
+
 def _domain_to_model(o: DomainOrder, tenant_id: str) -> Order:
     return Order(
         id=o.id,
@@ -619,7 +1002,7 @@ def _model_to_domain(o: Order) -> DomainOrder:
         user_id=o.user_id,
         scene=o.scene,
         table_code=o.table_code,
-        status=OrderStatus(o.status),
+        status=OrderStatus(_effective_status(o)),
         price_total_cents=o.price_total_cents,
         price_payable_cents=o.price_payable_cents,
         coupon_applied=o.coupon_applied or {},
@@ -633,7 +1016,6 @@ def _model_to_domain(o: Order) -> DomainOrder:
     )
 
 def save_order(domain_order: DomainOrder) -> None:
-    _ensure_order_columns()
     tid = get_current_tenant_id()
     # 下单时必须有租户上下文
     # 如果是 consumer api，可能需要从 store 反查，或者 payload 带
@@ -649,6 +1031,8 @@ def save_order(domain_order: DomainOrder) -> None:
     existing = q.first()
     
     if existing:
+        _bump_order_metrics(existing, existing.status, existing.price_payable_cents,
+                            domain_order.status.value, domain_order.price_payable_cents)
         existing.status = domain_order.status.value
         existing.price_total_cents = domain_order.price_total_cents
         existing.price_payable_cents = domain_order.price_payable_cents
@@ -662,6 +1046,7 @@ def save_order(domain_order: DomainOrder) -> None:
              raise Exception("Cannot create order without tenant context")
         o = _domain_to_model(domain_order, tid)
         db.session.add(o)
+        _bump_order_metrics(o, None, 0, o.status, o.price_payable_cents)
         
         # 必须先 flush 以生成 order.id (如果 id 是 auto-increment)
         # 这里 id 是传入的，所以不需要 flush，但为了保险还是写上
@@ -679,28 +1064,59 @@ def save_order(domain_order: DomainOrder) -> None:
                 modifiers=it.modifiers
             )
             db.session.add(oi)
-            
-    db.session.commit()
 
-def _check_expiration(o: Order) -> None:
-    """
-    检查订单是否超时（15分钟），如果超时则取消
-    """
-    if o.status == "CREATED":
-        now = int(time.time())
-        # 15分钟 = 900秒
-        if now > o.created_at + 900:
-            o.status = "CANCELLED"
-            # 尝试提交，如果外部有事务可能会合并，这里单独提交可能会有风险，
-            # 但 repository 层通常负责持久化。
-            # 为安全起见，这里只修改内存对象，依赖调用方 commit 或者 flush?
-            # 不，repository 方法通常是自包含事务的 (commits inside).
-            # 但 check_expiration 可能会被 get_order 调用，get_order 只是读取。
-            # 如果 get_order 触发写操作，是可以的 (Lazy expiration).
-            try:
-                db.session.commit()
-            except Exception:
-                db.session.rollback()
+    try:
+        db.session.commit()
+    except Exception:
+        # 同一事务内领取的核销码随之释放
+        db.session.rollback()
+        raise
+
+# 未支付订单超时时间（秒），超时订单由 sweep_expired_orders 批量取消
+ORDER_EXPIRE_SECONDS = 900
+
+def _effective_status(o: Order, now: Optional[int] = None) -> str:
+    """
+    订单对外呈现的状态：已超时但尚未被清理的 CREATED 订单视为 CANCELLED（只读，不落库）
+    """
+    if o.status == OrderStatus.CREATED.value:
+        now = int(time.time()) if now is None else now
+        if o.created_at and now > o.created_at + ORDER_EXPIRE_SECONDS:
+            return OrderStatus.CANCELLED.value
+    return o.status
+
+def sweep_expired_orders(batch_size: int = 500, max_batches: Optional[int] = None, now: Optional[int] = None) -> int:
+    """
+    批量取消超时未支付订单（跨租户），每批一条 UPDATE 并同步日聚合，逐批提交
+    返回本次取消的订单数
+    """
+    cutoff = (int(time.time()) if now is None else now) - ORDER_EXPIRE_SECONDS
+    batch_size = max(1, int(batch_size))
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        expired = and_(Order.status == OrderStatus.CREATED.value, Order.created_at < cutoff)
+        # 锁定本批订单，避免与并发支付交错导致日聚合口径不一致
+        rows = db.session.query(Order.id, Order.tenant_id, Order.store_id, Order.created_at) \
+            .filter(expired).order_by(Order.created_at.asc()).limit(batch_size) \
+            .with_for_update().all()
+        if not rows:
+            db.session.rollback()
+            break
+        cancelled = Order.query.filter(Order.id.in_([r.id for r in rows]), expired) \
+            .update({Order.status: OrderStatus.CANCELLED.value}, synchronize_session=False)
+        buckets: Dict[Tuple[str, str, int], int] = {}
+        for r in rows:
+            key = (r.tenant_id, r.store_id, _day_start(r.created_at))
+            buckets[key] = buckets.get(key, 0) + 1
+        for (tid, store_id, day), n in buckets.items():
+            _bump_daily_metrics(tid, store_id, day, {"created_count": -n, "cancelled_count": n})
+        db.session.commit()
+        total += cancelled
+        batches += 1
+        if len(rows) < batch_size:
+            break
+    return total
 
 def get_order(order_id: str) -> Optional[DomainOrder]:
     q = Order.query.filter_by(id=order_id)
@@ -708,91 +1124,221 @@ def get_order(order_id: str) -> Optional[DomainOrder]:
     o = q.first()
     if not o:
         return None
-    
-    _check_expiration(o)
-    
     return _model_to_domain(o)
 
 def update_order_status(order_id: str, target: OrderStatus) -> bool:
-    q = Order.query.filter_by(id=order_id)
-    q = _apply_tenant_filter(q)
-    o = q.first()
-    
-    if not o:
-        return False
-    current_status = OrderStatus(o.status)
-    if not can_transition(current_status, target):
+    """
+    条件更新订单状态（compare-and-set），并发流转时只有一个调用成功；不预先读取订单
+    UPDATE orders SET prev_status=status, status=? WHERE id=? AND tenant_id=? AND status IN (allowed_predecessors)
+    影响行数为 1 才回读（行已被本事务锁定）原状态与门店/金额，按实际原状态增减日聚合
+    返回 True 表示本次调用完成了流转，调用方据此触发积分/支付等副作用
+    """
+    tid = _get_tenant_filter()
+    if not tid:
         return False
-    o.status = target.value
-    
-    # 记录完成时间
+    now = int(time.time())
+    predecessors = [s.value for s in allowed_predecessors(target)]
+    # 已超时的待支付订单不允许再流转（等待 sweep_expired_orders 取消）
+    not_expired = or_(Order.status != OrderStatus.CREATED.value, Order.created_at >= now - ORDER_EXPIRE_SECONDS)
+    # prev_status 须排在 status 之前赋值（MySQL 单表 UPDATE 按书写顺序求值）
+    assignments = [(Order.prev_status, Order.status), (Order.status, target.value)]
     if target == OrderStatus.DONE:
-        o.completed_at = int(time.time())
-        
+        # 记录完成时间
+        assignments.append((Order.completed_at, now))
+    stmt = update(Order) \
+        .where(Order.id == order_id, Order.tenant_id == tid, Order.status.in_(predecessors), not_expired) \
+        .ordered_values(*assignments)
+    if db.session.execute(stmt, execution_options={"synchronize_session": False}).rowcount != 1:
+        db.session.rollback()
+        return False
+    o = db.session.query(Order.tenant_id, Order.store_id, Order.created_at, Order.price_payable_cents, Order.prev_status) \
+        .filter(Order.id == order_id).one()
+    _bump_order_metrics(o, o.prev_status, o.price_payable_cents, target.value, o.price_payable_cents)
     db.session.commit()
     return True
 
-def list_orders(status: Optional[str]) -> List[Dict[str, Any]]:
-    q = Order.query
-    q = _apply_tenant_filter(q)
-    
-    if status:
-        q = q.filter(func.lower(Order.status) == func.lower(status))
-    orders = q.order_by(Order.created_at.desc()).all()
-    
+def _load_order_items_map(order_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    批量加载订单项（一次 IN 查询），并批量补充菜品图片
+    返回 {order_id: [item_dict, ...]}
+    """
+    res: Dict[str, List[Dict[str, Any]]] = {oid: [] for oid in order_ids}
+    if not order_ids:
+        return res
+    order_items = OrderItem.query.filter(OrderItem.order_id.in_(order_ids)).order_by(OrderItem.id.asc()).all()
+    images = _load_item_images([oi.item_id for oi in order_items])
+    for oi in order_items:
+        oi_dict = oi.to_dict()
+        if oi.item_id in images:
+            oi_dict['image_url'] = images[oi.item_id]
+        res.setdefault(oi.order_id, []).append(oi_dict)
+    return res
+
+def _load_item_images(item_ids: List[str]) -> Dict[str, str]:
+    """
+    批量获取菜品图片 {item_id: image_url}
+    """
+    ids = list({i for i in item_ids if i})
+    if not ids:
+        return {}
+    rows = db.session.query(Item.id, Item.image_url).filter(Item.id.in_(ids)).all()
+    return {r[0]: r[1] for r in rows}
+
+def _load_store_names(store_ids: List[str]) -> Dict[str, str]:
+    """
+    批量获取门店名称 {store_id: name}
+    """
+    ids = list({i for i in store_ids if i})
+    if not ids:
+        return {}
+    rows = db.session.query(Store.id, Store.name).filter(Store.id.in_(ids)).all()
+    return {r[0]: r[1] for r in rows}
+
+def _load_reviews_map(order_ids: List[str], user_id: str) -> Dict[str, OrderReview]:
+    """
+    批量获取用户对订单的评价 {order_id: OrderReview}
+    """
+    if not order_ids:
+        return {}
+    rows = OrderReview.query.filter(OrderReview.order_id.in_(order_ids), OrderReview.user_id == user_id) \
+        .order_by(OrderReview.created_at.asc(), OrderReview.id.asc()).all()
+    res: Dict[str, OrderReview] = {}
+    for r in rows:
+        # 与 .first() 语义保持一致：同一订单取最早一条
+        res.setdefault(r.order_id, r)
+    return res
+
+def _hydrate_orders(orders: List[Order], user_id: Optional[str] = None, with_review_content: bool = False) -> List[Dict[str, Any]]:
+    """
+    批量组装订单列表：订单项、菜品图片固定为 2 次查询；
+    传入 user_id 时额外批量加载门店名与评价（各 1 次查询），与订单数量无关
+    """
+    order_ids = [o.id for o in orders]
+    items_map = _load_order_items_map(order_ids)
+    store_names: Dict[str, str] = {}
+    reviews: Dict[str, OrderReview] = {}
+    if user_id is not None:
+        store_names = _load_store_names([o.store_id for o in orders])
+        reviews = _load_reviews_map(order_ids, user_id)
+
     res = []
+    now = int(time.time())
     for o in orders:
         d = o.to_dict()
-        order_items = OrderItem.query.filter_by(order_id=o.id).all()
-        # Enrich items with image_url from Item table
-        items_dict_list = []
-        for oi in order_items:
-            oi_dict = oi.to_dict()
-            # Fetch item to get image_url
-            item = Item.query.filter_by(id=oi.item_id).first()
-            if item:
-                oi_dict['image_url'] = item.image_url
-            items_dict_list.append(oi_dict)
-            
-        d["items"] = items_dict_list
+        d["status"] = _effective_status(o, now)
+        if user_id is not None:
+            d["store_name"] = store_names.get(o.store_id, "")
+            r = reviews.get(o.id)
+            d["reviewed"] = True if r else False
+            if r:
+                d["rating"] = r.rating
+                if with_review_content:
+                    d["review_content"] = r.content
+        d["items"] = items_map.get(o.id, [])
         # Ensure delivery_info is not None for frontend
         if not d.get("delivery_info"):
             d["delivery_info"] = {}
         res.append(d)
     return res
 
-def list_console_orders(status: Optional[str]) -> List[Dict[str, Any]]:
-    return list_orders(status)
+# 订单列表分页：按 (created_at, id) 倒序的游标分页，避免 OFFSET 深翻页扫描
+# 传 cursor 未传 limit 时按 DEFAULT_PAGE_SIZE 分页；limit 与 cursor 均未传的旧客户端返回最近 MAX_PAGE_SIZE 条
+# （不再返回全量列表），同样带下一页游标
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
 
-def list_orders_by_user(user_id: str, status: Optional[str] = None, store_id: Optional[str] = None) -> List[Dict[str, Any]]:
-    q = Order.query.filter_by(user_id=user_id)
+def _encode_cursor(o: Order) -> str:
+    raw = f"{o.created_at}:{o.id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[Tuple[int, str]]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        ts, oid = raw.split(":", 1)
+        return int(ts), oid
+    except Exception:
+        raise ValueError("invalid cursor")
+
+def _normalize_page_size(limit: Optional[Any]) -> int:
+    try:
+        n = int(limit) if limit not in (None, "") else DEFAULT_PAGE_SIZE
+    except (TypeError, ValueError):
+        n = DEFAULT_PAGE_SIZE
+    return max(1, min(n, MAX_PAGE_SIZE))
+
+def _filter_orders(q, status: Optional[str] = None, store_id: Optional[str] = None,
+                   start: Optional[str] = None, end: Optional[str] = None):
+    """
+    订单通用过滤条件
+    status 统一按大写存储，直接等值比较以命中 (tenant_id, store_id, status, created_at) 索引
+    """
     if status:
-        q = q.filter(func.lower(Order.status) == func.lower(status))
+        q = q.filter(Order.status == str(status).upper())
     if store_id:
-        q = q.filter_by(store_id=store_id)
-    orders = q.order_by(Order.created_at.desc()).all()
-    res = []
-    for o in orders:
-        d = o.to_dict()
-        s = Store.query.get(o.store_id)
-        d["store_name"] = s.name if s else ""
-        r = OrderReview.query.filter_by(order_id=o.id, user_id=user_id).first()
-        d["reviewed"] = True if r else False
-        if r:
-            d["rating"] = r.rating
-        order_items = OrderItem.query.filter_by(order_id=o.id).all()
-        items_dict_list = []
-        for oi in order_items:
-            oi_dict = oi.to_dict()
-            item = Item.query.filter_by(id=oi.item_id).first()
-            if item:
-                oi_dict['image_url'] = item.image_url
-            items_dict_list.append(oi_dict)
-        d["items"] = items_dict_list
-        if not d.get("delivery_info"):
-            d["delivery_info"] = {}
-        res.append(d)
-    return res
+        q = q.filter(Order.store_id == store_id)
+    start_ts = _to_ts(start)
+    end_ts = _to_ts(end, is_end=True)
+    if start_ts is not None:
+        q = q.filter(Order.created_at >= start_ts)
+    if end_ts is not None:
+        q = q.filter(Order.created_at <= end_ts)
+    return q
+
+def _paginate_orders(q, cursor: Optional[str], limit: Optional[Any]) -> Tuple[List[Order], Optional[str]]:
+    """
+    游标分页：WHERE (created_at, id) < (cursor) ORDER BY created_at DESC, id DESC LIMIT n+1
+    返回 (当前页订单, 下一页游标)；limit 与 cursor 均未传时取 MAX_PAGE_SIZE 条
+    """
+    q = q.order_by(Order.created_at.desc(), Order.id.desc())
+    size = MAX_PAGE_SIZE if limit in (None, "") and not cursor else _normalize_page_size(limit)
+    pos = _decode_cursor(cursor)
+    if pos:
+        ts, oid = pos
+        q = q.filter(or_(
+            Order.created_at < ts,
+            and_(Order.created_at == ts, Order.id < oid)
+        ))
+    rows = q.limit(size + 1).all()
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = _encode_cursor(rows[-1])
+    return rows, next_cursor
+
+@read_only
+def list_orders(status: Optional[str], store_id: Optional[str] = None,
+                start: Optional[str] = None, end: Optional[str] = None,
+                cursor: Optional[str] = None, limit: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    当前租户订单列表（游标分页）
+    返回 {"items": [...], "next_cursor": str | None}
+    """
+    q = Order.query
+    q = _apply_tenant_filter(q)
+    q = _filter_orders(q, status, store_id, start, end)
+    orders, next_cursor = _paginate_orders(q, cursor, limit)
+    return {"items": _hydrate_orders(orders), "next_cursor": next_cursor}
+
+@read_only
+def list_console_orders(status: Optional[str], store_id: Optional[str] = None,
+                        start: Optional[str] = None, end: Optional[str] = None,
+                        cursor: Optional[str] = None, limit: Optional[Any] = None) -> Dict[str, Any]:
+    return list_orders(status, store_id, start, end, cursor, limit)
+
+@read_only
+def list_orders_by_user(user_id: str, status: Optional[str] = None, store_id: Optional[str] = None,
+                        cursor: Optional[str] = None, limit: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    用户订单历史（游标分页）
+    返回 {"items": [...], "next_cursor": str | None}
+    """
+    q = Order.query.filter_by(user_id=user_id)
+    q = _filter_orders(q, status, store_id)
+    orders, next_cursor = _paginate_orders(q, cursor, limit)
+    return {"items": _hydrate_orders(orders, user_id=user_id), "next_cursor": next_cursor}
 
 def get_order_detail(order_id: str, user_id: str) -> Optional[Dict[str, Any]]:
     o = Order.query.get(order_id)
@@ -800,31 +1346,7 @@ def get_order_detail(order_id: str, user_id: str) -> Optional[Dict[str, Any]]:
         return None
     if o.user_id != user_id:
         return None
-        
-    _check_expiration(o)
-
-    d = o.to_dict()
-    s = Store.query.get(o.store_id)
-    d["store_name"] = s.name if s else ""
-    
-    r = OrderReview.query.filter_by(order_id=o.id, user_id=user_id).first()
-    d["reviewed"] = True if r else False
-    if r:
-        d["rating"] = r.rating
-        d["review_content"] = r.content
-        
-    order_items = OrderItem.query.filter_by(order_id=o.id).all()
-    items_dict_list = []
-    for oi in order_items:
-        oi_dict = oi.to_dict()
-        item = Item.query.filter_by(id=oi.item_id).first()
-        if item:
-            oi_dict['image_url'] = item.image_url
-        items_dict_list.append(oi_dict)
-    d["items"] = items_dict_list
-    if not d.get("delivery_info"):
-        d["delivery_info"] = {}
-    return d
+    return _hydrate_orders([o], user_id=user_id, with_review_content=True)[0]
 
 def get_order_review(order_id: str, user_id: str) -> Optional[Dict[str, Any]]:
     r = OrderReview.query.filter_by(order_id=order_id, user_id=user_id).first()
@@ -841,11 +1363,13 @@ def upsert_order_review(order_id: str, user_id: str, rating: int, content: str)
     r = OrderReview.query.filter_by(order_id=order_id, user_id=user_id).first()
     now = int(time.time())
     if r:
+        _bump_store_rating(o.tenant_id, o.store_id, r.rating, int(rating))
         r.rating = int(rating)
         r.content = str(content or "")
         r.updated_at = now
         db.session.commit()
         return r.to_dict()
+    _bump_store_rating(o.tenant_id, o.store_id, 0, int(rating))
     rr = OrderReview(
         order_id=order_id,
         tenant_id=o.tenant_id,
@@ -934,68 +1458,16 @@ def save_payment(payment_dict: Dict[str, Any]) -> None:
         created_at=int(time.time())
     )
     db.session.add(p)
+    if order:
+        col = PAYMENT_CHANNEL_COLUMNS.get(p.channel)
+        if col:
+            _bump_daily_metrics(order.tenant_id, order.store_id, p.created_at, {col: 1})
     db.session.commit()
 
 # --- Coupon ---
 
-def _ensure_order_columns():
-    """
-    运行时保障：为 orders 表补充缺失字段
-    """
-    try:
-        existing = set()
-        sql = text("SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'orders'")
-        rows = db.session.execute(sql).fetchall()
-        for r in rows or []:
-            c = r[0] if isinstance(r, tuple) else getattr(r, "COLUMN_NAME", None)
-            if c:
-                existing.add(str(c))
-        
-        def ensure(col_name, ddl):
-            if col_name not in existing:
-                db.session.execute(text(ddl))
-        
-        ensure("seq_no", "ALTER TABLE orders ADD COLUMN seq_no VARCHAR(16) DEFAULT ''")
-        ensure("completed_at", "ALTER TABLE orders ADD COLUMN completed_at BIGINT")
-        ensure("verification_code", "ALTER TABLE orders ADD COLUMN verification_code VARCHAR(32) DEFAULT ''")
-        # 添加索引
-        if "verification_code" not in existing:
-             # 注意：MySQL添加索引通常需要 separate statement, 或者在 ADD COLUMN 后。
-             # 这里简单起见，如果字段不存在才加，假设加字段时没加索引（DDL里没写 INDEX）
-             # ALTER TABLE orders ADD INDEX ... 是另一条语句
-             try:
-                 db.session.execute(text("CREATE INDEX idx_orders_verification_code ON orders (verification_code)"))
-             except:
-                 pass
-
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-
-def _ensure_coupon_columns():
-    """
-    运行时保障：为 coupons 表补充缺失字段
-    """
-    try:
-        existing = set()
-        sql = text("SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'coupons'")
-        rows = db.session.execute(sql).fetchall()
-        for r in rows or []:
-            c = r[0] if isinstance(r, tuple) else getattr(r, "COLUMN_NAME", None)
-            if c:
-                existing.add(str(c))
-        
-        def ensure(col_name, ddl):
-            if col_name not in existing:
-                db.session.execute(text(ddl))
-        
-        ensure("store_id", "ALTER TABLE coupons ADD COLUMN store_id VARCHAR(32)")
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-
+@read_only
 def list_coupons(store_id: Optional[str] = None) -> List[Dict[str, Any]]:
-    _ensure_coupon_columns()
     q = Coupon.query
     q = _apply_tenant_filter(q)
     if store_id:
@@ -1004,7 +1476,6 @@ def list_coupons(store_id: Optional[str] = None) -> List[Dict[str, Any]]:
     return [{"id": c.id, "store_id": c.store_id, "rule": c.rule, "status": c.status} for c in cs]
 
 def create_coupon(payload: Dict[str, Any]) -> Dict[str, Any]:
-    _ensure_coupon_columns()
     tid = get_current_tenant_id()
     if not tid:
         raise Exception("Missing tenant context")
@@ -1023,7 +1494,6 @@ def create_coupon(payload: Dict[str, Any]) -> Dict[str, Any]:
     return {"id": c.id, "store_id": c.store_id, "rule": c.rule, "status": c.status}
 
 def update_coupon(coupon_id: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    _ensure_coupon_columns()
     q = Coupon.query.filter_by(id=coupon_id)
     q = _apply_tenant_filter(q)
     c = q.first()
@@ -1039,7 +1509,6 @@ def update_coupon(coupon_id: str, payload: Dict[str, Any]) -> Optional[Dict[str,
     return {"id": c.id, "store_id": c.store_id, "rule": c.rule, "status": c.status}
 
 def delete_coupon(coupon_id: str) -> bool:
-    _ensure_coupon_columns()
     q = Coupon.query.filter_by(id=coupon_id)
     q = _apply_tenant_filter(q)
     c = q.first()
@@ -1049,22 +1518,34 @@ def delete_coupon(coupon_id: str) -> bool:
     db.session.commit()
     return True
 
-def is_seq_no_exists_today(store_id: str, seq_no: str) -> bool:
+def allocate_seq_no(store_id: str, prefix: str) -> str:
     """
-    检查今日该门店是否存在该序列号
+    分配门店当日唯一取餐号（A0001 / D0001 / P0001 ...）
+    基于 order_seq_counters 计数行原子自增，O(1) 且不扫描 orders；
+    使用独立短事务，多进程/多实例下同样唯一（订单失败时号码可能跳号）
     """
-    from datetime import date
-    import time
-    
-    # 获取今日 0 点时间戳
-    today = date.today()
-    today_start = int(time.mktime(today.timetuple()))
-    
-    return Order.query.filter(
-        Order.store_id == store_id,
-        Order.created_at >= today_start,
-        Order.seq_no == seq_no
-    ).count() > 0
+    day = _day_start(time.time())
+    params = {"store_id": store_id, "day_start": day, "prefix": prefix}
+    with db.engine.begin() as conn:
+        if conn.dialect.name == "mysql":
+            conn.execute(text(
+                "INSERT INTO order_seq_counters (store_id, day_start, prefix, value) "
+                "VALUES (:store_id, :day_start, :prefix, LAST_INSERT_ID(1)) "
+                "ON DUPLICATE KEY UPDATE value = LAST_INSERT_ID(value + 1)"
+            ), params)
+            n = conn.execute(text("SELECT LAST_INSERT_ID()")).scalar()
+        else:
+            t = OrderSeqCounter.__table__
+            cond = and_(t.c.store_id == store_id, t.c.day_start == day, t.c.prefix == prefix)
+            updated = conn.execute(t.update().where(cond).values(value=t.c.value + 1)).rowcount
+            if not updated:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(t.insert().values(value=1, **params))
+                except IntegrityError:
+                    conn.execute(t.update().where(cond).values(value=t.c.value + 1))
+            n = conn.execute(t.select().with_only_columns(t.c.value).where(cond)).scalar()
+    return f"{prefix}{int(n):04d}"
 
 def find_order_by_seq_no_today(store_id: str, seq_no: str) -> Optional[DomainOrder]:
     """
@@ -1086,24 +1567,92 @@ def find_order_by_seq_no_today(store_id: str, seq_no: str) -> Optional[DomainOrd
         return _model_to_domain(o)
     return None
 
+# 核销码：字母+数字，去除易混淆字符 (I, O, 0, 1)
+VERIFICATION_CODE_CHARS = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+VERIFICATION_CODE_LENGTH = 12
+VERIFICATION_CODE_BATCH = 200
+
+def mint_verification_codes(tenant_id: str, count: int = VERIFICATION_CODE_BATCH) -> int:
+    """
+    为租户预生成一批核销码放入码池，返回实际新增数量
+    码空间 32^12，租户内冲突极少；冲突的码直接丢弃
+    """
+    import random
+    rng = random.SystemRandom()
+    now = int(time.time())
+    codes = {"".join(rng.choices(VERIFICATION_CODE_CHARS, k=VERIFICATION_CODE_LENGTH)) for _ in range(count)}
+    t = VerificationCode.__table__
+    with db.engine.begin() as conn:
+        taken = {r[0] for r in conn.execute(
+            t.select().with_only_columns(t.c.code).where(t.c.tenant_id == tenant_id, t.c.code.in_(codes))
+        )}
+        rows = [{"tenant_id": tenant_id, "code": c, "created_at": now} for c in codes - taken]
+        if not rows:
+            return 0
+        try:
+            with conn.begin_nested():
+                conn.execute(t.insert(), rows)
+        except IntegrityError:
+            # 并发补池撞码，逐条插入跳过冲突
+            inserted = 0
+            for row in rows:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(t.insert(), [row])
+                    inserted += 1
+                except IntegrityError:
+                    pass
+            return inserted
+    return len(rows)
+
+class VerificationCodeUnavailable(RuntimeError):
+    """
+    码池补充后仍领取不到核销码（接口层映射为 503）
+    """
+
+def claim_verification_code(order_id: str) -> str:
+    """
+    从当前租户码池领取一个核销码并绑定订单（不提交，随订单在同一事务提交）
+    SELECT ... FOR UPDATE SKIP LOCKED LIMIT 1：并发领取者各自跳过已被锁定的码，不会争抢同一行；
+    下单失败回滚时码自动回到码池。码池为空时先补充一批
+    """
+    tid = get_current_tenant_id()
+    if not tid:
+        raise Exception("Missing tenant context for verification code")
+    t = VerificationCode.__table__
+    for _ in range(3):
+        row = db.session.execute(
+            t.select().with_only_columns(t.c.id, t.c.code)
+            .where(t.c.tenant_id == tid, t.c.order_id.is_(None))
+            .limit(1).with_for_update(skip_locked=True)
+        ).first()
+        if row is None:
+            mint_verification_codes(tid)
+            continue
+        claimed = db.session.execute(
+            t.update().where(t.c.id == row.id, t.c.order_id.is_(None))
+            .values(order_id=order_id, assigned_at=int(time.time()))
+        ).rowcount
+        if claimed:
+            return row.code
+    raise VerificationCodeUnavailable("verification code pool exhausted")
+
 def find_order_by_verification_code(store_id: str, code: str) -> Optional[DomainOrder]:
     """
     根据核销码查找订单（通常用于 COUPON 场景）
+    通过码池 (tenant_id, code) 唯一索引定位订单，不扫描 orders.verification_code
     """
-    o = Order.query.filter(
-        Order.store_id == store_id,
-        Order.verification_code == code
-    ).first()
-    if o:
+    tid = get_current_tenant_id()
+    if not tid or not code:
+        return None
+    vc = VerificationCode.query.filter_by(tenant_id=tid, code=code).first()
+    if not vc or not vc.order_id:
+        return None
+    o = Order.query.get(vc.order_id)
+    if o and o.store_id == store_id:
         return _model_to_domain(o)
     return None
 
-def is_verification_code_exists(code: str) -> bool:
-    """
-    检查全局核销码是否存在
-    """
-    return Order.query.filter_by(verification_code=code).count() > 0
-
 # --- Member & Wallet ---
 
 def bind_phone(payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -1117,7 +1666,6 @@ def bind_phone(payload: Dict[str, Any]) -> Dict[str, Any]:
     user_id = str(payload.get("user_id", "u"))
     phone = str(payload.get("phone", ""))
     nickname = str(payload.get("nickname", "")).strip()
-    _ensure_member_profile_columns()
     
     m = Member.query.filter_by(user_id=user_id, tenant_id=tid).first()
     if not m:
@@ -1132,37 +1680,10 @@ def bind_phone(payload: Dict[str, Any]) -> Dict[str, Any]:
     db.session.commit()
     return {"ok": True, "nickname": m.nickname or ""}
 
-def _ensure_member_profile_columns():
-    """
-    运行时保障：为 members 表补充缺失的资料字段
-    适配 MySQL；其他数据库场景下异常将被忽略（保持后端可用）
-    """
-    try:
-        cols = ["nickname", "realname", "gender", "birthday", "avatar_url", "points", "phone", "user_id", "tenant_id"]
-        existing = set()
-        sql = text("SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'members'")
-        rows = db.session.execute(sql).fetchall()
-        for r in rows or []:
-            c = r[0] if isinstance(r, tuple) else getattr(r, "COLUMN_NAME", None)
-            if c:
-                existing.add(str(c))
-        def ensure(col_name, ddl):
-            if col_name not in existing:
-                db.session.execute(text(ddl))
-        ensure("nickname", "ALTER TABLE members ADD COLUMN nickname VARCHAR(64) DEFAULT ''")
-        ensure("realname", "ALTER TABLE members ADD COLUMN realname VARCHAR(64) DEFAULT ''")
-        ensure("gender", "ALTER TABLE members ADD COLUMN gender VARCHAR(16) DEFAULT 'male'")
-        ensure("birthday", "ALTER TABLE members ADD COLUMN birthday VARCHAR(32) DEFAULT ''")
-        ensure("avatar_url", "ALTER TABLE members ADD COLUMN avatar_url VARCHAR(512) DEFAULT ''")
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-
 def update_member_profile(payload: Dict[str, Any]) -> Dict[str, Any]:
     tid = get_current_tenant_id()
     if not tid:
         raise Exception("Missing tenant context for member profile")
-    _ensure_member_profile_columns()
     user_id = str(payload.get("user_id", "u"))
     nickname = str(payload.get("nickname", "")).strip()
     realname = str(payload.get("realname", "")).strip()
@@ -1201,24 +1722,86 @@ def get_wallet(user_id: str) -> Dict[str, int]:
     balance = w.balance_cents if w else 0
     return {"balance_cents": balance}
 
-def recharge_wallet(user_id: str, amount_cents: int) -> Dict[str, Any]:
-    w = Wallet.query.filter_by(user_id=user_id).order_by(Wallet.id.asc()).first()
-    if not w:
+def _wallet_id(user_id: str, create: bool = False) -> Optional[int]:
+    """
+    用户的平台级钱包 ID（取最早的一条）；create=True 时不存在则创建
+    """
+    wid = db.session.query(Wallet.id).filter_by(user_id=user_id).order_by(Wallet.id.asc()).limit(1).scalar()
+    if wid is None and create:
         # 默认将平台级钱包记录的 tenant_id 固定为 'platform'
         w = Wallet(user_id=user_id, tenant_id="platform", balance_cents=0)
         db.session.add(w)
-    w.balance_cents += amount_cents
-    db.session.commit()
-    return {"balance_cents": w.balance_cents}
+        db.session.flush()
+        wid = w.id
+    return wid
 
-def charge_wallet(user_id: str, amount_cents: int) -> bool:
-    w = Wallet.query.filter_by(user_id=user_id).order_by(Wallet.id.asc()).first()
-    if not w or w.balance_cents < amount_cents:
+def _apply_wallet_delta(wallet_id: int, user_id: str, delta_cents: int, kind: str, ref_id: str = "") -> Optional[int]:
+    """
+    原子变更余额并追加流水（不提交，由调用方 commit）
+    扣款为条件更新 balance_cents >= 扣款额，余额不足返回 None；成功返回变动后余额
+    """
+    q = Wallet.query.filter(Wallet.id == wallet_id)
+    if delta_cents < 0:
+        q = q.filter(Wallet.balance_cents >= -delta_cents)
+    if q.update({Wallet.balance_cents: Wallet.balance_cents + delta_cents}, synchronize_session=False) != 1:
+        return None
+    # 本事务已持有该行写锁，读到的即本次变动后的余额
+    balance = db.session.query(Wallet.balance_cents).filter(Wallet.id == wallet_id).scalar()
+    db.session.add(WalletLedger(
+        tenant_id=get_current_tenant_id() or "platform",
+        wallet_id=wallet_id,
+        user_id=user_id,
+        kind=kind,
+        delta_cents=delta_cents,
+        balance_cents=balance,
+        ref_id=ref_id or "",
+        created_at=int(time.time())
+    ))
+    return balance
+
+def recharge_wallet(user_id: str, amount_cents: int, ref_id: str = "", kind: str = "RECHARGE",
+                    commit: bool = True) -> Dict[str, Any]:
+    wid = _wallet_id(user_id, create=True)
+    balance = _apply_wallet_delta(wid, user_id, int(amount_cents), kind, ref_id)
+    if commit:
+        db.session.commit()
+    return {"balance_cents": balance}
+
+def charge_wallet(user_id: str, amount_cents: int, ref_id: str = "", commit: bool = True) -> bool:
+    """
+    余额扣款：UPDATE ... SET balance_cents = balance_cents - ? WHERE balance_cents >= ?
+    commit=False 时与调用方的后续写入（如订单状态流转）在同一事务提交
+    """
+    wid = _wallet_id(user_id)
+    if wid is None:
         return False
-    w.balance_cents -= amount_cents
-    db.session.commit()
+    if _apply_wallet_delta(wid, user_id, -int(amount_cents), "PAY", ref_id) is None:
+        return False
+    if commit:
+        db.session.commit()
     return True
 
+def check_wallet_ledger(user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    对账：按流水重算每个钱包的余额，返回与 wallets.balance_cents 不一致的钱包
+    """
+    ledger = db.session.query(WalletLedger.wallet_id, func.sum(WalletLedger.delta_cents)) \
+        .group_by(WalletLedger.wallet_id)
+    wallets = db.session.query(Wallet.id, Wallet.user_id, Wallet.balance_cents)
+    if user_id:
+        ledger = ledger.filter(WalletLedger.user_id == user_id)
+        wallets = wallets.filter(Wallet.user_id == user_id)
+    sums = {wid: int(total or 0) for wid, total in ledger.all()}
+    res = []
+    for wid, uid, balance in wallets.all():
+        expected = sums.pop(wid, 0)
+        if int(balance or 0) != expected:
+            res.append({"wallet_id": wid, "user_id": uid, "balance_cents": int(balance or 0), "ledger_cents": expected})
+    # 有流水但钱包行已不存在
+    for wid, expected in sums.items():
+        res.append({"wallet_id": wid, "user_id": None, "balance_cents": None, "ledger_cents": expected})
+    return res
+
 def create_bill_order(user_id: str, store_id: str, amount_cents: int, remark: str = "") -> Dict[str, Any]:
     """
     创建优惠买单订单（无菜品项）
@@ -1244,6 +1827,7 @@ def create_bill_order(user_id: str, store_id: str, amount_cents: int, remark: st
         delivery_info={}
     )
     db.session.add(o)
+    _bump_order_metrics(o, None, 0, o.status, o.price_payable_cents)
     db.session.commit()
     return o.to_dict()
 
@@ -1291,6 +1875,7 @@ def get_recharge_order(order_id: str) -> Optional[Dict[str, Any]]:
         "paid_at": ro.paid_at
     }
 
+@read_only
 def list_recharge_orders(user_id: Optional[str] = None) -> List[Dict[str, Any]]:
     q = RechargeOrder.query
     q = _apply_tenant_filter(q)
@@ -1314,17 +1899,20 @@ def confirm_recharge_order(order_id: str) -> Dict[str, Any]:
     ro = q.first()
     if not ro:
         return {"error": "not_found"}
-    if ro.status == "PAID":
+    now = int(time.time())
+    # 条件更新保证支付回调与前端确认并发时只入账一次；入账与状态变更同一事务提交
+    paid = RechargeOrder.query.filter(RechargeOrder.id == ro.id, RechargeOrder.status != "PAID") \
+        .update({RechargeOrder.status: "PAID", RechargeOrder.paid_at: now}, synchronize_session=False)
+    if paid != 1:
+        db.session.rollback()
+        ro = RechargeOrder.query.get(order_id)
         return {
             "id": ro.id,
             "status": ro.status,
             "paid_at": ro.paid_at
         }
-    ro.status = "PAID"
-    ro.paid_at = int(time.time())
-    db.session.commit()
     added = ro.amount_cents + (ro.bonus_cents or 0)
-    res = recharge_wallet(ro.user_id, added)
+    res = recharge_wallet(ro.user_id, added, ref_id=ro.id)
     return {
         "order_id": ro.id,
         "wallet": res
@@ -1346,129 +1934,262 @@ def add_points(user_id: str, points: int) -> int:
     db.session.commit()
     return m.points
 
-# --- Metrics ---
+# --- Daily Metrics Rollup ---
+
+# 订单状态 -> store_daily_metrics 计数列
+STATUS_METRIC_COLUMNS = {
+    OrderStatus.CREATED.value: "created_count",
+    OrderStatus.PAID.value: "paid_count",
+    OrderStatus.MAKING.value: "making_count",
+    OrderStatus.DONE.value: "done_count",
+    OrderStatus.WAIT_USE.value: "wait_use_count",
+    OrderStatus.REVIEWED.value: "reviewed_count",
+    OrderStatus.CANCELLED.value: "cancelled_count",
+    OrderStatus.REFUNDED.value: "refunded_count",
+}
+# 支付渠道 -> store_daily_metrics 计数列
+PAYMENT_CHANNEL_COLUMNS = {
+    "WX_JSAPI": "payments_wx",
+    "WALLET": "payments_wallet",
+}
+# 计入营收的订单状态
+REVENUE_STATUSES = {OrderStatus.PAID.value, OrderStatus.MAKING.value, OrderStatus.DONE.value}
+
+def _day_start(ts: int) -> int:
+    """
+    时间戳所在自然日 0 点（服务器时区，与 find_order_by_seq_no_today 口径一致）
+    """
+    from datetime import date
+    return int(time.mktime(date.fromtimestamp(int(ts)).timetuple()))
 
-def metrics_today(store_id: Optional[str] = None) -> Dict[str, Any]:
-    tid = get_current_tenant_id()
-    
-    # 构造基础查询
-    order_q = Order.query
-    payment_q = Payment.query
-    
+def _bump_daily_metrics(tenant_id: str, store_id: str, ts: int, deltas: Dict[str, int]) -> None:
+    """
+    在当前事务内累加某门店某日的预聚合数据（不提交，由调用方 commit）
+    """
+    if not tenant_id or not store_id or not ts:
+        return
+    _increment_row(StoreDailyMetric, {"tenant_id": tenant_id, "store_id": store_id, "day_start": _day_start(ts)}, deltas)
+
+def _order_metric_deltas(status: Optional[str], payable: int, sign: int) -> Dict[str, int]:
+    deltas: Dict[str, int] = {}
+    if status is None:
+        return deltas
+    deltas["orders_total"] = sign
+    col = STATUS_METRIC_COLUMNS.get(status)
+    if col:
+        deltas[col] = sign
+    if status in REVENUE_STATUSES:
+        deltas["revenue_cents"] = sign * int(payable or 0)
+    return deltas
+
+def _bump_order_metrics(o: Order, old_status: Optional[str], old_payable: int,
+                        new_status: str, new_payable: int) -> None:
+    """
+    订单新建/状态变更时同步日聚合：old_status=None 表示新建订单
+    """
+    if old_status == new_status and int(old_payable or 0) == int(new_payable or 0):
+        return
+    deltas = _order_metric_deltas(old_status, old_payable, -1)
+    for k, v in _order_metric_deltas(new_status, new_payable, 1).items():
+        deltas[k] = deltas.get(k, 0) + v
+    _bump_daily_metrics(o.tenant_id, o.store_id, o.created_at, deltas)
+
+def rebuild_store_daily_metrics(tenant_id: Optional[str] = None, batch_size: int = 1000) -> int:
+    """
+    根据 orders / payments 全量重建 store_daily_metrics（可按租户）
+    用于首次上线回填或数据修复；返回写入的行数
+    """
+    buckets: Dict[Tuple[str, str, int], Dict[str, int]] = {}
+
+    def add(tid: str, store_id: str, ts: int, deltas: Dict[str, int]) -> None:
+        if not tid or not store_id or not ts:
+            return
+        row = buckets.setdefault((tid, store_id, _day_start(ts)), {})
+        for k, v in deltas.items():
+            row[k] = row.get(k, 0) + v
+
+    oq = db.session.query(Order.tenant_id, Order.store_id, Order.created_at, Order.status, Order.price_payable_cents)
+    if tenant_id:
+        oq = oq.filter(Order.tenant_id == tenant_id)
+    for tid, store_id, created_at, status, payable in oq.yield_per(batch_size):
+        add(tid, store_id, created_at, _order_metric_deltas(status, payable, 1))
+
+    pq = db.session.query(Order.tenant_id, Order.store_id, Payment.created_at, Payment.channel)\
+        .join(Order, Payment.order_id == Order.id)
+    if tenant_id:
+        pq = pq.filter(Order.tenant_id == tenant_id)
+    for tid, store_id, created_at, channel in pq.yield_per(batch_size):
+        col = PAYMENT_CHANNEL_COLUMNS.get(channel)
+        if col:
+            add(tid, store_id, created_at, {col: 1})
+
+    dq = StoreDailyMetric.query
+    if tenant_id:
+        dq = dq.filter_by(tenant_id=tenant_id)
+    dq.delete(synchronize_session=False)
+    for (tid, store_id, day), deltas in buckets.items():
+        db.session.add(StoreDailyMetric(tenant_id=tid, store_id=store_id, day_start=day, **deltas))
+    db.session.commit()
+    return len(buckets)
+
+def _rollup_metrics(tid: Optional[str], store_id: Optional[str], start_day: int, end_day: int) -> Dict[str, int]:
+    """
+    汇总 [start_day, end_day) 区间内已归档的日聚合
+    """
+    cols = ["orders_total", "paid_count", "making_count", "done_count", "revenue_cents", "payments_wx"]
+    q = db.session.query(*[func.coalesce(func.sum(getattr(StoreDailyMetric, c)), 0) for c in cols])\
+        .filter(StoreDailyMetric.day_start >= start_day, StoreDailyMetric.day_start < end_day)
     if tid:
-        order_q = order_q.filter_by(tenant_id=tid)
-        payment_q = payment_q.filter_by(tenant_id=tid)
-        
+        q = q.filter(StoreDailyMetric.tenant_id == tid)
     if store_id:
-        order_q = order_q.filter_by(store_id=store_id)
-        # Payment 表没有 store_id, 需要 join order 或 先查 order_ids
-        # 这里简化处理，payment 统计暂不支持 store_id 过滤 (或者 Payment 应该冗余 store_id)
-        # 暂时只过滤 order 相关指标
-    
-    total = order_q.count()
-    
-    paid_status = [OrderStatus.PAID.value, OrderStatus.MAKING.value, OrderStatus.DONE.value]
-    paid_query = order_q.filter(Order.status.in_(paid_status))
-    paid_count = paid_query.count()
-    
-    revenue = db.session.query(func.sum(Order.price_payable_cents)).filter(
-        Order.status.in_(paid_status)
+        q = q.filter(StoreDailyMetric.store_id == store_id)
+    row = q.one()
+    vals = dict(zip(cols, [int(v or 0) for v in row]))
+    return {
+        "orders_total": vals["orders_total"],
+        "paid": vals["paid_count"],
+        "revenue_cents": vals["revenue_cents"],
+        "making": vals["making_count"],
+        "done": vals["done_count"],
+        "payments_wx": vals["payments_wx"],
+    }
+
+def _metrics_rollup_enabled() -> bool:
+    try:
+        return bool(current_app.config.get("METRICS_USE_ROLLUP"))
+    except RuntimeError:
+        return False
+
+# --- Metrics ---
+
+def _to_ts(v: Optional[str], is_end: bool = False) -> Optional[int]:
+    """
+    解析时间参数：YYYY-MM-DD 或秒级时间戳
+    is_end=True 时日期解析为当天 23:59:59
+    """
+    if not v:
+        return None
+    try:
+        # 数字字符串当作秒级时间戳
+        if str(v).isdigit():
+            ts = int(v)
+            return ts
+        # 解析 YYYY-MM-DD
+        tm = time.strptime(str(v), "%Y-%m-%d")
+        base = int(time.mktime(tm))
+        return base + (86399 if is_end else 0)
+    except Exception:
+        return None
+
+def _metrics_cache_ttl() -> float:
+    try:
+        return float(current_app.config.get("METRICS_CACHE_TTL", 0) or 0)
+    except RuntimeError:
+        # 无应用上下文（脚本调用）时不缓存
+        return 0
+
+# 看板指标短期缓存：同一租户/门店/时间范围在 TTL 内复用结果，避免轮询重复聚合
+_metrics_cache = TTLCache(maxsize=512, ttl=0)
+
+def _aggregate_orders(tid: Optional[str], store_id: Optional[str],
+                      start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> Dict[str, int]:
+    """
+    单次 GROUP BY status 聚合订单数与金额，再在内存中折算各项指标
+    """
+    q = db.session.query(
+        Order.status,
+        func.count(Order.id),
+        func.coalesce(func.sum(Order.price_payable_cents), 0)
     )
     if tid:
-        revenue = revenue.filter(Order.tenant_id == tid)
+        q = q.filter(Order.tenant_id == tid)
     if store_id:
-        revenue = revenue.filter(Order.store_id == store_id)
-        
-    revenue_val = revenue.scalar() or 0
-    
-    # 修改待接单数量逻辑：PAID 状态即为待接单
-    pending_count = order_q.filter_by(status=OrderStatus.PAID.value).count()
-    making = order_q.filter_by(status=OrderStatus.MAKING.value).count()
-    done = order_q.filter_by(status=OrderStatus.DONE.value).count()
-    
-    payments_wx = payment_q.filter_by(channel="WX_JSAPI").count()
-    
+        q = q.filter(Order.store_id == store_id)
+    if start_ts is not None:
+        q = q.filter(Order.created_at >= start_ts)
+    if end_ts is not None:
+        q = q.filter(Order.created_at <= end_ts)
+    rows = q.group_by(Order.status).all()
+
+    paid_status = {OrderStatus.PAID.value, OrderStatus.MAKING.value, OrderStatus.DONE.value}
+    counts: Dict[str, int] = {}
+    total = 0
+    revenue = 0
+    for status, cnt, amount in rows:
+        counts[status] = int(cnt or 0)
+        total += int(cnt or 0)
+        if status in paid_status:
+            revenue += int(amount or 0)
     return {
         "orders_total": total,
-        "paid": pending_count, # 修正：paid 字段在前端用于显示待接单红点，应为 PAID 状态数量
-        "revenue_cents": int(revenue_val),
-        "making": making,
-        "done": done,
-        "payments_wx": payments_wx,
+        # paid 字段在前端用于显示待接单红点，应为 PAID 状态数量
+        "paid": counts.get(OrderStatus.PAID.value, 0),
+        "revenue_cents": revenue,
+        "making": counts.get(OrderStatus.MAKING.value, 0),
+        "done": counts.get(OrderStatus.DONE.value, 0),
     }
 
+def _count_wx_payments(tid: Optional[str], store_id: Optional[str] = None,
+                       start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> int:
+    q = db.session.query(func.count(Payment.id)).filter(Payment.channel == "WX_JSAPI")
+    if tid:
+        q = q.filter(Payment.tenant_id == tid)
+    if start_ts is not None:
+        q = q.filter(Payment.created_at >= start_ts)
+    if end_ts is not None:
+        q = q.filter(Payment.created_at <= end_ts)
+    if store_id:
+        # 通过订单关联过滤门店
+        q = q.join(Order, Payment.order_id == Order.id).filter(Order.store_id == store_id)
+    return int(q.scalar() or 0)
+
+@read_only
+def metrics_today(store_id: Optional[str] = None) -> Dict[str, Any]:
+    tid = get_current_tenant_id()
+
+    def load() -> Dict[str, Any]:
+        res = _aggregate_orders(tid, store_id)
+        # Payment 表没有 store_id，payment 统计暂不支持 store_id 过滤
+        res["payments_wx"] = _count_wx_payments(tid)
+        return res
+
+    res = _metrics_cache.get_or_set(("today", tid, store_id), load, ttl=_metrics_cache_ttl())
+    return dict(res)
+
+@read_only
 def metrics_range(start: Optional[str], end: Optional[str], store_id: Optional[str] = None) -> Dict[str, Any]:
     """
     按时间范围获取经营数据
     start/end: YYYY-MM-DD 或时间戳（秒）
     """
     tid = get_current_tenant_id()
-    def to_ts(v: Optional[str], is_end: bool = False) -> Optional[int]:
-        if not v:
-            return None
-        try:
-            # 数字字符串当作秒级时间戳
-            if str(v).isdigit():
-                ts = int(v)
-                return ts
-            # 解析 YYYY-MM-DD
-            tm = time.strptime(str(v), "%Y-%m-%d")
-            base = int(time.mktime(tm))
-            return base + (86399 if is_end else 0)
-        except Exception:
-            return None
-    start_ts = to_ts(start, is_end=False)
-    end_ts = to_ts(end, is_end=True)
+    start_ts = _to_ts(start, is_end=False)
+    end_ts = _to_ts(end, is_end=True)
     if not start_ts or not end_ts:
         return metrics_today(store_id)
-    
-    order_q = Order.query
-    payment_q = Payment.query
-    
-    if tid:
-        order_q = order_q.filter_by(tenant_id=tid)
-        payment_q = payment_q.filter_by(tenant_id=tid)
-    if store_id:
-        order_q = order_q.filter_by(store_id=store_id)
-    
-    order_q = order_q.filter(Order.created_at >= start_ts, Order.created_at <= end_ts)
-    
-    total = order_q.count()
-    
-    paid_status = [OrderStatus.PAID.value, OrderStatus.MAKING.value, OrderStatus.DONE.value]
-    paid_query = order_q.filter(Order.status.in_(paid_status))
-    paid_count = paid_query.count()
-    
-    revenue = db.session.query(func.sum(Order.price_payable_cents)).filter(
-        Order.status.in_(paid_status),
-        Order.created_at >= start_ts,
-        Order.created_at <= end_ts
-    )
-    if tid:
-        revenue = revenue.filter(Order.tenant_id == tid)
-    if store_id:
-        revenue = revenue.filter(Order.store_id == store_id)
-    revenue_val = revenue.scalar() or 0
-    
-    pending_count = order_q.filter_by(status=OrderStatus.PAID.value).count()
-    making = order_q.filter_by(status=OrderStatus.MAKING.value).count()
-    done = order_q.filter_by(status=OrderStatus.DONE.value).count()
-    
-    payments_wx_q = payment_q.filter_by(channel="WX_JSAPI").filter(
-        Payment.created_at >= start_ts,
-        Payment.created_at <= end_ts
-    )
-    if store_id:
-        # 通过订单关联过滤门店
-        payments_wx_q = payments_wx_q.join(Order, Payment.order_id == Order.id).filter(Order.store_id == store_id)
-    payments_wx = payments_wx_q.count()
-    
-    return {
-        "orders_total": total,
-        "paid": pending_count,
-        "revenue_cents": int(revenue_val),
-        "making": making,
-        "done": done,
-        "payments_wx": payments_wx,
-        "range": {"start": start_ts, "end": end_ts}
-    }
+
+    def live(lo: int, hi: int) -> Dict[str, int]:
+        res = _aggregate_orders(tid, store_id, lo, hi)
+        res["payments_wx"] = _count_wx_payments(tid, store_id, lo, hi)
+        return res
+
+    def load() -> Dict[str, Any]:
+        # 已结束的整日读预聚合表，首尾不足一天的部分与今天实时扫描
+        first_day = _day_start(start_ts)
+        if first_day < start_ts:
+            first_day = _day_start(start_ts + 86400)
+        closed_end = min(_day_start(time.time()), _day_start(end_ts + 1))
+        if not _metrics_rollup_enabled() or first_day >= closed_end:
+            res = live(start_ts, end_ts)
+        else:
+            parts = [_rollup_metrics(tid, store_id, first_day, closed_end)]
+            if start_ts < first_day:
+                parts.append(live(start_ts, first_day - 1))
+            if closed_end <= end_ts:
+                parts.append(live(closed_end, end_ts))
+            res = {k: sum(p[k] for p in parts) for k in parts[0]}
+        res["range"] = {"start": start_ts, "end": end_ts}
+        return res
+
+    res = _metrics_cache.get_or_set(("range", tid, store_id, start_ts, end_ts), load, ttl=_metrics_cache_ttl())
+    return dict(res)
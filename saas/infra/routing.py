@@ -0,0 +1,61 @@
+import functools
+from contextvars import ContextVar
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+# 读写分离：配置 MYSQL_REPLICA_ADDRESS 后注册名为 replica 的 bind
+# - 仅 @read_only 标记的 repository 函数内的查询路由到只读库
+# - flush / INSERT / UPDATE / DELETE 一律走主库；同一 session（请求）写过主库之后，
+#   后续查询都留在主库，保证读到自己的写入
+# - 未配置只读库时 @read_only 不产生任何效果
+# - @primary 标记的函数（读后回写主库的场景）内，即使调用了 @read_only 函数也一律读主库
+
+REPLICA_BIND_KEY = "replica"
+
+_read_only: ContextVar[bool] = ContextVar("db_read_only", default=False)
+_force_primary: ContextVar[bool] = ContextVar("db_force_primary", default=False)
+
+
+def read_only(fn):
+    """
+    标记只读的 repository 函数：函数内的查询可以使用只读库
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+    return wrapper
+
+
+def primary(fn):
+    """
+    标记必须读主库的函数：读取结果会写回主库时（如重建快照），避免用落后的只读库数据覆盖新数据
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _force_primary.set(True)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _force_primary.reset(token)
+    return wrapper
+
+
+class RoutingSession(Session):
+    """
+    按 @read_only 上下文选择主库/只读库的 Session
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            writing = self._flushing or isinstance(clause, UpdateBase)
+            if writing:
+                self.info["wrote_primary"] = True
+            elif _read_only.get() and not _force_primary.get() and not self.info.get("wrote_primary"):
+                engine = self._db.engines.get(REPLICA_BIND_KEY)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
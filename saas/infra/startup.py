@@ -0,0 +1,67 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+# 启动阶段耗时统计：create_app 各阶段、应用就绪、预热完成、首个请求完成（均相对 saas 包开始导入的时刻）
+
+
+class StartupReport:
+    def __init__(self, t0: float, target_ms: Optional[int] = None):
+        self.t0 = t0
+        self.target_ms = target_ms
+        self.phases: List[Tuple[str, float]] = []
+        self.app_ready_ms: Optional[float] = None
+        self.ready_ms: Optional[float] = None
+        self.first_request_ms: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _since_t0(self) -> float:
+        return round((time.perf_counter() - self.t0) * 1000, 1)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, round((time.perf_counter() - start) * 1000, 1)))
+
+    def mark_app_ready(self) -> None:
+        self.app_ready_ms = self._since_t0()
+        detail = " ".join(f"{name}={ms}ms" for name, ms in self.phases)
+        print(f"Startup: {detail} app_ready={self.app_ready_ms}ms")
+
+    def mark_ready(self) -> None:
+        """
+        预热完成（/readyz 开始返回 200）时调用
+        """
+        self.ready_ms = self._since_t0()
+        print(f"Startup: ready={self.ready_ms}ms")
+
+    def mark_first_request(self) -> None:
+        """
+        首个请求结束时调用（每个进程只记录一次）
+        """
+        if self.first_request_ms is not None:
+            return
+        with self._lock:
+            if self.first_request_ms is not None:
+                return
+            self.first_request_ms = self._since_t0()
+        msg = f"Startup: first_request={self.first_request_ms}ms"
+        if self.target_ms:
+            within = self.first_request_ms <= self.target_ms
+            msg += f" target={self.target_ms}ms within_target={str(within).lower()}"
+        print(msg)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "phases_ms": dict(self.phases),
+            "app_ready_ms": self.app_ready_ms,
+            "ready_ms": self.ready_ms,
+            "first_request_ms": self.first_request_ms,
+            "target_ms": self.target_ms,
+            "within_target": None if self.first_request_ms is None or not self.target_ms
+            else self.first_request_ms <= self.target_ms,
+        }
@@ -0,0 +1,261 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import config
+
+# 出站 HTTP 客户端（微信等上游接口共用）
+# - requests Session + 连接池：复用 keep-alive 连接，避免每次请求重新 TLS 握手
+# - 按接口配置超时 / 重试次数；重试间隔为带抖动的指数退避
+# - 按接口熔断：连续失败达到阈值后直接快速失败，冷却后放行一个探测请求
+
+
+class UpstreamError(RuntimeError):
+    """
+    上游请求失败（连接失败、超时、5xx 且重试耗尽）
+    """
+
+
+class CircuitOpenError(UpstreamError):
+    """
+    熔断打开，请求未发出
+    """
+
+
+class UpstreamBusyError(UpstreamError):
+    """
+    上游调用并发已满，请求未发出
+    """
+
+
+class Endpoint:
+    """
+    上游接口配置
+    - timeout: (连接超时, 读超时) 秒
+    - retries: 失败后的最大重试次数
+    - deadline: 含重试的总耗时上限（秒）；重试的读超时压缩到剩余时间内，
+      剩余时间不足连接超时加一半读超时时不再重试
+    - retry_on_read: 请求可能已发出时（读超时、连接中途断开、5xx、响应无法解析）是否重试，仅对幂等接口开启；
+      未开启时只重试建连失败
+    """
+
+    def __init__(self, name: str, timeout: Tuple[float, float], retries: int = 1, retry_on_read: bool = False,
+                 backoff: float = 0.2, failure_threshold: int = 5, reset_timeout: float = 30,
+                 deadline: Optional[float] = None):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.deadline = deadline
+        self.retry_on_read = retry_on_read
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+
+class CircuitBreaker:
+    """
+    连续失败计数熔断器（线程安全）：closed -> open（冷却 reset_timeout 秒）-> half-open（放行一个探测）
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if self._probing else "open"
+
+
+def _is_connect_error(e: Exception) -> bool:
+    """
+    是否为建连阶段失败（连接超时、DNS 解析失败、连接被拒绝），此时请求一定未发出
+    """
+    import requests
+    from urllib3.exceptions import MaxRetryError, NewConnectionError
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(e, requests.exceptions.ConnectionError):
+        return False
+    reason = e.args[0] if e.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, NewConnectionError)
+
+
+class HttpClient:
+    def __init__(self, pool_size: int = 10):
+        self.pool_size = pool_size
+        self.endpoints: Dict[str, Endpoint] = {}
+        self._lock = threading.Lock()
+        self._session_obj = None
+
+    def register(self, endpoint: Endpoint) -> Endpoint:
+        self.endpoints[endpoint.name] = endpoint
+        return endpoint
+
+    def _session(self):
+        # 所有线程共用一个 Session：连接池（urllib3 PoolManager）本身线程安全，共享才能最大化复用连接
+        if self._session_obj is None:
+            with self._lock:
+                if self._session_obj is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session_obj = session
+        return self._session_obj
+
+    def request(self, endpoint: str, method: str, url: str, parse: Optional[Callable[[Any], Any]] = None,
+                **kwargs: Any):
+        """
+        发起请求并按接口配置重试；返回 requests.Response（4xx 原样返回，由调用方处理）
+        传入 parse 时在重试/熔断范围内解析响应并返回解析结果，响应无法解析同样计为上游失败
+        """
+        ep = self.endpoints[endpoint]
+        if not ep.breaker.allow():
+            raise CircuitOpenError(f"{endpoint}: circuit open")
+        kwargs.setdefault("timeout", ep.timeout)
+        ok = False
+        try:
+            result = self._send(ep, method, url, parse, kwargs)
+            ok = True
+            return result
+        finally:
+            # 任何结果都要落到熔断器上：否则半开探测遇到意外异常时 _probing 不会复位，接口将永久熔断
+            if ok:
+                ep.breaker.record_success()
+            else:
+                ep.breaker.record_failure()
+
+    def _send(self, ep: Endpoint, method: str, url: str, parse: Optional[Callable[[Any], Any]],
+              kwargs: Dict[str, Any]):
+        import requests
+        started = time.monotonic()
+        timeout = kwargs["timeout"]
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        attempt = 0
+        while True:
+            try:
+                resp = self._session().request(method, url, **kwargs)
+                if resp.status_code >= 500:
+                    raise UpstreamError(f"{ep.name}: HTTP {resp.status_code}")
+                return parse(resp) if parse is not None else resp
+            except requests.RequestException as e:
+                # 仅建连阶段失败可确定请求未发出；其余（读超时、连接中途断开、响应体读取失败等）上游可能已处理
+                error: Exception = e
+                retryable = _is_connect_error(e) or ep.retry_on_read
+            except UpstreamError as e:
+                error = e
+                retryable = ep.retry_on_read
+            except Exception as e:
+                # 响应解析失败（非 JSON / XML、编码错误）
+                error = UpstreamError(f"{ep.name}: invalid response: {e}")
+                error.__cause__ = e
+                retryable = ep.retry_on_read
+            # full jitter：[0, backoff * 2^attempt)
+            delay = random.uniform(0, ep.backoff * (2 ** attempt))
+            read_budget = read_timeout
+            if ep.deadline is not None:
+                # 重试的读超时压缩到剩余时间内，整体不超过 deadline；剩余时间太少时重试意义不大，直接失败
+                read_budget = min(read_timeout, ep.deadline - (time.monotonic() - started) - delay - connect_timeout)
+            if not retryable or attempt >= ep.retries or read_budget < read_timeout / 2:
+                if isinstance(error, UpstreamError):
+                    raise error
+                raise UpstreamError(f"{ep.name}: {error}") from error
+            kwargs["timeout"] = (connect_timeout, read_budget)
+            attempt += 1
+            time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: {"circuit": ep.breaker.state, "timeout": list(ep.timeout), "retries": ep.retries}
+                for name, ep in self.endpoints.items()}
+
+
+_client: Optional[HttpClient] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """
+    进程级共享客户端，微信接口在 wechat_service 中注册
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient(pool_size=int(os.getenv("HTTP_POOL_SIZE", "10")))
+    return _client
+
+
+# 上游调用隔离舱：依赖上游的路由把调用提交到独立的有界线程池执行（参数见 config.py）
+# - 同时在途（执行中 + 排队）的上游调用不超过 UPSTREAM_WORKERS + UPSTREAM_QUEUE（默认 Web 线程数的一半），
+#   超出时快速失败，微信抖动时被阻塞的请求线程数有上限，菜单 / 订单等 DB 请求仍有线程可用
+# - 请求线程最多等待 UPSTREAM_DEADLINE 秒（不超过单次请求的连接 + 读超时），超时返回错误
+UPSTREAM_WORKERS = config.UPSTREAM_WORKERS
+UPSTREAM_QUEUE = config.UPSTREAM_QUEUE
+UPSTREAM_DEADLINE = config.UPSTREAM_DEADLINE
+
+_upstream_executor: Optional[ThreadPoolExecutor] = None
+_upstream_slots = threading.BoundedSemaphore(max(1, UPSTREAM_WORKERS + UPSTREAM_QUEUE))
+
+
+def _get_upstream_executor() -> ThreadPoolExecutor:
+    global _upstream_executor
+    if _upstream_executor is None:
+        with _client_lock:
+            if _upstream_executor is None:
+                _upstream_executor = ThreadPoolExecutor(max_workers=max(1, UPSTREAM_WORKERS), thread_name_prefix="upstream")
+    return _upstream_executor
+
+
+def call_upstream(fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    """
+    在上游线程池中执行 fn(*args, **kwargs) 并等待结果
+    并发已满抛出 UpstreamBusyError，等待超过 UPSTREAM_DEADLINE 抛出 UpstreamError
+    fn 不应访问 Flask 请求上下文或数据库会话
+    """
+    if not _upstream_slots.acquire(blocking=False):
+        raise UpstreamBusyError("upstream concurrency limit reached")
+    try:
+        future = _get_upstream_executor().submit(fn, *args, **kwargs)
+    except Exception:
+        _upstream_slots.release()
+        raise
+    future.add_done_callback(lambda _: _upstream_slots.release())
+    try:
+        return future.result(timeout=UPSTREAM_DEADLINE)
+    except FutureTimeoutError:
+        raise UpstreamError(f"upstream call exceeded {UPSTREAM_DEADLINE}s")
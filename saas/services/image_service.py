@@ -0,0 +1,87 @@
+import io
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+from ..infra.media import IMAGE_VARIANTS, is_variant_source, variant_key
+from .storage_service import read_stored_file, write_stored_file
+
+# 上传图片的派生图生成：固定尺寸缩略图 + WebP，派生图不含 EXIF / GPS 信息；原图保持上传时的内容不变
+# 在进程内线程池执行，上传请求只负责提交任务
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+_CONTENT_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, IMAGE_WORKERS), thread_name_prefix="image")
+    return _executor
+
+
+def generate_image_variants(key: str) -> List[str]:
+    """
+    读取原图，生成 IMAGE_VARIANTS 中的全部派生图（不含 EXIF）并写回存储，不修改原图
+    返回写入的对象键
+    """
+    try:
+        from PIL import Image, ImageOps
+    except Exception:
+        raise RuntimeError("Missing dependency: pillow. Please `pip install pillow`")
+
+    img = Image.open(io.BytesIO(read_stored_file(key)))
+    # 按 EXIF 方向旋转后再丢弃 EXIF，避免手机照片缩略图方向错误
+    img = ImageOps.exif_transpose(img)
+    img.load()
+
+    written = []
+    for variant, (size, _, out_fmt) in IMAGE_VARIANTS.items():
+        im = img.copy()
+        im.thumbnail((size, size), Image.LANCZOS)
+        if out_fmt == "JPEG" and im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        elif im.mode not in ("RGB", "RGBA", "L"):
+            im = im.convert("RGBA")
+        buf = io.BytesIO()
+        params = {"quality": 82, "optimize": True} if out_fmt == "JPEG" else {"quality": 80}
+        im.save(buf, out_fmt, **params)
+        vkey = variant_key(key, variant)
+        write_stored_file(vkey, buf.getvalue(), _CONTENT_TYPES[out_fmt])
+        written.append(vkey)
+    return written
+
+
+def _run(key: str, app=None) -> List[str]:
+    try:
+        written = generate_image_variants(key)
+    except Exception as e:
+        # 未登记的图片对外继续使用原图
+        print(f"Warning: image variants failed for {key}: {e}")
+        return []
+    if app is not None:
+        from ..infra.models import db
+        from ..infra.repository import mark_image_variants_ready
+        with app.app_context():
+            try:
+                mark_image_variants_ready(key)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Warning: image variants not recorded for {key}: {e}")
+            finally:
+                db.session.remove()
+    return written
+
+
+def schedule_image_variants(key: str, app=None) -> Optional[Future]:
+    """
+    提交派生图生成任务；传入 app 时生成完成后登记到 media_variants。非图片对象返回 None
+    """
+    if not is_variant_source(key):
+        return None
+    return _get_executor().submit(_run, key, app)
@@ -1,11 +1,11 @@
 from typing import Dict, Any
 from ..domain.order import new_order, OrderStatus
-from ..infra.repository import save_order, get_order, update_order_status, add_points, find_order_by_seq_no_today, find_order_by_verification_code
+from ..infra.repository import save_order, get_order, update_order_status, add_points, find_order_by_seq_no_today, find_order_by_verification_code, load_item_price_map, load_coupon_price_map
 from ..infra.context import get_current_tenant_id
 import time
 
 
-from ..infra.models import Item, Store, Coupon, OrderReview, db
+from ..infra.models import Store, OrderReview, db
 from ..infra.context import set_temporary_tenant
 
 def create_order_service(payload: dict) -> dict:
@@ -16,7 +16,7 @@ def create_order_service(payload: dict) -> dict:
     :param payload: 下单参数
     :return: 订单详情字典
     """
-    # 补充 Item 信息 (Price, Name)
+    # 补充 Item 信息 (Price, Name)，价格以服务端为准，不信任前端
     # 必须先获取租户上下文
     store_id = payload.get("store_id")
     if not store_id:
@@ -28,42 +28,28 @@ def create_order_service(payload: dict) -> dict:
         
     with set_temporary_tenant(store.tenant_id):
         scene = payload.get("scene", "TABLE")
-        items_payload = payload.get("items", [])
-        enriched_items = []
-        
+        items_payload = [it for it in payload.get("items", []) if it.get("item_id")]
+        item_ids = [str(it["item_id"]) for it in items_payload]
+
+        # 一次查询解析全部菜品/优惠券，同一轮内校验下架与跨店
         if scene == "COUPON":
-            for it in items_payload:
-                item_id = it.get("item_id")
-                if not item_id:
-                    continue
-                coupon = Coupon.query.get(item_id)
-                if not coupon:
-                    continue
-                
-                # 注入优惠券价格和名称
-                rule = coupon.rule or {}
-                it["price_cents"] = rule.get("price_cents", 0)
-                it["name"] = rule.get("title", "特价券")
-                enriched_items.append(it)
+            price_map = load_coupon_price_map(item_ids)
         else:
-            for it in items_payload:
-                item_id = it.get("item_id")
-                if not item_id:
-                    continue
-                item = Item.query.get(item_id)
-                if not item:
-                    continue
-                    
-                # 注入真实价格和名称
-                it["price_cents"] = item.base_price_cents
-                it["name"] = item.name
-                # TODO: 计算 specs 加价
-                
-                enriched_items.append(it)
-        
-        payload["items"] = enriched_items
-        
-        order = new_order(payload)
+            price_map = load_item_price_map(store_id, item_ids)
+
+        for item_id in item_ids:
+            info = price_map.get(item_id)
+            if not info:
+                raise ValueError(f"item not found: {item_id}")
+            if info.get("store_id") and info["store_id"] != store_id:
+                raise ValueError(f"item not in this store: {item_id}")
+            if info.get("status") == "OFF":
+                raise ValueError(f"item unavailable: {item_id}")
+        # TODO: 计算 specs 加价
+
+        payload["items"] = items_payload
+
+        order = new_order(payload, price_map)
         save_order(order)
         return order.to_dict()
 
@@ -0,0 +1,55 @@
+import threading
+import time
+from typing import Optional
+
+# 每个 worker 都会启动清理线程，同一时刻只允许一个进程执行清理（MySQL GET_LOCK，不等待）
+SWEEP_LOCK_NAME = "saas_order_sweeper"
+
+
+def sweep_if_leader(batch_size: int) -> Optional[int]:
+    """
+    抢到清理锁时执行一轮清理并返回取消数；锁被其他进程/实例持有时跳过本轮，返回 None
+    """
+    from sqlalchemy import text
+    from ..infra.models import db
+    from ..infra.repository import sweep_expired_orders
+    with db.engine.connect() as conn:
+        mysql = conn.dialect.name == "mysql"
+        if mysql and conn.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": SWEEP_LOCK_NAME}).scalar() != 1:
+            return None
+        try:
+            return sweep_expired_orders(batch_size=batch_size)
+        finally:
+            if mysql:
+                conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": SWEEP_LOCK_NAME})
+                conn.commit()
+
+
+def start_order_sweeper(app) -> Optional[threading.Thread]:
+    """
+    启动进程内超时订单清理线程（守护线程），ORDER_SWEEP_INTERVAL <= 0 时不启动
+    各进程每轮先抢 GET_LOCK，只有持锁者执行 SELECT ... FOR UPDATE 批量取消，避免相互争锁及阻塞下单
+    """
+    interval = int(app.config.get("ORDER_SWEEP_INTERVAL") or 0)
+    if interval <= 0:
+        return None
+    batch_size = int(app.config.get("ORDER_SWEEP_BATCH_SIZE") or 500)
+
+    def loop():
+        from ..infra.models import db
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    n = sweep_if_leader(batch_size)
+                    if n:
+                        print(f"Order sweeper: cancelled {n} expired orders")
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Warning: order sweep failed: {e}")
+                finally:
+                    db.session.remove()
+
+    t = threading.Thread(target=loop, name="order-sweeper", daemon=True)
+    t.start()
+    return t
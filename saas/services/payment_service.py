@@ -1,4 +1,5 @@
 from ..infra.repository import get_order, update_order_status, save_payment, charge_wallet, add_points
+from ..infra.models import db
 from ..domain.order import OrderStatus
 
 
@@ -12,10 +13,13 @@ def pay_order_service(order_id: str, channel: str = "WX_JSAPI") -> dict:
     order = get_order(order_id)
     if not order:
         return {"error": "not_found"}
+    if order.status != OrderStatus.CREATED:
+        return {"error": "invalid_transition"}
         
-    # 处理余额支付扣减
+    # 处理余额支付扣减（不单独提交，与订单状态流转同一事务）
     if channel == "WALLET":
-        if not charge_wallet(order.user_id, order.price_payable_cents):
+        if not charge_wallet(order.user_id, order.price_payable_cents, ref_id=order_id, commit=False):
+            db.session.rollback()
             return {"error": "insufficient_balance"}
     
     # 状态机流转：CREATED -> PAID / WAIT_USE / WAIT_COMMENT
@@ -26,6 +30,8 @@ def pay_order_service(order_id: str, channel: str = "WX_JSAPI") -> dict:
         target_status = OrderStatus.DONE
         
     if not update_order_status(order_id, target_status):
+        # 并发支付/取消抢先完成了流转，本次余额扣款随事务回滚
+        db.session.rollback()
         return {"error": "invalid_transition"}
         
     payment = {
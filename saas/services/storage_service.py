@@ -1,62 +1,236 @@
+import hashlib
+import io
 import os
 import time
 import uuid
 import json
+import threading
 from urllib import request as urllib_request
-from typing import Dict
+from typing import Dict, Iterable, Optional, Tuple
+from ..infra.cache import TTLCache
+from ..infra.media import is_variant_source
 
 def _safe_filename(name: str) -> str:
     name = (name or "upload.bin").strip().replace("\\", "/").split("/")[-1]
     # 简单去除危险字符
     return "".join(c for c in name if c.isalnum() or c in (".", "-", "_")) or "upload.bin"
 
-def upload_file_stream(user_id: str, filename: str, data: bytes, content_type: str) -> Dict[str, str]:
+# COS 客户端按 (region, 密钥, token) 缓存复用：CosS3Client 内部持有 requests Session，
+# 复用后签名/上传共享 keep-alive 连接池；临时密钥轮换（环境变量变化）时自动重建
+_cos_lock = threading.Lock()
+_cos_client: Optional[Tuple[tuple, object]] = None
+
+
+# 预签名 URL 有效期与复用：同一对象在签名到期前 COS_PRESIGN_REFRESH 秒内一直返回同一 URL，
+# 前端图片缓存才能命中；密钥轮换时清空
+PRESIGN_EXPIRES = int(os.getenv("COS_PRESIGN_EXPIRES", "3600"))
+PRESIGN_REFRESH = int(os.getenv("COS_PRESIGN_REFRESH", "600"))
+_presign_cache = TTLCache(maxsize=int(os.getenv("COS_PRESIGN_CACHE_SIZE", "4096")),
+                          ttl=PRESIGN_EXPIRES - PRESIGN_REFRESH)
+
+
+def _cos_settings() -> Dict[str, Optional[str]]:
+    return {
+        "bucket": os.getenv("COS_BUCKET", "").strip(),
+        "region": os.getenv("COS_REGION", "").strip(),
+        "secret_id": os.getenv("COS_SECRET_ID", "").strip(),
+        "secret_key": os.getenv("COS_SECRET_KEY", "").strip(),
+        "token": os.getenv("COS_TOKEN", "").strip() or None,
+    }
+
+
+def get_cos_client(settings: Optional[Dict[str, Optional[str]]] = None):
+    """
+    返回缓存的 CosS3Client；凭证或地域变化时重建（旧客户端随之释放）
+    """
+    global _cos_client
+    st = settings or _cos_settings()
+    ident = (st["region"], st["secret_id"], st["secret_key"], st["token"])
+    cached = _cos_client
+    if cached is not None and cached[0] == ident:
+        return cached[1]
+    try:
+        # 仅在启用 COS 时尝试导入，避免未安装时报错
+        from qcloud_cos import CosConfig, CosS3Client
+    except Exception:
+        raise RuntimeError("Missing dependency: cos-python-sdk-v5. Please `pip install cos-python-sdk-v5`")
+    with _cos_lock:
+        cached = _cos_client
+        if cached is not None and cached[0] == ident:
+            return cached[1]
+        pool = int(os.getenv("COS_POOL_SIZE", "10"))
+        config = CosConfig(Region=st["region"], SecretId=st["secret_id"], SecretKey=st["secret_key"],
+                           Token=st["token"], PoolConnections=pool, PoolMaxSize=pool)
+        client = CosS3Client(config)
+        if cached is not None:
+            # 旧密钥签出的 URL 可能随临时密钥一起失效
+            _presign_cache.clear()
+        _cos_client = (ident, client)
+        return client
+
+
+# 上传：边读边校验大小并计算 sha256，单次上传占用内存不超过 COS_MULTIPART_THRESHOLD
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(5 * 1024 * 1024)))
+UPLOAD_CHUNK = 256 * 1024
+# 超过阈值的文件走 COS 分块上传（COS 要求除最后一块外每块 >= 1MB）
+COS_MULTIPART_THRESHOLD = int(os.getenv("COS_MULTIPART_THRESHOLD", str(4 * 1024 * 1024)))
+COS_PART_SIZE = max(1024 * 1024, int(os.getenv("COS_PART_SIZE", str(2 * 1024 * 1024))))
+
+
+def local_storage_dir() -> str:
+    return os.getenv("STORAGE_LOCAL_DIR") or "/tmp/saas_uploads"
+
+
+class _UploadReader:
+    """
+    包装上传流：按块读取，累计大小超过上限时抛出 ValueError("file_too_large")，同时计算 sha256
+    """
+
+    def __init__(self, stream, max_bytes: int):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def read(self, n: int = UPLOAD_CHUNK) -> bytes:
+        chunk = self.stream.read(n)
+        if chunk:
+            self.size += len(chunk)
+            if self.size > self.max_bytes:
+                raise ValueError("file_too_large")
+            self.sha256.update(chunk)
+        return chunk
+
+    def read_up_to(self, n: int) -> bytes:
+        """
+        读取至多 n 字节（流结束前尽量读满）
+        """
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.read(min(UPLOAD_CHUNK, n - len(buf)))
+            if not chunk:
+                break
+            buf += chunk
+        return bytes(buf)
+
+
+def _cos_put(client, bucket: str, key: str, reader: _UploadReader, content_type: str) -> None:
+    head = reader.read_up_to(COS_MULTIPART_THRESHOLD + 1)
+    if not head:
+        raise ValueError("empty_file")
+    if len(head) <= COS_MULTIPART_THRESHOLD:
+        client.put_object(Bucket=bucket, Body=head, Key=key, ContentType=content_type)
+        return
+    upload_id = client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)["UploadId"]
+    try:
+        parts = []
+        pending = head
+        while pending:
+            while len(pending) < COS_PART_SIZE:
+                more = reader.read_up_to(COS_PART_SIZE - len(pending))
+                if not more:
+                    break
+                pending += more
+            body, pending = pending[:COS_PART_SIZE], pending[COS_PART_SIZE:]
+            n = len(parts) + 1
+            resp = client.upload_part(Bucket=bucket, Key=key, Body=body, PartNumber=n, UploadId=upload_id)
+            parts.append({"PartNumber": n, "ETag": resp["ETag"]})
+        client.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                         MultipartUpload={"Part": parts})
+    except Exception:
+        try:
+            client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        except Exception:
+            pass
+        raise
+
+
+def _local_put(key: str, reader: _UploadReader) -> None:
+    full_path = os.path.join(local_storage_dir(), key)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    tmp_path = full_path + ".part"
+    try:
+        with open(tmp_path, "wb") as f:
+            while True:
+                chunk = reader.read()
+                if not chunk:
+                    break
+                f.write(chunk)
+        if reader.size == 0:
+            raise ValueError("empty_file")
+        os.replace(tmp_path, full_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_stored_file(key: str) -> bytes:
+    """
+    读取已上传对象的内容（本地目录或 COS）
+    """
+    if (os.getenv("STORAGE_DRIVER") or "LOCAL").upper() == "COS":
+        st = _cos_settings()
+        resp = get_cos_client(st).get_object(Bucket=st["bucket"], Key=key)
+        return resp["Body"].get_raw_stream().read()
+    with open(os.path.join(local_storage_dir(), key), "rb") as f:
+        return f.read()
+
+
+def write_stored_file(key: str, data: bytes, content_type: str) -> None:
+    """
+    写入对象（用于派生图等服务端生成的小文件）
     """
-    统一的对象存储上传入口：
+    if (os.getenv("STORAGE_DRIVER") or "LOCAL").upper() == "COS":
+        st = _cos_settings()
+        get_cos_client(st).put_object(Bucket=st["bucket"], Body=data, Key=key, ContentType=content_type)
+        return
+    _local_put(key, _UploadReader(io.BytesIO(data), len(data)))
+
+
+def upload_file_stream(user_id: str, filename: str, data, content_type: str,
+                       max_bytes: Optional[int] = None, allowed_exts: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    """
+    统一的对象存储上传入口（C 端与平台后台共用）：
     - 环境变量 STORAGE_DRIVER=COS 时，使用腾讯云 COS
     - 否则走本地目录 STORAGE_LOCAL_DIR（默认 /tmp/saas_uploads）
+    data 为文件流（如 request.files 的 stream）或 bytes；边读边写，不整体读入内存
+    校验失败抛出 ValueError：empty_file / file_too_large / unsupported_type
     返回:
       - key: 对象键（路径）
       - url: 可访问的URL（COS为公网，LOCAL需自行映射静态目录或开发使用）
+      - size / sha256: 文件大小与内容摘要
     """
     driver = (os.getenv("STORAGE_DRIVER") or "LOCAL").upper()
     ts = int(time.time())
     fid = uuid.uuid4().hex[:12]
     fname = _safe_filename(filename)
-    key = f"uploads/{user_id}/{ts}-{fid}-{fname}"
+    if allowed_exts is not None:
+        ext = fname.rsplit(".", 1)[-1].lower() if "." in fname else ""
+        if ext not in set(allowed_exts):
+            raise ValueError("unsupported_type")
+    key = f"uploads/{_safe_filename(user_id)}/{ts}-{fid}-{fname}"
+    content_type = content_type or "application/octet-stream"
+    if isinstance(data, (bytes, bytearray)):
+        data = io.BytesIO(data)
+    reader = _UploadReader(data, UPLOAD_MAX_BYTES if max_bytes is None else max_bytes)
 
     if driver == "COS":
         # 期望环境变量：
         # COS_BUCKET, COS_REGION
         # 可选：COS_SECRET_ID, COS_SECRET_KEY (若不填则尝试获取微信云托管临时密钥)
         # 可选：COS_BASE_URL (自定义CDN域名)
-        bucket = os.getenv("COS_BUCKET", "").strip()
-        region = os.getenv("COS_REGION", "").strip()
+        st = _cos_settings()
+        bucket, region = st["bucket"], st["region"]
+        secret_id, secret_key = st["secret_id"], st["secret_key"]
         base_url = os.getenv("COS_BASE_URL", "").strip()
         
-        secret_id = os.getenv("COS_SECRET_ID", "").strip()
-        secret_key = os.getenv("COS_SECRET_KEY", "").strip()
-        token = os.getenv("COS_TOKEN", "").strip() or None
-        
         # 调试输出
         if not all([secret_id, secret_key, bucket, region]):
             print(f"Missing COS Config: bucket={bucket}, region={region}, has_secret_id={bool(secret_id)}, has_secret_key={bool(secret_key)}")
             raise RuntimeError("COS config missing: COS_BUCKET|COS_REGION is required. COS_SECRET_ID|COS_SECRET_KEY is required unless in WXCloud environment.")
 
-        try:
-            # 仅在启用 COS 时尝试导入，避免未安装时报错
-            from qcloud_cos import CosConfig, CosS3Client
-        except Exception:
-            raise RuntimeError("Missing dependency: cos-python-sdk-v5. Please `pip install cos-python-sdk-v5`")
-
-        config = CosConfig(Region=region, SecretId=secret_id, SecretKey=secret_key, Token=token)
-        client = CosS3Client(config)
-        client.put_object(
-            Bucket=bucket,
-            Body=data,
-            Key=key,
-            ContentType=content_type or "application/octet-stream",
-        )
+        client = get_cos_client(st)
+        _cos_put(client, bucket, key, reader, content_type)
         if base_url:
             url = f"{base_url.rstrip('/')}/{key}"
         else:
@@ -76,65 +250,117 @@ def upload_file_stream(user_id: str, filename: str, data: bytes, content_type: s
         
         # 生成一个短期有效的签名 URL，确保即使 Bucket 是私有的，前端上传后也能立即回显
         try:
-            signed_url = client.get_presigned_url(
-                Method='GET',
-                Bucket=bucket,
-                Key=key,
-                Expired=3600
-            )
-            print('signed_url: ', signed_url)
+            signed_url = _presign(client, bucket, key)
         except Exception as e:
             raise RuntimeError(f"Failed to generate signed URL: {e}")
-            signed_url = ""
 
-        return {"key": key, "url": url, "file_id": file_id, "signed_url": signed_url}
+        _schedule_variants(key)
+        # 缩略图在后台生成，上传响应中先回退为原图（签名地址）
+        return {"key": key, "url": url, "file_id": file_id, "signed_url": signed_url,
+                "size": reader.size, "sha256": reader.sha256.hexdigest(),
+                "thumbnail_url": signed_url}
 
     # LOCAL 存储：开发联调用。生产请使用 COS。
-
-    base_dir = os.getenv("STORAGE_LOCAL_DIR") or "/tmp/saas_uploads"
-    full_path = os.path.join(base_dir, key)
-    os.makedirs(os.path.dirname(full_path), exist_ok=True)
-    with open(full_path, "wb") as f:
-        f.write(data)
+    _local_put(key, reader)
+    _schedule_variants(key)
     # 本地没有公网URL，这里返回一个相对路径提示；若需要前端展示，请配置静态映射
     # 例如：将 base_dir 映射到 /static/uploads，从而形成 /static/...
+    url = _local_url(key)
+    return {"key": key, "url": url, "file_id": None, "signed_url": url,
+            "size": reader.size, "sha256": reader.sha256.hexdigest(),
+            "thumbnail_url": url}
+
+
+def _schedule_variants(key: str) -> None:
+    """
+    图片上传后提交缩略图 / WebP 生成任务（后台线程池执行，不阻塞上传请求）
+    生成完成后在应用上下文中登记，菜单随后才对外提供派生图地址
+    """
+    if not is_variant_source(key):
+        return
+    try:
+        from flask import current_app, has_app_context
+        from .image_service import schedule_image_variants
+        schedule_image_variants(key, current_app._get_current_object() if has_app_context() else None)
+    except Exception as e:
+        print(f"Warning: image variant job not scheduled for {key}: {e}")
+
+
+def _local_url(key: str) -> str:
     static_prefix = os.getenv("STORAGE_LOCAL_STATIC_PREFIX") or "/static"
-    url = f"{static_prefix}/{key.split('uploads/',1)[-1]}"
-    return {"key": key, "url": url, "file_id": None, "signed_url": url}
+    return f"{static_prefix}/{key.split('uploads/',1)[-1]}"
+
+
+def _presign(client, bucket: str, key: str) -> str:
+    return _presign_cache.get_or_set((bucket, key), lambda: client.get_presigned_url(
+        Method='GET',
+        Bucket=bucket,
+        Key=key,
+        Expired=PRESIGN_EXPIRES
+    ))
 
 
 def get_presigned_url(key: str) -> str:
     """
     获取文件的临时访问链接 (用于 COS 私有读)
     如果不是 COS 驱动，返回 None 或 静态链接
+    签名结果进程内缓存，临近过期前复用同一 URL
     """
     driver = (os.getenv("STORAGE_DRIVER") or "LOCAL").upper()
     if driver != "COS":
         # Local storage, just return static url logic
         # 这里简单复用 upload 的逻辑
-        static_prefix = os.getenv("STORAGE_LOCAL_STATIC_PREFIX") or "/static"
-        return f"{static_prefix}/{key.split('uploads/',1)[-1]}"
+        return _local_url(key)
 
     try:
-        from qcloud_cos import CosConfig, CosS3Client
-        secret_id = os.getenv("COS_SECRET_ID")
-        secret_key = os.getenv("COS_SECRET_KEY")
-        bucket = os.getenv("COS_BUCKET")
-        region = os.getenv("COS_REGION")
-        token = None
-        
-        if not all([secret_id, secret_key, bucket, region]):
+        st = _cos_settings()
+        bucket = st["bucket"]
+        if not all([st["secret_id"], st["secret_key"], bucket, st["region"]]):
             return ""
-
-        config = CosConfig(Region=region, SecretId=secret_id, SecretKey=secret_key, Token=token)
-        client = CosS3Client(config)
-        # 生成预签名 URL (1小时有效)
-        url = client.get_presigned_url(
-            Method='GET',
-            Bucket=bucket,
-            Key=key,
-            Expired=3600
-        )
-        return url
+        return _presign(get_cos_client(st), bucket, key)
     except Exception:
         return ""
+
+
+def sign_many(keys: Iterable[str]) -> Dict[str, str]:
+    """
+    批量获取访问链接，返回 {key: url}；空 key 与已是 URL/绝对路径的值原样返回
+    密钥与客户端只解析一次，签名走同一缓存
+    """
+    res: Dict[str, str] = {}
+    pending = []
+    for k in keys:
+        if not k or k in res:
+            continue
+        if k.startswith("http") or k.startswith("/"):
+            res[k] = k
+        else:
+            res[k] = ""
+            pending.append(k)
+    if not pending:
+        return res
+    driver = (os.getenv("STORAGE_DRIVER") or "LOCAL").upper()
+    if driver != "COS":
+        for k in pending:
+            res[k] = _local_url(k)
+        return res
+    st = _cos_settings()
+    if not all([st["secret_id"], st["secret_key"], st["bucket"], st["region"]]):
+        return res
+    try:
+        client = get_cos_client(st)
+    except Exception:
+        return res
+    for k in pending:
+        try:
+            res[k] = _presign(client, st["bucket"], k)
+        except Exception:
+            pass
+    return res
+
+
+def presign_cache_stats() -> Dict[str, object]:
+    """
+    预签名 URL 缓存命中统计
+    """
+    return _presign_cache.stats()
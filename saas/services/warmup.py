@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# 进程级启动预热（每个 worker 各自执行，缓存与连接池都是进程内的）
+# - gunicorn 下在 post_fork 中同步执行一次，worker 预热完成后才开始接受连接（含 max_requests 回收后补充的 worker），
+#   失败时转入后台按间隔重试直到成功
+# - 每个进程在 WARMUP_STATE_DIR 下写入以 pid 命名的标记文件（warming / ready），/readyz 汇总所有存活进程，
+#   容器首次就绪前任一进程未就绪即返回 503，不会因为探针恰好落在已预热的 worker 上就判定整个容器就绪
+# - 容器首次就绪后写入 CONTAINER_READY_MARKER，此后只要有 worker 就绪即为就绪：max_requests 回收后补充的 worker
+#   预热（或预热失败重试）期间本就不接受连接，不应让整个容器周期性地 503
+
+WARMUP_RETRY_INTERVAL = 5
+HOT_MENU_LIMIT = 20
+CONTAINER_READY_MARKER = "container"
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {"started": False, "ready": False, "attempts": 0, "steps": {}, "error": None}
+
+
+def warmup_state() -> Dict[str, Any]:
+    with _lock:
+        return {k: (dict(v) if isinstance(v, dict) else v) for k, v in _state.items()}
+
+
+def is_ready() -> bool:
+    return _state["ready"]
+
+
+def _write_marker(app, status: str) -> None:
+    state_dir = app.config.get("WARMUP_STATE_DIR")
+    if not state_dir:
+        return
+    path = os.path.join(state_dir, str(os.getpid()))
+    try:
+        os.makedirs(state_dir, exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            f.write(status)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"Warning: could not write warm-up marker {path}: {e}")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def clear_warmup_markers(state_dir: Optional[str], pid: Optional[int] = None) -> None:
+    """
+    删除预热标记：pid 为空时清空目录（主进程启动时），否则只删除该进程的标记（worker 退出时）
+    """
+    if not state_dir or not os.path.isdir(state_dir):
+        return
+    names = [str(pid)] if pid is not None else os.listdir(state_dir)
+    for name in names:
+        try:
+            os.remove(os.path.join(state_dir, name))
+        except OSError:
+            pass
+
+
+def workers_state(app) -> Dict[str, int]:
+    """
+    汇总 WARMUP_STATE_DIR 下存活进程的预热状态：{"ready": n, "warming": m}
+    未配置目录时只反映本进程
+    """
+    counts = {"ready": 0, "warming": 0}
+    state_dir = app.config.get("WARMUP_STATE_DIR")
+    if not state_dir or not os.path.isdir(state_dir):
+        counts["ready" if is_ready() else "warming"] += 1
+        return counts
+    for name in os.listdir(state_dir):
+        if not name.isdigit() or not _pid_alive(int(name)):
+            continue
+        try:
+            with open(os.path.join(state_dir, name)) as f:
+                status = f.read().strip()
+        except OSError:
+            continue
+        counts["ready" if status == "ready" else "warming"] += 1
+    return counts
+
+
+def container_ready(app) -> bool:
+    """
+    容器是否已首次就绪（所有 worker 都曾同时就绪）；未配置目录时等同于本进程是否就绪
+    """
+    state_dir = app.config.get("WARMUP_STATE_DIR")
+    if not state_dir:
+        return is_ready()
+    return os.path.exists(os.path.join(state_dir, CONTAINER_READY_MARKER))
+
+
+def mark_container_ready(app) -> None:
+    state_dir = app.config.get("WARMUP_STATE_DIR")
+    if not state_dir:
+        return
+    try:
+        os.makedirs(state_dir, exist_ok=True)
+        open(os.path.join(state_dir, CONTAINER_READY_MARKER), "a").close()
+    except OSError as e:
+        print(f"Warning: could not write container ready marker in {state_dir}: {e}")
+
+
+def run_warmup(app) -> None:
+    """
+    依次执行：SQLAlchemy mapper 配置、连接池建连、商户目录与门店列表、热门门店菜单快照
+    """
+    from sqlalchemy.orm import configure_mappers
+    from ..infra.models import db
+    from ..infra.pool import warm_up_pool
+    from ..infra.repository import warm_merchant_directory, list_stores, hot_store_ids, get_menu_snapshot
+
+    startup = app.extensions.get("startup")
+    steps = {}
+
+    def step(name, fn):
+        start = time.perf_counter()
+        result = fn()
+        steps[name] = {"ms": round((time.perf_counter() - start) * 1000, 1), "result": result}
+        if startup is not None:
+            startup.phases.append((f"warmup_{name}", steps[name]["ms"]))
+
+    with app.app_context():
+        try:
+            step("mappers", lambda: configure_mappers() or True)
+            step("pool", lambda: warm_up_pool(db.engine, app.config.get("DB_POOL_WARMUP") or 0))
+            step("merchants", warm_merchant_directory)
+            step("stores", lambda: len(list_stores()))
+            step("menus", lambda: sum(1 for sid in hot_store_ids(HOT_MENU_LIMIT) if get_menu_snapshot(sid)))
+        finally:
+            db.session.remove()
+    with _lock:
+        _state["steps"] = steps
+    if startup is not None:
+        startup.mark_ready()
+
+
+def _attempt(app) -> bool:
+    with _lock:
+        _state["attempts"] += 1
+    try:
+        run_warmup(app)
+    except Exception as e:
+        with _lock:
+            _state["error"] = str(e)
+        print(f"Warning: warm-up failed, retrying in {WARMUP_RETRY_INTERVAL}s: {e}")
+        return False
+    with _lock:
+        _state["ready"] = True
+        _state["error"] = None
+    _write_marker(app, "ready")
+    return True
+
+
+def _loop(app, wait_first: bool = False) -> None:
+    if wait_first:
+        time.sleep(WARMUP_RETRY_INTERVAL)
+    while not _attempt(app):
+        time.sleep(WARMUP_RETRY_INTERVAL)
+
+
+def start_warmup(app, blocking: bool = False) -> bool:
+    """
+    启动预热（每个进程只启动一次），返回本次是否启动
+    blocking=True 时先在当前线程执行一次（gunicorn post_fork，预热完成前 worker 不接受连接），失败后转入后台重试
+    """
+    with _lock:
+        if _state["started"]:
+            return False
+        _state["started"] = True
+    _write_marker(app, "warming")
+    if blocking and _attempt(app):
+        return True
+    threading.Thread(target=_loop, args=(app, blocking), name="warmup", daemon=True).start()
+    return True
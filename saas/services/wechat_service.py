@@ -5,7 +5,41 @@ import hashlib
 import random
 import string
 import xml.etree.ElementTree as ET
-from urllib import request as urlreq, parse as urlparse
+import config
+from .http_client import Endpoint, HttpClient, UpstreamError, get_http_client
+
+# 上游地址可通过环境变量指向本地模拟服务（wechat_mock_server.py）做离线压测
+WX_API_BASE = os.getenv("WX_API_BASE", "https://api.weixin.qq.com").rstrip("/")
+WX_PAY_API_BASE = os.getenv("WX_PAY_API_BASE", "https://api.mch.weixin.qq.com").rstrip("/")
+
+# code 只能使用一次，仅重试建连失败（请求未发出）；统一下单按 out_trade_no 幂等，读超时 / 5xx 也可重试
+# 含重试的总耗时不超过 UPSTREAM_DEADLINE（请求线程的等待上限）：重试的读超时压缩到剩余时间内，
+# 建连失败（请求未发出、通常立即返回）在该时限内仍可重试
+_JSCODE2SESSION = Endpoint(
+    "wx.jscode2session",
+    timeout=(config.WX_CONNECT_TIMEOUT, config.WX_LOGIN_TIMEOUT),
+    retries=2,
+    deadline=config.UPSTREAM_DEADLINE,
+)
+_UNIFIEDORDER = Endpoint(
+    "wx.unifiedorder",
+    timeout=(config.WX_CONNECT_TIMEOUT, config.WX_PAY_TIMEOUT),
+    retries=2,
+    retry_on_read=True,
+    deadline=config.UPSTREAM_DEADLINE,
+)
+
+def register_wechat_endpoints() -> HttpClient:
+    """
+    在进程级共享客户端上登记微信接口（可重复调用），返回该客户端
+    """
+    client = get_http_client()
+    for ep in (_JSCODE2SESSION, _UNIFIEDORDER):
+        if client.endpoints.get(ep.name) is not ep:
+            client.register(ep)
+    return client
+
+_http = register_wechat_endpoints()
 
 def _nonce_str() -> str:
     return ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(16))
@@ -50,17 +84,30 @@ def jsapi_unified_order(appid: str, mchid: str, openid: str, description: str, o
     }
     params["sign"] = _sign_v2(params, api_key)
     xml = _dict_to_xml(params)
-    url = "https://api.mch.weixin.qq.com/pay/unifiedorder"
-    req = urlreq.Request(url, data=xml.encode("utf-8"), headers={"Content-Type": "application/xml"})
-    resp = urlreq.urlopen(req, timeout=8)
-    data = resp.read().decode("utf-8")
-    r = _xml_to_dict(data)
+    try:
+        r = _http.request(_UNIFIEDORDER.name, "POST", f"{WX_PAY_API_BASE}/pay/unifiedorder",
+                          parse=lambda resp: _xml_to_dict(resp.content.decode("utf-8")),
+                          data=xml.encode("utf-8"), headers={"Content-Type": "application/xml"})
+    except UpstreamError as e:
+        return {"error": "wechat_unavailable", "detail": str(e)}
     if r.get("return_code") != "SUCCESS":
         return {"error": "wechat_return_error", "detail": r.get("return_msg", "")}
     if r.get("result_code") != "SUCCESS":
         return {"error": "wechat_result_error", "code": r.get("err_code"), "detail": r.get("err_code_des")}
     return {"prepay_id": r.get("prepay_id")}
 
+def jscode2session(appid: str, secret: str, code: str) -> dict:
+    """
+    小程序登录凭证校验，返回微信原始响应（含 openid / errcode）
+    上游不可用或响应无法解析时抛出 UpstreamError（熔断打开时为 CircuitOpenError）
+    """
+    return _http.request(_JSCODE2SESSION.name, "GET", f"{WX_API_BASE}/sns/jscode2session", parse=lambda resp: resp.json(), params={
+        "appid": appid,
+        "secret": secret,
+        "js_code": code,
+        "grant_type": "authorization_code"
+    })
+
 def build_jsapi_params(appid: str, prepay_id: str) -> dict:
     ts = str(int(time.time()))
     nonce = _nonce_str()
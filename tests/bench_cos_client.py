@@ -0,0 +1,51 @@
+"""
+COS 客户端构造与签名的单次开销对比（不访问网络，签名为本地计算）
+运行：python -m tests.bench_cos_client [次数]
+"""
+import os
+import sys
+import timeit
+
+os.environ.update({
+    "STORAGE_DRIVER": "COS",
+    "COS_BUCKET": "bench-1250000000",
+    "COS_REGION": "ap-shanghai",
+    "COS_SECRET_ID": "AKIDbench",
+    "COS_SECRET_KEY": "bench-secret",
+})
+
+from qcloud_cos import CosConfig, CosS3Client  # noqa: E402
+
+from saas.services import storage_service  # noqa: E402
+from saas.services.storage_service import get_cos_client, get_presigned_url, _cos_settings  # noqa: E402
+
+
+def per_call_client(key: str) -> str:
+    # 改造前：每次调用新建 CosConfig / CosS3Client
+    st = _cos_settings()
+    client = CosS3Client(CosConfig(Region=st["region"], SecretId=st["secret_id"], SecretKey=st["secret_key"]))
+    return client.get_presigned_url(Method="GET", Bucket=st["bucket"], Key=key, Expired=3600)
+
+
+def cached_client(key: str) -> str:
+    # 复用客户端，每次重新签名
+    st = _cos_settings()
+    return get_cos_client(st).get_presigned_url(Method="GET", Bucket=st["bucket"], Key=key, Expired=3600)
+
+
+def cached_client_and_url(key: str) -> str:
+    # 复用客户端 + 预签名 URL 缓存（线上 get_presigned_url 路径）
+    return get_presigned_url(key)
+
+
+def main(number: int) -> None:
+    keys = [f"uploads/bench/{i}.jpg" for i in range(50)]
+    storage_service._presign_cache.clear()
+    for fn in (per_call_client, cached_client, cached_client_and_url):
+        seconds = timeit.timeit(lambda: [fn(k) for k in keys], number=number)
+        per_call_us = seconds / (number * len(keys)) * 1e6
+        print(f"{fn.__name__:<24} {per_call_us:10.1f} us/call  ({number} x 50-store page)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from saas import create_app
+from saas.infra.models import db, Merchant, Store, Item, Order, OrderItem
+
+
+def build_app(**overrides):
+    """
+    sqlite 内存库上的应用（执行全部迁移，不写示例数据、不启动后台线程）
+    """
+    return create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite://",
+        "SQLALCHEMY_ENGINE_OPTIONS": {},
+        "AUTO_MIGRATE": "1",
+        "SEED_DEMO_DATA": False,
+        "METRICS_CACHE_TTL": 0,
+        **overrides,
+    })
+
+
+@pytest.fixture
+def app():
+    app = build_app()
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def tenant(app):
+    """
+    一个商户 + 一个门店 + 两个菜品，返回 {"tenant_id", "store_id", "item_ids"}
+    """
+    tid = uuid.uuid4().hex
+    sid = uuid.uuid4().hex
+    db.session.add(Merchant(id=tid, slug="t-" + tid[:8], name="测试商户"))
+    db.session.add(Store(id=sid, slug="s1", name="测试门店", tenant_id=tid, features={}))
+    item_ids = []
+    for n in range(2):
+        iid = uuid.uuid4().hex
+        db.session.add(Item(id=iid, store_id=sid, tenant_id=tid, name=f"菜品{n}",
+                            image_url=f"https://img.example.com/{iid}.jpg", base_price_cents=1000))
+        item_ids.append(iid)
+    db.session.commit()
+    return {"tenant_id": tid, "store_id": sid, "item_ids": item_ids}
+
+
+@pytest.fixture
+def cos_env(monkeypatch):
+    """
+    COS 存储驱动（不实际上传、不生成派生图），签名在本地完成
+    """
+    from saas.services import storage_service
+    monkeypatch.setenv("STORAGE_DRIVER", "COS")
+    monkeypatch.setenv("COS_BUCKET", "test-1250000000")
+    monkeypatch.setenv("COS_REGION", "ap-shanghai")
+    monkeypatch.setenv("COS_SECRET_ID", "AKIDtest")
+    monkeypatch.setenv("COS_SECRET_KEY", "secret")
+    monkeypatch.delenv("COS_BASE_URL", raising=False)
+    monkeypatch.setattr(storage_service, "_cos_put", lambda client, bucket, key, reader, ct: reader.read_up_to(1 << 20))
+    monkeypatch.setattr(storage_service, "_schedule_variants", lambda key: None)
+
+
+def make_order(tenant, user_id="u1", status="PAID", payable=1000, created_at=None, lines=2):
+    """
+    直接写入订单及订单项（绕过下单流程与聚合表）
+    """
+    oid = uuid.uuid4().hex
+    db.session.add(Order(id=oid, tenant_id=tenant["tenant_id"], store_id=tenant["store_id"], user_id=user_id,
+                         status=status, price_total_cents=payable, price_payable_cents=payable,
+                         created_at=created_at or int(time.time())))
+    for n in range(lines):
+        iid = tenant["item_ids"][n % len(tenant["item_ids"])]
+        db.session.add(OrderItem(order_id=oid, item_id=iid, tenant_id=tenant["tenant_id"],
+                                 name="菜品", price_cents=payable, quantity=1))
+    db.session.commit()
+    return oid
+
+
+@contextmanager
+def count_queries():
+    """
+    统计代码块内发出的 SQL 条数：with count_queries() as n: ...; n[0]
+    """
+    counter = [0]
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter[0] += 1
+
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
@@ -0,0 +1,27 @@
+from saas.services import storage_service
+from saas.services.storage_service import get_cos_client, get_presigned_url
+
+
+def _cos_env(monkeypatch, secret_id="AKIDtest", token=""):
+    monkeypatch.setenv("STORAGE_DRIVER", "COS")
+    monkeypatch.setenv("COS_BUCKET", "test-1250000000")
+    monkeypatch.setenv("COS_REGION", "ap-shanghai")
+    monkeypatch.setenv("COS_SECRET_ID", secret_id)
+    monkeypatch.setenv("COS_SECRET_KEY", "secret")
+    monkeypatch.setenv("COS_TOKEN", token)
+
+
+def test_client_is_reused_until_credentials_rotate(monkeypatch):
+    monkeypatch.setattr(storage_service, "_cos_client", None)
+    storage_service._presign_cache.clear()
+    _cos_env(monkeypatch)
+    client = get_cos_client()
+    assert get_cos_client() is client
+
+    url = get_presigned_url("uploads/a.jpg")
+    assert url.startswith("https://") and get_presigned_url("uploads/a.jpg") == url
+
+    # 临时密钥轮换：重建客户端并丢弃旧密钥签出的 URL
+    _cos_env(monkeypatch, token="new-session-token")
+    assert get_cos_client() is not client
+    assert storage_service._presign_cache.stats()["size"] == 0
@@ -0,0 +1,145 @@
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from saas.services.http_client import Endpoint, HttpClient, UpstreamError
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=b"{}"):
+        self.status_code = status_code
+        self.content = body
+
+    def json(self):
+        import json
+        return json.loads(self.content)
+
+
+class FakeSession:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.timeouts = []
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        self.timeouts.append(kwargs.get("timeout"))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def _client(session, **endpoint_kwargs):
+    client = HttpClient()
+    client._session_obj = session
+    endpoint_kwargs.setdefault("backoff", 0)
+    ep = client.register(Endpoint("test", timeout=(1, 1), **endpoint_kwargs))
+    return client, ep
+
+
+def _connect_refused():
+    reason = NewConnectionError(None, "connection refused")
+    return requests.exceptions.ConnectionError(MaxRetryError(None, "/", reason))
+
+
+def test_non_idempotent_endpoint_retries_only_connect_errors():
+    session = FakeSession(_connect_refused(), requests.exceptions.ConnectTimeout(), FakeResponse(body=b'{"openid": "o"}'))
+    client, _ = _client(session, retries=2)
+    assert client.request("test", "GET", "http://x", parse=lambda r: r.json()) == {"openid": "o"}
+    assert session.calls == 3
+
+    for sent in (requests.exceptions.ReadTimeout(), requests.exceptions.ConnectionError("connection reset"),
+                 requests.exceptions.ChunkedEncodingError()):
+        session = FakeSession(sent, FakeResponse())
+        client, _ = _client(session, retries=2)
+        with pytest.raises(UpstreamError):
+            client.request("test", "GET", "http://x")
+        assert session.calls == 1
+
+
+def test_undecodable_response_counts_as_failure():
+    session = FakeSession(FakeResponse(body=b"<html>bad gateway</html>"))
+    client, ep = _client(session, retries=2, failure_threshold=1)
+    with pytest.raises(UpstreamError):
+        client.request("test", "GET", "http://x", parse=lambda r: r.json())
+    assert ep.breaker.state == "open"
+
+
+def test_failed_half_open_probe_does_not_wedge_breaker():
+    session = FakeSession(FakeResponse(500), KeyboardInterrupt(), FakeResponse())
+    client, ep = _client(session, retries=0, failure_threshold=1, reset_timeout=0)
+    with pytest.raises(UpstreamError):
+        client.request("test", "GET", "http://x")
+    # 半开探测遇到意外异常，熔断器仍须复位探测标记
+    with pytest.raises(KeyboardInterrupt):
+        client.request("test", "GET", "http://x")
+    assert ep.breaker.state == "open"
+    assert client.request("test", "GET", "http://x").status_code == 200
+    assert ep.breaker.state == "closed"
+
+
+def test_retries_stop_at_endpoint_deadline():
+    session = FakeSession(_connect_refused(), _connect_refused(), FakeResponse())
+    client, _ = _client(session, retries=2, deadline=1.2)
+    with pytest.raises(UpstreamError):
+        client.request("test", "GET", "http://x")
+    # 剩余时间扣除连接超时（1s）后不足一半读超时
+    assert session.calls == 1
+
+
+def test_retry_read_timeout_is_capped_to_remaining_deadline():
+    session = FakeSession(_connect_refused(), FakeResponse())
+    client, _ = _client(session, retries=2, deadline=1.8)
+    assert client.request("test", "GET", "http://x").status_code == 200
+    assert session.timeouts[0] == (1, 1)
+    connect, read = session.timeouts[1]
+    assert connect == 1 and 0.5 <= read <= 0.8
+
+
+def test_unifiedorder_retries_connect_errors_within_upstream_deadline(monkeypatch):
+    from saas.services import wechat_service
+    from saas.services.http_client import get_http_client
+    monkeypatch.setenv("WX_PAY_MODE", "REAL")
+    monkeypatch.setenv("WX_PAY_V2_KEY", "k")
+    ok = b"<xml><return_code>SUCCESS</return_code><result_code>SUCCESS</result_code><prepay_id>p1</prepay_id></xml>"
+    session = FakeSession(requests.exceptions.ConnectTimeout(), _connect_refused(), FakeResponse(body=ok))
+    monkeypatch.setattr(get_http_client(), "_session_obj", session)
+    monkeypatch.setattr(wechat_service._UNIFIEDORDER, "backoff", 0)
+    res = wechat_service.jsapi_unified_order("app", "mch", "openid", "desc", "o1", 100, "http://notify")
+    # 使用实际注册的接口配置（deadline = UPSTREAM_DEADLINE）：建连失败立即返回，两次重试都在时限内
+    assert res == {"prepay_id": "p1"}
+    assert session.calls == 3
+
+
+def test_upstream_bulkhead_leaves_web_threads_free(monkeypatch):
+    import importlib
+    import config
+    try:
+        monkeypatch.setenv("GUNICORN_THREADS", "4")
+        monkeypatch.setenv("UPSTREAM_WORKERS", "8")
+        monkeypatch.setenv("UPSTREAM_QUEUE", "8")
+        monkeypatch.setenv("UPSTREAM_DEADLINE", "30")
+        importlib.reload(config)
+        assert config.UPSTREAM_WORKERS + config.UPSTREAM_QUEUE <= config.WEB_THREADS - 1
+        assert config.UPSTREAM_DEADLINE <= config.WX_CONNECT_TIMEOUT + max(config.WX_LOGIN_TIMEOUT, config.WX_PAY_TIMEOUT)
+
+        for name in ("UPSTREAM_WORKERS", "UPSTREAM_QUEUE", "UPSTREAM_DEADLINE"):
+            monkeypatch.delenv(name)
+        monkeypatch.setenv("GUNICORN_THREADS", "16")
+        importlib.reload(config)
+        assert (config.UPSTREAM_WORKERS, config.UPSTREAM_QUEUE) == (8, 0)
+    finally:
+        monkeypatch.undo()
+        importlib.reload(config)
+
+
+def test_backoff_window_doubles_from_base(monkeypatch):
+    from saas.services import http_client
+    windows = []
+    monkeypatch.setattr(http_client.random, "uniform", lambda lo, hi: windows.append(hi) or 0)
+    session = FakeSession(_connect_refused(), _connect_refused(), FakeResponse())
+    client, _ = _client(session, retries=2, backoff=0.2)
+    client.request("test", "GET", "http://x")
+    # full jitter：第 n 次重试前等待 [0, backoff * 2^n)，n 从 0 开始
+    assert windows == [0.2, 0.4]
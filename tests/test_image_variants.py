@@ -0,0 +1,103 @@
+import io
+import json
+
+from flask import g
+from PIL import Image
+
+from saas.infra.models import db, Item
+from saas.infra.repository import get_menu_by_store, get_menu_snapshot, mark_image_variants_ready, list_store_items
+from saas.services import image_service, storage_service
+
+
+def _jpeg() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (800, 600), (200, 80, 40)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def _set_image(tenant, url):
+    item = db.session.get(Item, tenant["item_ids"][0])
+    item.image_url = url
+    db.session.commit()
+
+
+def test_variants_fall_back_to_original_until_generated(app, tenant, monkeypatch, tmp_path):
+    monkeypatch.setenv("STORAGE_DRIVER", "LOCAL")
+    monkeypatch.setenv("STORAGE_LOCAL_DIR", str(tmp_path))
+    monkeypatch.setattr(storage_service, "_schedule_variants", lambda key: None)
+    res = storage_service.upload_file_stream("u1", "dish.jpg", _jpeg(), "image/jpeg")
+    assert res["thumbnail_url"] == res["url"]
+
+    _set_image(tenant, res["url"])
+    item = get_menu_by_store(tenant["store_id"])["items"][0]
+    assert item["thumbnail_url"] == item["image_url"] == res["url"]
+    snap = json.loads(get_menu_snapshot(tenant["store_id"])["body"])
+    assert snap["items"][0]["thumbnail_url"] == res["url"]
+
+    # 后台任务生成并登记后，菜单快照随之重建
+    assert image_service._run(res["key"], app)
+    assert (tmp_path / res["key"].replace(".jpg", "@thumb.jpg")).is_file()
+    snap = json.loads(get_menu_snapshot(tenant["store_id"])["body"])
+    assert snap["items"][0]["thumbnail_url"] == res["url"].replace(".jpg", "@thumb.jpg")
+    assert snap["items"][0]["image_webp_url"] == res["url"].replace(".jpg", "@large.webp")
+
+
+def test_failed_generation_keeps_original(app, tenant, monkeypatch, tmp_path):
+    monkeypatch.setenv("STORAGE_DRIVER", "LOCAL")
+    monkeypatch.setenv("STORAGE_LOCAL_DIR", str(tmp_path))
+    monkeypatch.setattr(storage_service, "_schedule_variants", lambda key: None)
+    res = storage_service.upload_file_stream("u1", "broken.jpg", b"not an image", "image/jpeg")
+    assert image_service._run(res["key"], app) == []
+    _set_image(tenant, res["url"])
+    with app.test_request_context():
+        g.tenant_id = tenant["tenant_id"]
+        assert list_store_items(tenant["store_id"])[0]["thumbnail_url"] == res["url"]
+
+
+def test_signed_original_gets_signed_variants(app, tenant, cos_env):
+    key = "uploads/u1/1700000000-ab12-dish.jpg"
+    signed = storage_service.get_presigned_url(key)
+    assert "q-signature=" in signed
+    _set_image(tenant, signed)
+    mark_image_variants_ready(key, refresh=False)
+    item = get_menu_by_store(tenant["store_id"])["items"][0]
+    assert "dish%40thumb.jpg?" in item["thumbnail_url"] and "q-signature=" in item["thumbnail_url"]
+    assert "dish%40thumb.webp?" in item["thumbnail_webp_url"]
+
+
+def test_menu_snapshot_stores_keys_and_signs_per_response(app, tenant, cos_env):
+    from saas.infra.models import MenuSnapshot
+    from saas.infra.repository import rebuild_menu_snapshot, _menu_cache
+    key = "uploads/u1/1700000000-ab12-dish.jpg"
+    _set_image(tenant, storage_service.get_presigned_url(key))
+    mark_image_variants_ready(key, refresh=False)
+    first = rebuild_menu_snapshot(tenant["store_id"])
+
+    # 落库的快照与 ETag 不含签名：换一批签名重建，版本号不变
+    row = db.session.get(MenuSnapshot, tenant["store_id"])
+    assert '"thumbnail_url":"uploads/u1/1700000000-ab12-dish@thumb.jpg"' in row.body
+    storage_service._presign_cache.clear()
+    assert rebuild_menu_snapshot(tenant["store_id"])["version"] == first["version"] == 1
+
+    _menu_cache.clear()
+    snap = get_menu_snapshot(tenant["store_id"])
+    item = json.loads(snap["body"])["items"][0]
+    assert "dish%40thumb.jpg?" in item["thumbnail_url"] and "q-signature=" in item["thumbnail_url"]
+    assert snap["etag"] != row.etag
+
+
+def test_variants_strip_exif_and_leave_original_untouched(app, monkeypatch, tmp_path):
+    monkeypatch.setenv("STORAGE_DRIVER", "LOCAL")
+    monkeypatch.setenv("STORAGE_LOCAL_DIR", str(tmp_path))
+    monkeypatch.setattr(storage_service, "_schedule_variants", lambda key: None)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation
+    buf = io.BytesIO()
+    Image.new("RGB", (800, 600), (10, 20, 30)).save(buf, "JPEG", exif=exif.tobytes())
+    res = storage_service.upload_file_stream("u1", "exif.jpg", buf.getvalue(), "image/jpeg")
+
+    written = image_service.generate_image_variants(res["key"])
+    assert res["key"] not in written
+    assert (tmp_path / res["key"]).read_bytes() == buf.getvalue()
+    thumb = Image.open(tmp_path / res["key"].replace(".jpg", "@thumb.jpg"))
+    assert not thumb.info.get("exif") and thumb.size == (270, 360)
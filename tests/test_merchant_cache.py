@@ -0,0 +1,24 @@
+from saas.infra.repository import resolve_merchant, create_merchant, _merchant_cache
+
+from .conftest import count_queries
+
+
+def test_unknown_merchant_is_negatively_cached(app):
+    _merchant_cache.clear()
+    with app.test_request_context():
+        with count_queries() as n:
+            assert resolve_merchant("no-such-slug") is None
+        assert n[0] == 2
+    with app.test_request_context():
+        with count_queries() as n:
+            assert resolve_merchant("no-such-slug") is None
+        assert n[0] == 0
+
+
+def test_create_merchant_clears_negative_cache(app):
+    _merchant_cache.clear()
+    with app.test_request_context():
+        assert resolve_merchant("late-slug") is None
+    with app.test_request_context():
+        created = create_merchant({"slug": "late-slug", "name": "新商户"})
+        assert resolve_merchant("late-slug")["id"] == created["id"]
@@ -0,0 +1,98 @@
+import time
+import uuid
+
+import pytest
+from flask import g
+from sqlalchemy import func
+
+from saas.domain.order import OrderStatus
+from saas.infra.models import db, Order, Payment, Store
+from saas.infra.repository import metrics_today, metrics_range, rebuild_store_daily_metrics
+
+from .conftest import make_order
+
+# 对照实现：拆分前逐项 COUNT / SUM 的看板查询（字段含义与线上一致）
+PAID_STATUS = [OrderStatus.PAID.value, OrderStatus.MAKING.value, OrderStatus.DONE.value]
+
+
+def legacy_metrics(tid, store_id=None, start_ts=None, end_ts=None):
+    order_q = Order.query.filter_by(tenant_id=tid)
+    payment_q = Payment.query.filter_by(tenant_id=tid, channel="WX_JSAPI")
+    revenue = db.session.query(func.sum(Order.price_payable_cents)).filter(
+        Order.status.in_(PAID_STATUS), Order.tenant_id == tid)
+    if store_id:
+        order_q = order_q.filter_by(store_id=store_id)
+        revenue = revenue.filter(Order.store_id == store_id)
+    if start_ts is not None:
+        order_q = order_q.filter(Order.created_at >= start_ts, Order.created_at <= end_ts)
+        revenue = revenue.filter(Order.created_at >= start_ts, Order.created_at <= end_ts)
+        payment_q = payment_q.filter(Payment.created_at >= start_ts, Payment.created_at <= end_ts)
+        if store_id:
+            payment_q = payment_q.join(Order, Payment.order_id == Order.id).filter(Order.store_id == store_id)
+    return {
+        "orders_total": order_q.count(),
+        "paid": order_q.filter_by(status=OrderStatus.PAID.value).count(),
+        "revenue_cents": int(revenue.scalar() or 0),
+        "making": order_q.filter_by(status=OrderStatus.MAKING.value).count(),
+        "done": order_q.filter_by(status=OrderStatus.DONE.value).count(),
+        "payments_wx": payment_q.count(),
+    }
+
+
+@pytest.fixture
+def seeded(app, tenant):
+    """
+    两个门店、近 5 天各状态订单与多渠道支付，另有一个其他租户的干扰订单
+    """
+    tid = tenant["tenant_id"]
+    other_store = uuid.uuid4().hex
+    db.session.add(Store(id=other_store, slug="s2", name="二店", tenant_id=tid, features={}))
+    db.session.commit()
+    stores = [tenant["store_id"], other_store]
+    statuses = ["CREATED", "PAID", "MAKING", "DONE", "CANCELLED", "REFUNDED", "WAIT_USE"]
+    channels = ["WX_JSAPI", "WALLET", "WX_JSAPI", "CASH"]
+    now = int(time.time())
+    n = 0
+    for day in range(5):
+        for status in statuses:
+            for store_id in stores:
+                n += 1
+                oid = make_order({**tenant, "store_id": store_id}, status=status, payable=100 * n,
+                                 created_at=now - day * 86400 - n, lines=0)
+                if status in PAID_STATUS:
+                    db.session.add(Payment(id=uuid.uuid4().hex, order_id=oid, tenant_id=tid, amount_cents=100 * n,
+                                           status="SUCCESS", channel=channels[n // 2 % len(channels)],
+                                           created_at=now - day * 86400 - n))
+    make_order({"tenant_id": uuid.uuid4().hex, "store_id": tenant["store_id"], "item_ids": []},
+               status="PAID", payable=999999, lines=0)
+    db.session.commit()
+    return {"tenant_id": tid, "stores": stores, "now": now}
+
+
+@pytest.mark.parametrize("store_idx", [None, 0, 1])
+def test_metrics_today_matches_legacy(app, seeded, store_idx):
+    store_id = None if store_idx is None else seeded["stores"][store_idx]
+    with app.test_request_context():
+        g.tenant_id = seeded["tenant_id"]
+        expected = legacy_metrics(seeded["tenant_id"], store_id)
+        # 旧实现的 payments_wx 在 today 口径下不按门店过滤
+        expected["payments_wx"] = legacy_metrics(seeded["tenant_id"])["payments_wx"]
+        assert metrics_today(store_id) == expected
+
+
+@pytest.mark.parametrize("rollup", [False, True])
+@pytest.mark.parametrize("store_idx", [None, 0, 1])
+def test_metrics_range_matches_legacy(app, seeded, store_idx, rollup):
+    app.config["METRICS_USE_ROLLUP"] = rollup
+    store_id = None if store_idx is None else seeded["stores"][store_idx]
+    now = seeded["now"]
+    start = time.strftime("%Y-%m-%d", time.localtime(now - 3 * 86400))
+    end = time.strftime("%Y-%m-%d", time.localtime(now))
+    with app.test_request_context():
+        g.tenant_id = seeded["tenant_id"]
+        if rollup:
+            rebuild_store_daily_metrics(seeded["tenant_id"])
+        res = metrics_range(start, end, store_id)
+        rng = res.pop("range")
+        assert res == legacy_metrics(seeded["tenant_id"], store_id, rng["start"], rng["end"])
+        assert res["orders_total"] > 0 and res["payments_wx"] > 0
@@ -0,0 +1,44 @@
+from flask import g
+
+from saas.infra.repository import list_orders, list_orders_by_user, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+from .conftest import make_order
+
+
+def test_without_limit_or_cursor_returns_bounded_page(app, tenant):
+    with app.test_request_context():
+        g.tenant_id = tenant["tenant_id"]
+        for i in range(MAX_PAGE_SIZE + 5):
+            make_order(tenant, created_at=1700000000 + i, lines=0)
+        res = list_orders(None)
+        assert len(res["items"]) == MAX_PAGE_SIZE
+        assert res["items"][0]["created_at"] == 1700000000 + MAX_PAGE_SIZE + 4
+        rest = list_orders(None, cursor=res["next_cursor"])
+        assert len(rest["items"]) == 5 and rest["next_cursor"] is None
+        assert len(list_orders_by_user("u1")["items"]) == MAX_PAGE_SIZE
+        # 只传 cursor 时按默认页大小
+        assert len(list_orders(None, cursor=list_orders(None, limit=1)["next_cursor"])["items"]) == DEFAULT_PAGE_SIZE
+
+
+def test_next_cursor_header_is_exposed_to_cross_origin_clients(app, tenant):
+    for i in range(3):
+        make_order(tenant, created_at=1700000000 + i, lines=0)
+    resp = app.test_client().get("/api/orders?limit=2", headers={"X-User-ID": "u1", "Origin": "https://console.example.com"})
+    assert resp.headers["X-Next-Cursor"]
+    assert "X-Next-Cursor" in resp.headers["Access-Control-Expose-Headers"]
+
+
+def test_cursor_pages_cover_all_orders_once(app, tenant):
+    with app.test_request_context():
+        g.tenant_id = tenant["tenant_id"]
+        # 同一 created_at 下多笔订单，验证 (created_at, id) 游标不重不漏
+        ids = {make_order(tenant, created_at=1700000000 + i // 3, lines=0) for i in range(11)}
+        seen, cursor = [], None
+        while True:
+            page = list_orders(None, cursor=cursor, limit=4)
+            seen += [o["id"] for o in page["items"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        assert len(seen) == len(ids) and set(seen) == ids
+        assert len(list_orders(None, cursor=None, limit=4)["items"]) == 4
@@ -0,0 +1,77 @@
+from flask import g
+
+from saas.infra.models import db, OrderReview
+from saas.infra.repository import list_orders, list_console_orders, list_orders_by_user, get_order_detail
+
+from .conftest import make_order, count_queries
+
+
+def _seed(tenant, n):
+    ids = [make_order(tenant, created_at=1700000000 + i) for i in range(n)]
+    # 一半订单带评价，覆盖评价批量加载
+    for oid in ids[::2]:
+        db.session.add(OrderReview(order_id=oid, user_id="u1", tenant_id=tenant["tenant_id"], rating=5,
+                                   content="好", created_at=1700000000))
+    db.session.commit()
+    db.session.expunge_all()
+    return ids
+
+
+def _queries(fn):
+    with count_queries() as n:
+        res = fn()
+    return n[0], res
+
+
+def test_list_orders_query_count_is_constant(app, tenant):
+    with app.test_request_context():
+        g.tenant_id = tenant["tenant_id"]
+        _seed(tenant, 1)
+        one, res = _queries(lambda: list_orders(None, limit=100))
+        assert len(res["items"]) == 1
+
+        _seed(tenant, 9)
+        many, res = _queries(lambda: list_orders(None, limit=100))
+        assert len(res["items"]) == 10
+        assert all(len(o["items"]) == 2 and o["items"][0]["image_url"] for o in res["items"])
+        assert many == one
+
+        console, _ = _queries(lambda: list_console_orders(None, store_id=tenant["store_id"], limit=100))
+        assert console == one
+
+
+def test_list_orders_by_user_query_count_is_constant(app, tenant):
+    with app.test_request_context():
+        g.tenant_id = tenant["tenant_id"]
+        _seed(tenant, 1)
+        one, res = _queries(lambda: list_orders_by_user("u1", limit=100))
+        assert len(res["items"]) == 1
+
+        _seed(tenant, 9)
+        many, res = _queries(lambda: list_orders_by_user("u1", limit=100))
+        assert len(res["items"]) == 10
+        assert all(o["store_name"] == "测试门店" for o in res["items"])
+        assert sum(1 for o in res["items"] if o["reviewed"]) == 6
+        assert many == one
+
+
+def test_order_detail_query_count(app, tenant):
+    with app.test_request_context():
+        g.tenant_id = tenant["tenant_id"]
+        oid = _seed(tenant, 1)[0]
+        n, detail = _queries(lambda: get_order_detail(oid, "u1"))
+        assert detail["review_content"] == "好"
+        # 订单 + 订单项 + 菜品图片 + 门店名 + 评价
+        assert n == 5
+
+
+def test_duplicate_reviews_resolve_to_earliest(app, tenant):
+    with app.test_request_context():
+        g.tenant_id = tenant["tenant_id"]
+        oid = make_order(tenant, user_id="u1")
+        # 后写入的一条更早：按 created_at 而非插入顺序取
+        for created_at, content in ((1700000100, "后"), (1700000000, "先")):
+            db.session.add(OrderReview(order_id=oid, user_id="u1", tenant_id=tenant["tenant_id"], rating=5,
+                                       content=content, created_at=created_at))
+        db.session.commit()
+        assert get_order_detail(oid, "u1")["review_content"] == "先"
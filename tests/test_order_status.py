@@ -0,0 +1,49 @@
+import time
+
+from flask import g
+
+from saas.domain.order import OrderStatus
+from saas.infra.models import Order, StoreDailyMetric
+from saas.infra.repository import update_order_status, rebuild_store_daily_metrics
+
+from .conftest import make_order, count_queries
+
+
+def _rollup(tenant):
+    cols = ["orders_total", "created_count", "paid_count", "making_count", "done_count",
+            "wait_use_count", "refunded_count", "revenue_cents"]
+    rows = StoreDailyMetric.query.filter_by(tenant_id=tenant["tenant_id"]).all()
+    return {c: sum(getattr(r, c) or 0 for r in rows) for c in cols}
+
+
+def test_transition_is_single_update_and_keeps_rollup_exact(app, tenant):
+    with app.test_request_context():
+        g.tenant_id = tenant["tenant_id"]
+        making = make_order(tenant, status="MAKING", payable=700, lines=0)
+        wait_use = make_order(tenant, status="WAIT_USE", payable=300, lines=0)
+        rebuild_store_daily_metrics(tenant["tenant_id"])
+
+        # DONE 有多个前置状态：同一条 UPDATE 命中任一前置状态
+        with count_queries() as n:
+            assert update_order_status(making, OrderStatus.DONE)
+        # UPDATE + 成功后回读 + 日聚合累加
+        assert n[0] == 3
+        assert update_order_status(wait_use, OrderStatus.DONE)
+        assert Order.query.get(making).prev_status == "MAKING"
+
+        live = _rollup(tenant)
+        rebuild_store_daily_metrics(tenant["tenant_id"])
+        assert live == _rollup(tenant)
+        assert live["done_count"] == 2 and live["revenue_cents"] == 1000
+
+
+def test_rejected_transitions_do_not_touch_row(app, tenant):
+    with app.test_request_context():
+        g.tenant_id = tenant["tenant_id"]
+        done = make_order(tenant, status="DONE", lines=0)
+        expired = make_order(tenant, status="CREATED", created_at=int(time.time()) - 3600, lines=0)
+        assert not update_order_status(done, OrderStatus.MAKING)
+        assert not update_order_status(expired, OrderStatus.PAID)
+        assert Order.query.get(expired).status == "CREATED"
+        g.tenant_id = "other-tenant"
+        assert not update_order_status(done, OrderStatus.REVIEWED)
@@ -0,0 +1,14 @@
+import time
+
+from saas.infra.models import Order
+from saas.services.order_sweeper import sweep_if_leader
+
+from .conftest import make_order
+
+
+def test_sweep_cancels_expired_created_orders(app, tenant):
+    old = make_order(tenant, status="CREATED", created_at=int(time.time()) - 3600, lines=0)
+    fresh = make_order(tenant, status="CREATED", lines=0)
+    assert sweep_if_leader(batch_size=10) == 1
+    assert Order.query.get(old).status == "CANCELLED"
+    assert Order.query.get(fresh).status == "CREATED"
@@ -0,0 +1,31 @@
+import pytest
+
+from saas.infra.models import db
+from saas.infra.routing import REPLICA_BIND_KEY
+from saas.infra.repository import get_menu_by_store, rebuild_menu_snapshot, _menu_cache
+
+from .conftest import build_app
+
+
+@pytest.fixture
+def app():
+    """
+    只读库为另一个空的 sqlite 内存库，模拟尚未同步主库写入的只读库
+    """
+    app = build_app(SQLALCHEMY_BINDS={REPLICA_BIND_KEY: {"url": "sqlite://"}})
+    with app.app_context():
+        db.metadata.create_all(db.engines[REPLICA_BIND_KEY])
+        yield app
+        db.session.remove()
+    # init_app 按 bind 注册了全局 metadata，移除以免影响后续未配置只读库的应用
+    db.metadatas.pop(REPLICA_BIND_KEY, None)
+
+
+def test_menu_snapshot_rebuild_reads_primary(app, tenant):
+    _menu_cache.clear()
+    db.session.remove()
+    # @read_only 查询走只读库：尚未同步，看不到门店
+    assert get_menu_by_store(tenant["store_id"]) == {"categories": [], "items": []}
+    db.session.remove()
+    snap = rebuild_menu_snapshot(tenant["store_id"])
+    assert "菜品".encode("utf-8") in snap["body"]
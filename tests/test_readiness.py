@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from saas.infra.models import db
+from saas.services import warmup
+
+from .conftest import build_app
+
+
+@pytest.fixture
+def ready_app(tmp_path, monkeypatch):
+    monkeypatch.setattr(warmup, "_state", {"started": False, "ready": False, "attempts": 0, "steps": {}, "error": None})
+    app = build_app(WARMUP_STATE_DIR=str(tmp_path))
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def test_readyz_waits_for_every_worker(ready_app, tmp_path):
+    client = ready_app.test_client()
+    assert warmup.start_warmup(ready_app, blocking=True)
+    assert (tmp_path / str(os.getpid())).read_text() == "ready"
+
+    # 另一个存活 worker 仍在预热：整个容器未就绪
+    other = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        (tmp_path / str(other.pid)).write_text("warming")
+        resp = client.get("/readyz")
+        assert resp.status_code == 503
+        assert resp.get_json()["workers"] == {"ready": 1, "warming": 1}
+
+        # worker 退出（gunicorn child_exit）后不再等待它
+        warmup.clear_warmup_markers(str(tmp_path), other.pid)
+        resp = client.get("/readyz")
+        assert resp.status_code == 200
+        assert resp.get_json()["workers"] == {"ready": 1, "warming": 0}
+    finally:
+        other.kill()
+        other.wait()
+
+
+def test_recycled_worker_does_not_unready_container(ready_app, tmp_path, monkeypatch):
+    client = ready_app.test_client()
+    assert warmup.start_warmup(ready_app, blocking=True)
+    assert client.get("/readyz").status_code == 200
+
+    # max_requests 回收后补充的 worker 预热中（或预热失败后台重试）：其余 worker 仍在服务
+    other = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        (tmp_path / str(other.pid)).write_text("warming")
+        resp = client.get("/readyz")
+        assert resp.status_code == 200
+        assert resp.get_json()["workers"] == {"ready": 1, "warming": 1}
+
+        # 所有 worker 都未就绪时仍返回 503
+        (tmp_path / str(os.getpid())).write_text("warming")
+        monkeypatch.setitem(warmup._state, "ready", False)
+        monkeypatch.setitem(warmup._state, "started", True)
+        assert client.get("/readyz").status_code == 503
+    finally:
+        other.kill()
+        other.wait()
+
+
+def test_readyz_does_not_leak_errors(ready_app, monkeypatch):
+    def broken(app):
+        raise RuntimeError("mysql://root:secret@db failed")
+
+    monkeypatch.setattr(warmup, "run_warmup", broken)
+    monkeypatch.setattr(warmup, "WARMUP_RETRY_INTERVAL", 3600)
+    assert warmup.start_warmup(ready_app, blocking=True)
+    resp = ready_app.test_client().get("/readyz")
+    assert resp.status_code == 503
+    assert "secret" not in resp.get_data(as_text=True)
+    assert warmup.warmup_state()["error"]
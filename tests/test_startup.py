@@ -0,0 +1,34 @@
+from sqlalchemy import inspect
+
+from saas.api.admin import ADMIN_TOKEN
+from saas.infra.migrations import MIGRATIONS, pending_migrations
+from saas.infra.models import db
+
+from .conftest import build_app
+
+
+def test_migration_check_is_read_only():
+    app = build_app(AUTO_MIGRATE="check")
+    with app.app_context():
+        # 空库：check 不建 schema_migrations，也不执行迁移
+        assert not inspect(db.engine).has_table("schema_migrations")
+        assert pending_migrations() == [v for v, _ in MIGRATIONS]
+        assert not inspect(db.engine).has_table("schema_migrations")
+        db.session.remove()
+
+
+def test_startup_report_measures_first_request_against_target():
+    app = build_app(STARTUP_TARGET_MS=10 ** 9)
+    client = app.test_client()
+    # 健康检查不计入首请求
+    client.get("/healthz")
+    assert app.extensions["startup"].first_request_ms is None
+    headers = {"X-Admin-Token": ADMIN_TOKEN}
+    client.get("/api/admin/startup", headers=headers)
+    report = client.get("/api/admin/startup", headers=headers).get_json()
+    assert report["first_request_ms"] is not None
+    assert report["target_ms"] == 10 ** 9
+    assert report["within_target"] is True
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,27 @@
+import io
+
+from saas.api.admin import ADMIN_TOKEN
+from saas.services import storage_service
+
+
+def _upload(app):
+    return app.test_client().post(
+        "/api/admin/upload",
+        headers={"X-Admin-Token": ADMIN_TOKEN},
+        data={"file": (io.BytesIO(b"\xff\xd8fake-jpeg"), "banner.jpg")},
+        content_type="multipart/form-data",
+    ).get_json()
+
+
+def test_admin_upload_returns_permanent_url_for_saving(app, cos_env):
+    res = _upload(app)
+    assert res["url"] == f"https://test-1250000000.cos.ap-shanghai.myqcloud.com/{res['key']}"
+    assert "q-signature=" in res["preview_url"] and res["preview_url"] != res["url"]
+
+
+def test_admin_upload_local_urls(app, monkeypatch, tmp_path):
+    monkeypatch.setenv("STORAGE_DRIVER", "LOCAL")
+    monkeypatch.setenv("STORAGE_LOCAL_DIR", str(tmp_path))
+    monkeypatch.setattr(storage_service, "_schedule_variants", lambda key: None)
+    res = _upload(app)
+    assert "/api/admin/files/" in res["url"] and res["preview_url"] == res["url"]
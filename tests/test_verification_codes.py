@@ -0,0 +1,40 @@
+import pytest
+from flask import g
+
+from saas.infra.models import db, VerificationCode
+from saas.infra import repository
+from saas.infra.repository import claim_verification_code, mint_verification_codes, VerificationCodeUnavailable
+
+
+def _free(tid):
+    return VerificationCode.query.filter_by(tenant_id=tid, order_id=None).count()
+
+
+def test_claim_mints_when_pool_empty_and_commits_with_order(app, tenant):
+    tid = tenant["tenant_id"]
+    with app.test_request_context():
+        g.tenant_id = tid
+        code = claim_verification_code("o1")
+        db.session.commit()
+        row = VerificationCode.query.filter_by(tenant_id=tid, code=code).one()
+        assert row.order_id == "o1"
+        assert claim_verification_code("o2") != code
+
+
+def test_rollback_returns_code_to_pool(app, tenant):
+    tid = tenant["tenant_id"]
+    with app.test_request_context():
+        g.tenant_id = tid
+        mint_verification_codes(tid, 5)
+        before = _free(tid)
+        claim_verification_code("o1")
+        db.session.rollback()
+        assert _free(tid) == before
+
+
+def test_exhausted_pool_raises_domain_error(app, tenant, monkeypatch):
+    monkeypatch.setattr(repository, "mint_verification_codes", lambda tid, count=0: 0)
+    with app.test_request_context():
+        g.tenant_id = tenant["tenant_id"]
+        with pytest.raises(VerificationCodeUnavailable):
+            claim_verification_code("o1")
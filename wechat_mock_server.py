@@ -0,0 +1,95 @@
+# 微信接口本地模拟服务：离线压测登录与下单支付
+# 模拟 GET /sns/jscode2session 与 POST /pay/unifiedorder
+#
+# 启动：python3 wechat_mock_server.py [host] [port] [--latency-ms 50] [--error-rate 0.0]
+# 服务端配置：
+#   WX_API_BASE=http://127.0.0.1:9090
+#   WX_PAY_API_BASE=http://127.0.0.1:9090
+#   WX_PAY_MODE=REAL WX_PAY_V2_KEY=<任意值>
+#   WECHAT_APPID / WECHAT_APPSECRET=<任意值>
+import argparse
+import hashlib
+import json
+import random
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse as urlparse
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive，与真实接口一致
+    latency = 0.0
+    error_rate = 0.0
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self) -> bool:
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self._send(503, b"service unavailable", "text/plain")
+            return False
+        return True
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        if url.path != "/sns/jscode2session":
+            return self._send(404, b"not found", "text/plain")
+        if not self._simulate():
+            return
+        qs = urlparse.parse_qs(url.query)
+        code = (qs.get("js_code") or [""])[0]
+        if not code:
+            data = {"errcode": 40029, "errmsg": "invalid code"}
+        else:
+            data = {
+                "openid": "mock_" + hashlib.sha1(code.encode()).hexdigest()[:24],
+                "session_key": uuid.uuid4().hex,
+            }
+        self._send(200, json.dumps(data).encode(), "application/json")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        if self.path != "/pay/unifiedorder":
+            return self._send(404, b"not found", "text/plain")
+        if not self._simulate():
+            return
+        try:
+            params = {c.tag: c.text for c in ET.fromstring(body)}
+        except ET.ParseError:
+            params = {}
+        if not params.get("out_trade_no"):
+            xml = "<xml><return_code>FAIL</return_code><return_msg>invalid request</return_msg></xml>"
+        else:
+            # 同一 out_trade_no 返回同一 prepay_id（与微信幂等行为一致）
+            prepay_id = "wx" + hashlib.md5(params["out_trade_no"].encode()).hexdigest()
+            xml = (
+                "<xml><return_code>SUCCESS</return_code><result_code>SUCCESS</result_code>"
+                f"<prepay_id>{prepay_id}</prepay_id><trade_type>JSAPI</trade_type></xml>"
+            )
+        self._send(200, xml.encode(), "application/xml")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="WeChat API mock server")
+    parser.add_argument("host", nargs="?", default="127.0.0.1")
+    parser.add_argument("port", nargs="?", type=int, default=9090)
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个请求的模拟延迟")
+    parser.add_argument("--error-rate", type=float, default=0, help="返回 503 的比例 (0~1)")
+    args = parser.parse_args()
+    Handler.latency = args.latency_ms / 1000.0
+    Handler.error_rate = args.error_rate
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"WeChat mock server listening on http://{args.host}:{args.port}")
+    server.serve_forever()